@@ -0,0 +1,79 @@
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from collections import OrderedDict
+from dataclasses import dataclass
+from app.core.config import settings, lazy
+from app.core.security import decode_access_token_claims
+import hashlib
+import time
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+
+@dataclass(frozen=True)
+class Principal:
+    email: str
+    role: str = "user"
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+class VerifiedTokenCache:
+    """Bounded LRU of tokens whose signature has already been verified.
+
+    Entries are keyed by a SHA-256 digest of the token, so raw tokens are not
+    kept in memory, and expire at the token's own `exp` claim. Only used from
+    the event loop (get_current_user and the profiling middleware), so it
+    takes no lock.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def get(self, token: str):
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            principal, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return principal
+            del self._entries[key]
+            self.counters["expired"] += 1
+        self.counters["misses"] += 1
+
+        payload = decode_access_token_claims(token)
+        if not payload or not payload.get("sub"):
+            return None
+        principal = Principal(email=payload["sub"], role=payload.get("role", "user"))
+        expires_at = payload.get("exp")
+        if expires_at is not None:
+            self._entries[key] = (principal, float(expires_at))
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+        return principal
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "capacity": self.max_size,
+            "hit_ratio": self.counters["hits"] / lookups if lookups else 0.0
+        }
+
+token_cache = lazy(lambda: VerifiedTokenCache(settings.AUTH_CACHE_SIZE))
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    # async so FastAPI runs it on the event loop: the cache is not thread-safe
+    user = token_cache.get(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user
@@ -0,0 +1,114 @@
+"""Negotiated response compression.
+
+gzip is always offered; brotli and zstd are used when the `brotli` or
+`zstandard` packages are installed. Responses smaller than the configured
+threshold, already encoded, streamed, or of a non-text type go out as is.
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.config import settings
+import gzip
+
+ENCODERS = {"gzip": lambda data: gzip.compress(data, compresslevel=6, mtime=0)}
+
+try:
+    import brotli
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=4)
+except ImportError:
+    pass
+
+try:
+    import zstandard
+    _zstd = zstandard.ZstdCompressor(level=3)
+    ENCODERS["zstd"] = _zstd.compress
+except ImportError:
+    pass
+
+# best ratio per CPU first
+PREFERENCE = [encoding for encoding in ("zstd", "br", "gzip") if encoding in ENCODERS]
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript", "image/svg+xml")
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    """Pick the preferred available encoding the client accepts (q > 0)"""
+    if not accept_encoding:
+        return None
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    for encoding in PREFERENCE:
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class CompressionMiddleware:
+    """Compress single-body responses of at least minimum_size bytes.
+
+    Strong ETags are weakened on compressed responses, since the bytes no
+    longer match the representation they name; the If-None-Match and
+    If-Match checks ignore the W/ prefix.
+    """
+
+    def __init__(self, app, minimum_size: int | None = None):
+        self.app = app
+        # built with the middleware stack on the first request, not at import
+        self.minimum_size = settings.RESPONSE_COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if message.get("more_body", False) or not self.should_compress(start["status"], headers, body):
+                # streamed or not worth it: release what was held back
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            compressed = ENCODERS[encoding](body)
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                body = compressed
+            headers.add_vary_header("Accept-Encoding")
+            passthrough = True
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing_send)
+
+    def should_compress(self, status: int, headers: MutableHeaders, body: bytes) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        if len(body) < self.minimum_size:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
@@ -1,12 +1,87 @@
+"""Application settings, read once from the environment and `.env`.
+
+Nothing is read at import: `settings` builds the Settings object on first
+attribute access, so importing the app needs no environment, and `lazy()`
+does the same for module-level objects configured from it.
+"""
 from pydantic import BaseSettings
+from functools import lru_cache
 
 class Settings(BaseSettings):
     MONGO_URL: str
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_MAX_CONNECTING: int = 2
+    MONGO_MAX_IDLE_TIME_MS: int | None = None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int | None = None
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 10000
+    MONGO_SOCKET_TIMEOUT_MS: int | None = None
+    MONGO_COMPRESSORS: str = ""  # e.g. "zstd,snappy,zlib"; zstd and snappy need their python packages
+    MONGO_RETRY_WRITES: bool = True
+    MONGO_RETRY_READS: bool = True
+    MONGO_APP_NAME: str = "note-backend"
+    MONGO_WARMUP_CONNECTIONS: int = 10  # opened at startup before the app reports ready
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    AUTH_CACHE_SIZE: int = 10000
+    NOTE_CACHE_SIZE: int = 2000
+    NOTE_CACHE_TTL: float = 30.0
+    NOTE_SNIPPET_LENGTH: int = 200
+    NOTE_COMPRESS_MIN_BYTES: int = 8192  # 0 stores every body as plain text
+    RESPONSE_COMPRESSION_MIN_SIZE: int = 1024
+    NOTE_BULK_MAX_OPERATIONS: int = 500
+    NOTE_BATCH_MAX_IDS: int = 200
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    ANALYTICS_BUFFER_SIZE: int = 10000
+    ANALYTICS_BATCH_SIZE: int = 500
+    ANALYTICS_FLUSH_INTERVAL: float = 1.0
+    ANALYTICS_TIMESERIES: bool = False  # store analytics as a time-series collection (MongoDB 5.0+)
+    ANALYTICS_TIMESERIES_GRANULARITY: str = "seconds"  # "seconds" buckets each user's events by hour
+    ANALYTICS_RETENTION_DAYS: int = 0  # raw analytics, note_views and hourly view counts; 0 keeps them forever
+    ANALYTICS_ROLLUP_INTERVAL: float = 3600.0  # seconds between daily-summary rollup runs
+    NOTE_VIEW_LOG_MODE: str = "sampled"  # "all", "sampled" or "off"
+    NOTE_VIEW_LOG_SAMPLE_RATE: float = 0.1
+    NOTE_VIEW_FLUSH_INTERVAL: float = 5.0
+    LOOP_LAG_SAMPLE_INTERVAL: float = 0.5
+    READINESS_PING_TIMEOUT: float = 2.0
+    PROFILE_BUFFER_SIZE: int = 50
+    PROFILE_TOP_FUNCTIONS: int = 40
+    PROFILE_SLOW_REQUEST_MS: float = 0  # 0 turns automatic capture off
+    STARTUP_BUDGET_SECONDS: float = 5.0  # import + startup; 0 disables the check
 
     class Config:
         env_file = ".env"
 
-settings = Settings()
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings()
+
+class Lazy:
+    """Proxy that builds its target with `factory()` on first use"""
+    __slots__ = ("_factory", "_target")
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_target", None)
+
+    def _resolve(self):
+        target = self._target
+        if target is None:
+            target = self._factory()
+            object.__setattr__(self, "_target", target)
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+def lazy(factory) -> Lazy:
+    return Lazy(factory)
+
+settings: Settings = lazy(get_settings)
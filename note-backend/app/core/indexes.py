@@ -0,0 +1,256 @@
+"""Declared MongoDB indexes for every collection the app queries.
+
+Applied idempotently at startup, after creating the collections that need
+creation options (the analytics time-series collection). With
+ANALYTICS_RETENTION_DAYS set, the time index of each raw collection in
+TTL_INDEXES expires its documents (collection-level expireAfterSeconds on a
+time-series collection) once the retention is armed: only after the daily
+rollups cover every day it would expire (retention_service.armed_retention),
+so turning retention on over old data loses nothing that is not summarised.
+Changing the setting updates the live indexes in place with collMod. Run
+ahead of a deploy with
+
+    python -m app.core.indexes           # build missing indexes
+    python -m app.core.indexes --check   # report drift only, exit 1 if any
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+from app.core.config import settings
+from app.db import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    "notes": [
+        # note listing and keyset pagination (notes_service.get_user_notes)
+        IndexModel([("owner", ASCENDING), ("updatedAt", DESCENDING), ("_id", DESCENDING)], name="owner_updatedAt"),
+        # analytics_service.notes_per_day
+        IndexModel([("createdAt", ASCENDING)], name="createdAt"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "analytics": [
+        # login/logout aggregations: equality on event and email, range on timestamp
+        IndexModel([("event", ASCENDING), ("email", ASCENDING), ("timestamp", ASCENDING)], name="event_email_timestamp"),
+        # study activity, daily summary and /analytics/my-activity
+        IndexModel([("email", ASCENDING), ("timestamp", DESCENDING)], name="email_timestamp"),
+        # /analytics/user-activity feed
+        IndexModel([("timestamp", DESCENDING)], name="timestamp"),
+    ],
+    "sessions": [
+        # open-session lookup on login/logout and per-user window aggregations
+        IndexModel([("email", ASCENDING), ("status", ASCENDING), ("loginAt", DESCENDING)], name="email_status_loginAt"),
+        IndexModel([("email", ASCENDING), ("loginAt", ASCENDING)], name="email_loginAt"),
+    ],
+    "note_views": [
+        IndexModel([("noteId", ASCENDING), ("timestamp", DESCENDING)], name="noteId_timestamp"),
+        # retention rollups by day; the TTL index when retention is on
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+    ],
+    "note_view_counts": [
+        # one rollup document per note and hour; the counter upserts match on both
+        IndexModel([("noteId", ASCENDING), ("hour", ASCENDING)], name="noteId_hour", unique=True),
+        # retention rollups by day; the TTL index when retention is on
+        IndexModel([("hour", ASCENDING)], name="hour"),
+    ],
+    "analytics_daily": [
+        # one summary per user and day; the rollup upserts match on both
+        IndexModel([("email", ASCENDING), ("day", ASCENDING)], name="email_day", unique=True),
+    ],
+    "note_views_daily": [
+        IndexModel([("noteId", ASCENDING), ("day", ASCENDING)], name="noteId_day", unique=True),
+    ],
+    "note_terms": [
+        IndexModel([("owner", ASCENDING), ("term", ASCENDING)], name="owner_term"),
+        # reindexing by note, and the other query tokens' postings of the candidate notes
+        IndexModel([("noteId", ASCENDING), ("term", ASCENDING)], name="noteId_term"),
+    ],
+    "tag_stats": [
+        # /analytics/tags top-K and /notes/tags/autocomplete prefix lookups
+        IndexModel([("count", DESCENDING)], name="count"),
+        IndexModel([("key", ASCENDING), ("count", DESCENDING)], name="key_count"),
+    ],
+}
+
+# raw collections and the single-field time index that expires them
+TTL_INDEXES = {"analytics": "timestamp", "note_views": "timestamp", "note_view_counts": "hour"}
+
+def retention_seconds() -> int | None:
+    days = settings.ANALYTICS_RETENTION_DAYS
+    return days * 86400 if days > 0 else None
+
+async def armed_ttl() -> int | None:
+    # retention_service imports this module
+    from app.services.retention_service import armed_retention
+    return await armed_retention()
+
+def collection_options(ttl: int | None = None) -> dict:
+    """Creation options of collections that cannot be created implicitly, expiring after `ttl` seconds"""
+    options = {}
+    if settings.ANALYTICS_TIMESERIES:
+        # one bucket per user (metaField) and hour of events at "seconds" granularity
+        options["analytics"] = {"timeseries": {
+            "timeField": "timestamp",
+            "metaField": "email",
+            "granularity": settings.ANALYTICS_TIMESERIES_GRANULARITY,
+        }}
+        # time-series collections expire whole buckets instead of using a TTL index
+        if ttl:
+            options["analytics"]["expireAfterSeconds"] = ttl
+    return options
+
+def declared_indexes(ttl: int | None = None) -> dict:
+    """INDEXES with expireAfterSeconds set to `ttl` on the TTL indexes"""
+    if not ttl:
+        return INDEXES
+    declared = {}
+    for name, models in INDEXES.items():
+        ttl_index = None if "timeseries" in collection_options(ttl).get(name, {}) else TTL_INDEXES.get(name)
+        declared[name] = [
+            IndexModel(list(model.document["key"].items()), **{
+                **{option: value for option, value in model.document.items() if option != "key"},
+                "expireAfterSeconds": ttl,
+            }) if model.document["name"] == ttl_index else model
+            for model in models
+        ]
+    return declared
+
+async def collection_info(name: str) -> dict | None:
+    cursor = await db.list_collections(filter={"name": name})
+    infos = await cursor.to_list(length=1)
+    return infos[0] if infos else None
+
+async def collection_type(name: str) -> str | None:
+    """"collection", "timeseries" (or "view"), or None when it does not exist"""
+    info = await collection_info(name)
+    return info.get("type", "collection") if info else None
+
+async def ensure_collections(ttl: int | None = None):
+    """Create collections declared with options before anything creates them implicitly"""
+    for name, options in collection_options(ttl).items():
+        info = await collection_info(name)
+        existing = info.get("type", "collection") if info else None
+        if existing is None:
+            try:
+                await db.create_collection(name, **options)
+            except CollectionInvalid:
+                pass  # created concurrently
+        elif "timeseries" in options and existing != "timeseries":
+            logger.warning(
+                "%s is configured as a time-series collection but holds one document per event; "
+                "run python -m app.services.analytics_storage migrate", name
+            )
+        elif existing == "timeseries":
+            expire = options.get("expireAfterSeconds", "off")
+            current = info["options"].get("expireAfterSeconds", "off")
+            if current != expire:
+                if expire == "off" and retention_seconds():
+                    logger.warning("Stopped expiring %s: the daily rollups are behind the retention period", name)
+                await db.command("collMod", name, expireAfterSeconds=expire)
+
+# index options that change index behaviour and therefore count as drift
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+def _declared_spec(model: IndexModel):
+    document = model.document
+    return {
+        "key": list(document["key"].items()),
+        **{option: document[option] for option in COMPARED_OPTIONS if option in document},
+    }
+
+def _live_spec(info: dict):
+    return {
+        "key": [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in info["key"]],
+        **{option: info[option] for option in COMPARED_OPTIONS if option in info},
+    }
+
+async def check_index_drift():
+    """Compare declared and live indexes.
+
+    Returns {collection: {"missing": [...], "changed": [...], "extra": [...]}}
+    for every collection that differs from its declaration.
+    """
+    drift = {}
+    for name, models in declared_indexes(await armed_ttl()).items():
+        live = await db.get_collection(name).index_information()
+        live.pop("_id_", None)
+        declared = {model.document["name"]: model for model in models}
+
+        report = {
+            "missing": [index for index in declared if index not in live],
+            "changed": [
+                index for index, model in declared.items()
+                if index in live and _declared_spec(model) != _live_spec(live[index])
+            ],
+            "extra": [index for index in live if index not in declared],
+        }
+        if any(report.values()):
+            drift[name] = report
+    return drift
+
+async def ensure_indexes():
+    """Create every declared index; existing identical indexes are a no-op.
+
+    The TTL indexes get expireAfterSeconds once the retention is armed; a
+    live TTL index whose expireAfterSeconds differs is updated with collMod,
+    and one that should not expire (retention off, or the rollups fell
+    behind) is rebuilt without it.
+    Any other conflicting live index (same name, different definition) or
+    data that violates a unique index is logged and left alone rather than
+    failing startup.
+    """
+    ttl = await armed_ttl()
+    await ensure_collections(ttl)
+    for name, models in declared_indexes(ttl).items():
+        collection = db.get_collection(name)
+        live = None
+        for model in models:
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                live = live or await collection.index_information()
+                if await _update_ttl(name, model, live.get(model.document["name"])):
+                    continue
+                logger.warning("Could not build index %s.%s: %s", name, model.document["name"], e)
+
+async def _update_ttl(name: str, model: IndexModel, live: dict | None) -> bool:
+    """Bring a live index to the declared expireAfterSeconds if that is its only difference"""
+    if live is None:
+        return False
+    declared = _declared_spec(model)
+    current = _live_spec(live)
+    expire = current.pop("expireAfterSeconds", None)
+    if "expireAfterSeconds" not in declared:
+        if expire is None or current != declared:
+            return False
+        # collMod can add or change a TTL but not remove one
+        if retention_seconds():
+            logger.warning("Stopped expiring %s: the daily rollups are behind the retention period", name)
+        collection = db.get_collection(name)
+        await collection.drop_index(model.document["name"])
+        await collection.create_indexes([model])
+        return True
+    if {**current, "expireAfterSeconds": declared["expireAfterSeconds"]} != declared:
+        return False
+    await db.command("collMod", name, index={"name": model.document["name"], "expireAfterSeconds": declared["expireAfterSeconds"]})
+    return True
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    async def main(check_only: bool):
+        if not check_only:
+            await ensure_indexes()
+        drift = await check_index_drift()
+        for name, report in drift.items():
+            for kind, indexes in report.items():
+                for index in indexes:
+                    print(f"{name}: {kind} index {index}")
+        if not drift:
+            print("Indexes match declarations")
+        return 1 if drift and check_only else 0
+
+    sys.exit(asyncio.run(main("--check" in sys.argv[1:])))
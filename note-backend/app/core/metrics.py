@@ -0,0 +1,313 @@
+"""In-process metrics in the Prometheus text format.
+
+Three sources feed the registry: MetricsMiddleware (per-route latency and
+status counts), the pymongo listeners registered on the Motor client in
+app.db (per-collection command timings, document counts and connection pool
+usage), and LoopLagMonitor (how late the event loop wakes a sleeping task).
+The Mongo listeners run on Motor's worker threads, so every metric takes a
+lock on update.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from pymongo import monitoring
+from app.core.config import settings, lazy
+import asyncio
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+REGISTRY = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra="") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self):
+        with self._lock:
+            return [(labels, value) for labels, value in self._values.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.samples():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+class Histogram(_Metric):
+    """Fixed buckets; per label set keeps [count per bucket..., sum, count]"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            return [(labels, list(state)) for labels, state in self._values.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, state in self.samples():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                bucket = _labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            bucket = _labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket} {state[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {state[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {state[-1]}")
+        return lines
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request to the end of the response body", ("method", "route")
+)
+http_requests = Counter("http_requests_total", "Responses by route and status", ("method", "route", "status"))
+http_requests_in_progress = Gauge("http_requests_in_progress", "Requests currently being handled")
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "Mongo command round trips as seen by the driver", ("collection", "command")
+)
+mongo_command_documents = Counter(
+    "mongo_command_documents_total", "Documents returned or written by Mongo commands", ("collection", "command")
+)
+mongo_command_failures = Counter("mongo_command_failures_total", "Mongo commands that failed", ("collection", "command"))
+mongo_pool_connections = Gauge("mongo_pool_connections", "Pooled connections per server", ("address", "state"))
+mongo_pool_checkout_failures = Counter(
+    "mongo_pool_checkout_failures_total", "Connection checkouts that failed", ("address", "reason")
+)
+event_loop_lag = Histogram("event_loop_lag_seconds", "How late the event loop resumed a sleeping task", buckets=LAG_BUCKETS)
+
+# per-request list of (collection, command, seconds), set by ProfilingMiddleware;
+# Motor runs driver calls in a copy of the caller's context, so the listener sees it
+request_mongo_calls: ContextVar[list | None] = ContextVar("request_mongo_calls", default=None)
+
+UNMATCHED_ROUTE = "unmatched"
+
+class MetricsMiddleware:
+    """Record latency and status per route template.
+
+    The route label is the path template of the matched route (the router
+    leaves the endpoint in the shared scope), so /notes/{note_id} is one
+    series however many notes there are; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates = None
+
+    def route_template(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._templates is None:
+            self._templates = {
+                route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._templates.get(endpoint, UNMATCHED_ROUTE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def recording_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            http_requests_in_progress.dec()
+            route = self.route_template(scope)
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], route)
+            http_requests.inc(scope["method"], route, str(status))
+
+def _command_collection(command_name: str, command) -> str:
+    if command_name == "getMore":
+        return command.get("collection", "")
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+def _document_count(command_name: str, reply) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+class CommandMetrics(monitoring.CommandListener):
+    """Per-collection, per-command durations, document counts and failures.
+
+    Inside a request being timed, each command is also appended to
+    request_mongo_calls.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def started(self, event):
+        key = (event.connection_id, event.request_id)
+        self._inflight[key] = _command_collection(event.command_name, event.command)
+
+    def record(self, event) -> str:
+        collection = self._inflight.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        calls = request_mongo_calls.get()
+        if calls is not None:
+            calls.append((collection, event.command_name, event.duration_micros / 1e6))
+        return collection
+
+    def succeeded(self, event):
+        collection = self.record(event)
+        documents = _document_count(event.command_name, event.reply)
+        if documents:
+            mongo_command_documents.inc(collection, event.command_name, amount=documents)
+
+    def failed(self, event):
+        collection = self.record(event)
+        mongo_command_failures.inc(collection, event.command_name)
+
+def _address(address) -> str:
+    return f"{address[0]}:{address[1]}"
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Open and checked-out connections per server"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        mongo_pool_connections.set(0, _address(event.address), "open")
+        mongo_pool_connections.set(0, _address(event.address), "in_use")
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(_address(event.address), "open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(_address(event.address), "open")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures.inc(_address(event.address), str(event.reason))
+
+    def connection_checked_out(self, event):
+        mongo_pool_connections.inc(_address(event.address), "in_use")
+
+    def connection_checked_in(self, event):
+        mongo_pool_connections.dec(_address(event.address), "in_use")
+
+def pool_usage(max_pool_size: int) -> dict:
+    """{"host:port": {"open", "inUse", "maxSize"}} from the pool listener's gauges"""
+    usage = {}
+    for (address, state), value in mongo_pool_connections.samples():
+        entry = usage.setdefault(address, {"open": 0, "inUse": 0, "maxSize": max_pool_size})
+        entry["inUse" if state == "in_use" else "open"] = int(value)
+    return usage
+
+class LoopLagMonitor:
+    """Background task that sleeps `interval` seconds and records how late it wakes"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - start - self.interval)
+            event_loop_lag.observe(self.last_lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+command_metrics = CommandMetrics()
+pool_metrics = PoolMetrics()
+loop_lag_monitor = lazy(lambda: LoopLagMonitor(settings.LOOP_LAG_SAMPLE_INTERVAL))
@@ -0,0 +1,169 @@
+"""On-demand request profiling for admins.
+
+An admin request carrying `X-Profile: 1` or `?profile=1` runs under cProfile;
+its hottest functions with their callees, plus how much of the request was
+spent in Mongo round trips versus everything else, go into a bounded ring
+buffer served by /profiles. The response carries `X-Profile-Id` to look the
+entry up.
+
+cProfile hooks the whole event-loop thread, so a profile also contains
+whatever other requests ran meanwhile; only one request is profiled at a
+time, and a second one asking while the profiler is busy is served
+unprofiled. When PROFILE_SLOW_REQUEST_MS is set, any request slower than
+that is captured too, with the Mongo/Python breakdown but no call tree.
+"""
+from collections import deque
+from datetime import datetime
+from starlette.datastructures import Headers, QueryParams
+from app.core.auth import token_cache
+from app.core.config import settings, lazy
+from app.core.metrics import request_mongo_calls
+import cProfile
+import itertools
+import pstats
+import time
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY = "profile"
+CALLEES_PER_FUNCTION = 5
+
+def call_tree(profiler: cProfile.Profile, limit: int) -> list[dict]:
+    """Top `limit` functions by cumulative time, each with its heaviest callees"""
+    stats = pstats.Stats(profiler).stats
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((cumulative, function))
+
+    ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{
+        "function": pstats.func_std_string(function),
+        "calls": calls,
+        "selfMs": round(own * 1000, 3),
+        "cumulativeMs": round(cumulative * 1000, 3),
+        "callees": [
+            {"function": pstats.func_std_string(callee), "cumulativeMs": round(seconds * 1000, 3)}
+            for seconds, callee in sorted(callees.get(function, []), reverse=True)[:CALLEES_PER_FUNCTION]
+        ],
+    } for function, (_, calls, own, cumulative, _) in ranked]
+
+def mongo_breakdown(calls: list, total: float) -> dict:
+    """Split a request's wall time into Mongo round trips and the rest"""
+    mongo = sum(seconds for _, _, seconds in calls)
+    by_command = {}
+    for collection, command, seconds in calls:
+        entry = by_command.setdefault(f"{collection}.{command}" if collection else command, {"count": 0, "ms": 0.0})
+        entry["count"] += 1
+        entry["ms"] += seconds * 1000
+    return {
+        "totalMs": round(total * 1000, 3),
+        "mongoMs": round(mongo * 1000, 3),
+        # concurrent commands can add up to more than the wall time
+        "pythonMs": round(max(total - mongo, 0.0) * 1000, 3),
+        "mongoCommands": len(calls),
+        "byCommand": {name: {"count": entry["count"], "ms": round(entry["ms"], 3)} for name, entry in by_command.items()},
+    }
+
+class ProfileStore:
+    """Ring buffer of the most recent captured profiles"""
+
+    def __init__(self, max_size: int):
+        self._entries = deque(maxlen=max_size)
+        self._ids = itertools.count(1)
+
+    def new_id(self) -> int:
+        return next(self._ids)
+
+    def add(self, entry: dict) -> int:
+        entry.setdefault("id", self.new_id())
+        self._entries.append(entry)
+        return entry["id"]
+
+    def list(self) -> list[dict]:
+        """Newest first, without the call trees"""
+        return [{key: value for key, value in entry.items() if key != "callTree"} for entry in reversed(self._entries)]
+
+    def get(self, profile_id: int):
+        return next((entry for entry in self._entries if entry["id"] == profile_id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+profile_store = lazy(lambda: ProfileStore(settings.PROFILE_BUFFER_SIZE))
+
+def is_admin_request(headers: Headers) -> bool:
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    principal = token_cache.get(token)
+    return principal is not None and principal.is_admin
+
+def profiling_requested(scope) -> bool:
+    headers = Headers(scope=scope)
+    flag = headers.get(PROFILE_HEADER) or QueryParams(scope.get("query_string", b"")).get(PROFILE_QUERY)
+    return flag in ("1", "true") and is_admin_request(headers)
+
+class ProfilingMiddleware:
+    """Profile flagged admin requests and capture slow ones (see module docstring)"""
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = profiling_requested(scope)
+        profiler = None
+        if requested and not self._busy:
+            profiler = cProfile.Profile()
+        slow_after = settings.PROFILE_SLOW_REQUEST_MS / 1000
+        if profiler is None and not slow_after:
+            await self.app(scope, receive, send)
+            return
+
+        entry = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "startedAt": datetime.utcnow(),
+            "status": 500,
+        }
+        if profiler is not None:
+            entry["id"] = self.store.new_id()
+
+        async def capturing_send(message):
+            if message["type"] == "http.response.start":
+                entry["status"] = message["status"]
+                if profiler is not None:
+                    message.setdefault("headers", []).append((b"x-profile-id", str(entry["id"]).encode()))
+                elif requested:
+                    message.setdefault("headers", []).append((b"x-profile", b"busy"))
+            await send(message)
+
+        calls = []
+        token = request_mongo_calls.set(calls)
+        start = time.perf_counter()
+        if profiler is not None:
+            self._busy = True
+            profiler.enable()
+        try:
+            await self.app(scope, receive, capturing_send)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._busy = False
+            elapsed = time.perf_counter() - start
+            request_mongo_calls.reset(token)
+
+            entry.update(mongo_breakdown(calls, elapsed))
+            if profiler is not None:
+                entry["trigger"] = "requested"
+                entry["callTree"] = call_tree(profiler, settings.PROFILE_TOP_FUNCTIONS)
+                self.store.add(entry)
+            elif elapsed >= slow_after:
+                entry["trigger"] = "slow"
+                self.store.add(entry)
@@ -0,0 +1,83 @@
+"""JSON rendering straight from Mongo documents.
+
+BSONResponse serializes with orjson, encoding ObjectId (and the other BSON
+scalar types Motor hands back) in the same pass as datetimes and nested
+documents. BSONRoute makes routes return their results through it directly:
+FastAPI would otherwise walk and copy every result with jsonable_encoder
+before rendering it.
+"""
+from bson import ObjectId, Decimal128, Timestamp
+from bson.binary import Binary
+from fastapi import Response
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+import asyncio
+import functools
+import inspect
+import orjson
+
+def bson_default(value):
+    """orjson fallback for types it does not know natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, Timestamp):
+        return value.as_datetime()
+    if isinstance(value, Binary):
+        return value.hex()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class BSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+
+RESPONSE_PARAM = "_rendered_response"
+
+def render_directly(endpoint, status_code: int | None):
+    """Wrap an async endpoint so its result is returned as a BSONResponse.
+
+    The wrapper takes the per-request Response FastAPI injects (adding a
+    parameter for it unless the endpoint already has one) and carries the
+    headers and status code set on it over.
+    """
+    signature = inspect.signature(endpoint)
+    declared = next((name for name, param in signature.parameters.items() if param.annotation is Response), None)
+    response_param = declared or RESPONSE_PARAM
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        sub_response = kwargs[response_param] if declared else kwargs.pop(response_param)
+        result = await endpoint(**kwargs)
+        if isinstance(result, Response):
+            return result
+        response = BSONResponse(result, status_code=sub_response.status_code or status_code or 200)
+        response.headers.raw.extend(sub_response.headers.raw)
+        return response
+
+    if not declared:
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(RESPONSE_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ])
+    return wrapper
+
+class BSONRoute(APIRoute):
+    """APIRoute that renders plain results with BSONResponse, skipping jsonable_encoder.
+
+    Routes with a response_model keep FastAPI's validation path.
+    """
+
+    def __init__(self, path: str, endpoint, *, response_model=Default(None), **kwargs):
+        plain = (
+            isinstance(response_model, DefaultPlaceholder)
+            and inspect.signature(endpoint).return_annotation is inspect.Signature.empty
+        )
+        if plain and asyncio.iscoroutinefunction(endpoint):
+            endpoint = render_directly(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, response_model=response_model, **kwargs)
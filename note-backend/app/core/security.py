@@ -1,10 +1,29 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from app.core.config import settings
-from app.db import db
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from app.core.config import settings, lazy
+import asyncio
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min == max == default, so a hash made with any other cost is flagged for rehash
+pwd_context = lazy(lambda: CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+))
+
+# bcrypt holds the CPU for tens of milliseconds; run it here, never on the event loop
+password_executor = lazy(lambda: ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+))
+_password_work_in_flight = 0
+
+def password_work_limit() -> int:
+    return settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -12,15 +31,40 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
+async def run_password_work(fn, *args):
+    """Run fn in the password executor, refusing work once the queue is full"""
+    global _password_work_in_flight
+    if _password_work_in_flight >= password_work_limit():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-in attempts in progress, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    _password_work_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, fn, *args)
+    finally:
+        _password_work_in_flight -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await run_password_work(hash_password, password)
+
+async def verify_and_update_password(password: str, hashed: str):
+    """Return (valid, new_hash); new_hash is set when the stored cost is out of date"""
+    return await run_password_work(pwd_context.verify_and_update, password, hashed)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
-def decode_access_token(token: str):
+def decode_access_token_claims(token: str):
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        return payload.get("sub")
+        return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
     except JWTError:
         return None
+
+def decode_access_token(token: str):
+    payload = decode_access_token_claims(token)
+    return payload.get("sub") if payload else None
@@ -0,0 +1,49 @@
+"""Startup timing report.
+
+app.main records how long importing the app took, and the lifespan handler
+times each startup step. Once the app is ready the report is logged,
+exported as app_startup_phase_seconds, included in /ready, and checked
+against STARTUP_BUDGET_SECONDS.
+"""
+from app.core.config import settings
+from app.core.metrics import Gauge
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+startup_phase_seconds = Gauge("app_startup_phase_seconds", "Time spent in each import/startup phase", ("phase",))
+
+class StartupReport:
+    def __init__(self):
+        self.phases = {}
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = seconds
+        startup_phase_seconds.set(seconds, phase)
+
+    async def timed(self, phase: str, awaitable):
+        """Await `awaitable`, recording how long it took as `phase`"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        return {
+            "phases": {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            "totalMs": round((self.phases.get("import", 0) + self.phases.get("startup", 0)) * 1000, 1),
+        }
+
+    def finish(self):
+        """Log the report, warning when import plus startup exceeded the budget"""
+        summary = self.summary()
+        phases = ", ".join(f"{phase} {ms}ms" for phase, ms in summary["phases"].items())
+        budget = settings.STARTUP_BUDGET_SECONDS
+        if budget and summary["totalMs"] > budget * 1000:
+            logger.warning("Cold start took %sms, over the %sms budget (%s)", summary["totalMs"], budget * 1000, phases)
+        else:
+            logger.info("Cold start took %sms (%s)", summary["totalMs"], phases)
+
+startup_report = StartupReport()
@@ -1,10 +1,113 @@
-import motor.motor_asyncio
-from decouple import config
+"""MongoDB client lifecycle.
+
+The app opens the client in its lifespan handler (connect(), which also
+warms the pool up before the app reports ready) and closes it on shutdown.
+Modules keep module-level handles from `db.get_collection(...)`: those are
+thin stand-ins resolving to the current client on every use, so they stay
+valid across connect()/close() and can be pointed at another client with
+use_client(). Scripts that never call connect() get a client on first use.
+"""
 from app.core.config import settings
+from app.core.metrics import command_metrics, pool_metrics, pool_usage
+import asyncio
+import motor.motor_asyncio
+
+_client = None
+_database = None
+_collections = {}
+
+def client_options() -> dict:
+    """Driver options from Settings; unset ones keep the driver defaults"""
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxConnecting": settings.MONGO_MAX_CONNECTING,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
+        "compressors": settings.MONGO_COMPRESSORS or None,
+        "retryWrites": settings.MONGO_RETRY_WRITES,
+        "retryReads": settings.MONGO_RETRY_READS,
+        "appname": settings.MONGO_APP_NAME,
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+def create_client(url: str | None = None):
+    return motor.motor_asyncio.AsyncIOMotorClient(
+        url or settings.MONGO_URL, event_listeners=[command_metrics, pool_metrics], **client_options()
+    )
+
+def use_client(client, database_name: str | None = None):
+    """Make `client` the one every handle resolves to (tests and benchmarks pass fakes here)"""
+    global _client, _database
+    _client = client
+    _database = client[database_name] if database_name else client.get_database()
+    _collections.clear()
+
+def get_client():
+    if _client is None:
+        use_client(create_client())
+    return _client
+
+def get_database():
+    if _database is None:
+        get_client()
+    return _database
+
+def _collection(name: str):
+    collection = _collections.get(name)
+    if collection is None:
+        collection = _collections[name] = get_database().get_collection(name)
+    return collection
+
+async def warm_up(connections: int):
+    """Open `connections` pooled connections now rather than on the first requests"""
+    await asyncio.gather(*(get_database().command("ping") for _ in range(max(connections, 1))))
+
+async def connect():
+    get_client()
+    await warm_up(settings.MONGO_WARMUP_CONNECTIONS)
+
+def close():
+    global _client, _database
+    if _client is not None:
+        _client.close()
+    _client = _database = None
+    _collections.clear()
+
+def pool_stats() -> dict:
+    """Configured pool bounds and per-server open/in-use connections"""
+    return {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "servers": pool_usage(settings.MONGO_MAX_POOL_SIZE),
+    }
+
+class CollectionHandle:
+    """Module-level collection handle that resolves against the current client"""
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(_collection(self.name), attribute)
+
+    def __repr__(self):
+        return f"CollectionHandle({self.name!r})"
+
+class DatabaseHandle:
+    """Stand-in for the Motor database of the current client"""
 
+    def get_collection(self, name: str) -> CollectionHandle:
+        return CollectionHandle(name)
 
-MONGO_URL = config("MONGO_URL") 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL)
-db = client.get_database() 
+    def __getitem__(self, name: str) -> CollectionHandle:
+        return CollectionHandle(name)
 
+    def __getattr__(self, attribute):
+        return getattr(get_database(), attribute)
 
+db = DatabaseHandle()
@@ -1,12 +1,52 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import auth, notes, share, analytics
-from app.db import db
-from app.routes import public_notes
+from app.db import connect, close
+from app.routes import public_notes, transfer, metrics, profiling
 from app.services.auth_service import ensure_admin_user
+from app.core.indexes import ensure_indexes
+from app.models.note import get_note_collection
+from app.services.tags_service import backfill_tag_stats
+from app.services.search_service import backfill_index
+from app.core.responses import BSONResponse
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, loop_lag_monitor
+from app.core.profiling import ProfilingMiddleware
+from app.core.startup import startup_report
+from app.services.ingest_service import analytics_buffer
+from app.services.views_service import view_counter, view_log_buffer
+from app.services.retention_service import rollup_job
+from contextlib import asynccontextmanager
 import asyncio
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # independent steps run side by side; the pool is warm before uvicorn accepts requests
+    await startup_report.timed("startup", asyncio.gather(
+        startup_report.timed("mongo_warmup", connect()),
+        startup_report.timed("admin_user", ensure_admin_user()),
+        startup_report.timed("indexes", ensure_indexes()),
+        startup_report.timed("tag_stats", backfill_tag_stats(get_note_collection())),
+        startup_report.timed("search_index", backfill_index(get_note_collection())),
+    ))
+    analytics_buffer.start()
+    view_counter.start()
+    view_log_buffer.start()
+    loop_lag_monitor.start()
+    rollup_job.start()
+    startup_report.finish()
+    yield
+    await analytics_buffer.stop()
+    await view_counter.stop()
+    await view_log_buffer.stop()
+    await loop_lag_monitor.stop()
+    await rollup_job.stop()
+    close()
+
+app = FastAPI(default_response_class=BSONResponse, lifespan=lifespan)
 
 #main connection between frontend and backend
 app.add_middleware(
@@ -16,6 +56,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 # route cretaion----name registration
@@ -24,11 +67,13 @@ app.include_router(notes.router, prefix="/notes", tags=["Notes"])
 app.include_router(share.router, prefix="/share", tags=["Share"])
 app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 app.include_router(public_notes.router, prefix="/public_notes", tags=["Public_notes"])
+app.include_router(transfer.router, prefix="/data", tags=["Data"])
+app.include_router(metrics.router, tags=["Metrics"])
+app.include_router(profiling.router, prefix="/profiles", tags=["Profiling"])
 
-@app.on_event("startup")
-async def startup_event():
-    await ensure_admin_user()
 
 @app.get("/")
 def root():
     return {"message": "Note API is running 🚀"}
+
+startup_report.record("import", time.perf_counter() - IMPORT_STARTED)
@@ -0,0 +1,7 @@
+from app.db import db
+
+def get_search_terms_collection():
+    return db.get_collection("note_terms")
+
+def get_search_stats_collection():
+    return db.get_collection("note_search_stats")
@@ -0,0 +1,4 @@
+from app.db import db
+
+def get_tag_stats_collection():
+    return db.get_collection("tag_stats")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from app.services.analytics_service import (
     most_used_tags, 
     notes_per_day, 
@@ -6,72 +6,52 @@ from app.services.analytics_service import (
     get_user_login_logout_activity,
     get_user_study_activity,
     get_daily_activity_summary,
-    get_most_active_user_chart
+    get_most_active_user_chart,
+    get_dashboard
 )
-from app.core.security import decode_access_token
-from fastapi.security import OAuth2PasswordBearer
+from app.core.auth import Principal, get_current_user
+from app.core.responses import BSONRoute
+from app.services.ingest_service import analytics_buffer
+from app.services.sessions_service import total_session_durations, apply_session_events
+from app.services.views_service import view_counter, view_log_buffer
 from app.db import db
+from app.utils.shared import document_response
 from datetime import datetime
-from collections import defaultdict
 
-router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
-
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    user = decode_access_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return user
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/")
-async def get_analytics(user: str = Depends(get_current_user)):
+async def get_analytics(user: Principal = Depends(get_current_user)):
     """Get all analytics data for dashboard"""
     try:
-        top_tags = await most_used_tags()
-        notes_daily = await notes_per_day()
-        active_users = await most_active_users()
-        
-        # Add new analytics for admin
-        if user == "swarnadeep321@gmail.com":
-            login_logout_activity = await get_user_login_logout_activity()
-            study_activity = await get_user_study_activity()
-            daily_activity = await get_daily_activity_summary()
-            most_active_chart = await get_most_active_user_chart()
-            
-            return {
-                "top_tags": top_tags,
-                "notes_per_day": notes_daily,
-                "top_users": active_users,
-                "login_logout_activity": login_logout_activity,
-                "study_activity": study_activity,
-                "daily_activity": daily_activity,
-                "most_active_chart": most_active_chart
-            }
-        else:
-            return {
-                "top_tags": top_tags,
-                "notes_per_day": notes_daily,
-                "top_users": active_users
-            }
+        # admin additionally gets the tracked-user sections
+        return await get_dashboard(include_admin=user.is_admin)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching analytics: {str(e)}")
 
 @router.get("/tags")
-async def tags(user: str = Depends(get_current_user)):
+async def tags(user: Principal = Depends(get_current_user)):
     return await most_used_tags()
 
 @router.get("/notes-daily")
-async def notes_by_day(user: str = Depends(get_current_user)):
+async def notes_by_day(user: Principal = Depends(get_current_user)):
     return await notes_per_day()
 
 @router.get("/active-users")
-async def active_users(user: str = Depends(get_current_user)):
+async def active_users(user: Principal = Depends(get_current_user)):
     return await most_active_users()
 
+def buffer_event(document: dict):
+    if not analytics_buffer.submit(document):
+        raise HTTPException(
+            status_code=503,
+            detail="Analytics ingest is saturated, retry later",
+            headers={"Retry-After": "1"}
+        )
+
 @router.post("/track")
 async def track_analytics(data: dict):
-    analytics = db.get_collection("analytics")
-    await analytics.insert_one({
+    buffer_event({
         "email": data.get("email"),
         "timeSpent": data.get("timeSpent"),
         "page": data.get("page"),
@@ -81,8 +61,7 @@ async def track_analytics(data: dict):
 
 @router.post("/track-login")
 async def track_login(data: dict):
-    analytics = db.get_collection("analytics")
-    await analytics.insert_one({
+    buffer_event({
         "email": data.get("email"),
         "event": "login",
         "timestamp": datetime.utcnow()
@@ -91,90 +70,84 @@ async def track_login(data: dict):
 
 @router.post("/track-logout")
 async def track_logout(data: dict):
-    analytics = db.get_collection("analytics")
-    await analytics.insert_one({
+    buffer_event({
         "email": data.get("email"),
         "event": "logout",
         "timestamp": datetime.utcnow()
     })
     return {"msg": "Logout tracked"}
 
+@router.get("/ingest-stats")
+async def ingest_stats(user: Principal = Depends(get_current_user)):
+    """Queued, flushed and dropped counts of the write buffers (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can view ingest stats")
+    return {
+        "analytics": analytics_buffer.stats(),
+        "note_views": view_log_buffer.stats(),
+        "note_view_counts": view_counter.stats()
+    }
+
 @router.get("/user-activity")
-async def get_user_activity(user: str = Depends(get_current_user)):
-    if user != "swarnadeep321@gmail.com":
+async def get_user_activity(user: Principal = Depends(get_current_user)):
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view analytics")
     analytics = db.get_collection("analytics")
     data = await analytics.find().sort("timestamp", -1).to_list(200)
-    for entry in data:
-        entry["id"] = str(entry["_id"])
-        del entry["_id"]
-    return data
+    return [document_response(entry) for entry in data]
 
 @router.get("/my-activity")
-async def get_my_activity(user: str = Depends(get_current_user)):
-    if user == "swarnadeep321@gmail.com":
+async def get_my_activity(user: Principal = Depends(get_current_user)):
+    if user.is_admin:
         return []
     analytics = db.get_collection("analytics")
-    data = await analytics.find({"email": user}).sort("timestamp", -1).to_list(100)
-    for entry in data:
-        entry["id"] = str(entry["_id"])
-        del entry["_id"]
-    return data
+    data = await analytics.find({"email": user.email}).sort("timestamp", -1).to_list(100)
+    return [document_response(entry) for entry in data]
 
 @router.get("/user-login-logout-activity")
-async def user_login_logout_activity(user: str = Depends(get_current_user)):
+async def user_login_logout_activity(user: Principal = Depends(get_current_user)):
     """Get detailed login/logout activity for tracked users (admin only)"""
-    if user != "swarnadeep321@gmail.com":
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view user activity")
     return await get_user_login_logout_activity()
 
 @router.get("/user-study-activity")
-async def user_study_activity(user: str = Depends(get_current_user)):
+async def user_study_activity(
+    days: int = Query(30, ge=1, le=3650, description="Window; days past the raw retention come from daily summaries"),
+    user: Principal = Depends(get_current_user)
+):
     """Get study activity for tracked users (admin only)"""
-    if user != "swarnadeep321@gmail.com":
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view study activity")
-    return await get_user_study_activity()
+    return await get_user_study_activity(days)
 
 @router.get("/daily-activity-summary")
-async def daily_activity_summary(user: str = Depends(get_current_user)):
+async def daily_activity_summary(
+    days: int = Query(7, ge=1, le=3650, description="Window; days past the raw retention come from daily summaries"),
+    user: Principal = Depends(get_current_user)
+):
     """Get daily activity summary for tracked users (admin only)"""
-    if user != "swarnadeep321@gmail.com":
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view daily activity")
-    return await get_daily_activity_summary()
+    return await get_daily_activity_summary(days)
 
 @router.get("/most-active-user-chart")
-async def most_active_user_chart(user: str = Depends(get_current_user)):
+async def most_active_user_chart(user: Principal = Depends(get_current_user)):
     """Get most active user chart data (admin only)"""
-    if user != "swarnadeep321@gmail.com":
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view most active user data")
     return await get_most_active_user_chart()
 
 @router.get("/session-durations")
-async def session_durations(user: str = Depends(get_current_user)):
-    if user != "swarnadeep321@gmail.com":
+async def session_durations(user: Principal = Depends(get_current_user)):
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view session durations")
-    analytics = db.get_collection("analytics")
-    data = await analytics.find({"event": {"$in": ["login", "logout"]}}).sort("timestamp", 1).to_list(1000)
-    sessions = defaultdict(list)
-    for entry in data:
-        sessions[entry["email"]].append(entry)
-    user_durations = {}
-    for email, events in sessions.items():
-        total = 0
-        login_time = None
-        for event in events:
-            if event["event"] == "login":
-                login_time = event["timestamp"]
-            elif event["event"] == "logout" and login_time:
-                total += (event["timestamp"] - login_time).total_seconds()
-                login_time = None
-        user_durations[email] = total
-    return user_durations
+    return await total_session_durations()
 
 @router.get("/debug-analytics")
-async def debug_analytics(user: str = Depends(get_current_user)):
+async def debug_analytics(user: Principal = Depends(get_current_user)):
     """Debug endpoint to check analytics data (admin only)"""
-    if user != "swarnadeep321@gmail.com":
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can view debug data")
     
     analytics = db.get_collection("analytics")
@@ -202,9 +175,9 @@ async def debug_analytics(user: str = Depends(get_current_user)):
     }
 
 @router.post("/create-test-data")
-async def create_test_data(user: str = Depends(get_current_user)):
+async def create_test_data(user: Principal = Depends(get_current_user)):
     """Create test analytics data for tracked users (admin only)"""
-    if user != "swarnadeep321@gmail.com":
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can create test data")
     
     analytics = db.get_collection("analytics")
@@ -243,6 +216,10 @@ async def create_test_data(user: str = Depends(get_current_user)):
     
     if test_data:
         await analytics.insert_many(test_data)
+        await apply_session_events(sorted(
+            (entry for entry in test_data if "event" in entry),
+            key=lambda entry: entry["timestamp"]
+        ))
     
     return {
         "message": f"Created {len(test_data)} test records",
@@ -2,22 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from app.schemas.user import UserCreate, UserLogin, Token
 from app.services.auth_service import register_user, login_user
 from app.db import db
-from fastapi.security import OAuth2PasswordBearer
-from app.core.security import decode_access_token
+from app.core.auth import Principal, get_current_user, token_cache
+from app.core.responses import BSONRoute
 
-router = APIRouter()
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+router = APIRouter(route_class=BSONRoute)
 
 ADMIN_EMAIL = "swarnadeep321@gmail.com"
 ADMIN_PASSWORD = "123"
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    user = decode_access_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return user
-
 @router.post("/register")
 async def register(data: UserCreate):
     return await register_user(data.email, data.password)
@@ -25,3 +17,10 @@ async def register(data: UserCreate):
 @router.post("/login", response_model=Token)
 async def login(data: UserLogin):
     return await login_user(data.email, data.password)
+
+@router.get("/cache-stats")
+async def cache_stats(user: Principal = Depends(get_current_user)):
+    """Hit/miss counters of the verified-token cache (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can view auth cache stats")
+    return token_cache.stats()
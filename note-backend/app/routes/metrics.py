@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Response
+from pymongo.errors import PyMongoError
+from app.core.responses import BSONRoute
+from app.core.config import settings
+from app.core.metrics import render_metrics, loop_lag_monitor
+from app.core.startup import startup_report
+from app.db import db, pool_stats
+import asyncio
+import time
+
+router = APIRouter(route_class=BSONRoute)
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the in-process metrics"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/ready")
+async def ready(response: Response):
+    """Readiness probe: Mongo ping latency, connection pool usage and event-loop lag"""
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), settings.READINESS_PING_TIMEOUT)
+    except (PyMongoError, asyncio.TimeoutError) as e:
+        response.status_code = 503
+        return {"status": "unavailable", "mongo": {"error": str(e) or "ping timed out"}}
+
+    return {
+        "status": "ready",
+        "mongo": {
+            "pingMs": round((time.perf_counter() - start) * 1000, 2),
+            "pool": pool_stats(),
+        },
+        "eventLoopLagMs": round(loop_lag_monitor.last_lag * 1000, 2),
+        "startup": startup_report.summary(),
+    }
@@ -1,126 +1,234 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from app.services.notes_service import create_note, get_user_notes, update_note, delete_note, update_note_sharing
-from app.schemas.note import NoteCreate, NoteUpdate
-from app.core.security import decode_access_token
-from fastapi.security import OAuth2PasswordBearer
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from app.services.notes_service import (
+    create_note, get_user_notes, update_note, delete_note, update_note_sharing,
+    get_notes_batch, bulk_note_operations, list_projection
+)
+from app.services.tags_service import suggest_tags
+from app.services.views_service import get_view_stats
+from app.services.note_repository import get_note, get_note_meta, note_cache
+from app.utils.shared import (
+    document_response, note_etag, notes_page_etag, is_not_modified, has_validators,
+    validator_headers, not_modified_response, if_match_version
+)
+from app.schemas.note import NoteCreate, NoteUpdate, BulkNoteRequest
+from app.core.config import settings
+from app.core.auth import Principal, get_current_user
+from typing import List, Literal
 from app.schemas.note import SharePermission
 from bson import ObjectId
 from bson.errors import InvalidId
-from app.models.note import get_note_collection
 from fastapi.responses import JSONResponse
+from app.core.responses import BSONRoute
 import socket
 from datetime import datetime
 
 
-router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+router = APIRouter(route_class=BSONRoute)
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    user = decode_access_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return user
-
-ADMIN_EMAIL = "swarnadeep321@gmail.com"
-
-def is_admin(user_email: str):
-    return user_email == ADMIN_EMAIL
+def ensure_can_read(note: dict, user: Principal):
+    if note["owner"] != user.email:
+        allowed = any(
+            entry["email"] == user.email for entry in note.get("sharedWith", [])
+        )
+        if not allowed:
+            raise HTTPException(status_code=403, detail="You do not have permission to view this note")
 
 @router.get("/public/notes/{note_id}")
-async def public_note_view(note_id: str):
+async def public_note_view(note_id: str, request: Request, response: Response):
     try:
         _id = ObjectId(note_id)
-        notes = get_note_collection()
-        note = await notes.find_one({"_id": _id})
-        if not note:
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid note ID format")
+
+    if has_validators(request):
+        meta = await get_note_meta(_id)
+        if not meta:
             raise HTTPException(status_code=404, detail="Note not found")
+        etag = note_etag(meta)
+        if is_not_modified(request, etag, meta.get("updatedAt")):
+            return not_modified_response(etag, meta.get("updatedAt"), private=False)
 
-        return {
-            "title": note.get("title", ""),
-            "content": note.get("content", ""),
-            "createdAt": note.get("createdAt"),
-            "updatedAt": note.get("updatedAt")
-        }
-    except:
-        raise HTTPException(status_code=400, detail="Invalid note ID format")
+    note = await get_note(_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    response.headers.update(validator_headers(note_etag(note), note.get("updatedAt"), private=False))
+    return {
+        "title": note.get("title", ""),
+        "content": note.get("content", ""),
+        "createdAt": note.get("createdAt"),
+        "updatedAt": note.get("updatedAt")
+    }
 
 @router.post("/")
-async def create(data: NoteCreate, user: str = Depends(get_current_user)):
-    if not is_admin(user):
+async def create(data: NoteCreate, user: Principal = Depends(get_current_user)):
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can create notes")
-    return await create_note(data.dict(), user)
+    return await create_note(data.dict(), user.email)
 
 @router.get("/")
 async def get_notes(
-    user: str = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    user: Principal = Depends(get_current_user),
     search: str | None = Query(None, description="Search in title, content, or tags"),
     page: int = Query(1, ge=1, description="Page number"),
-    limit: int = Query(10, ge=1, le=100, description="Items per page")
+    limit: int = Query(10, ge=1, le=100, description="Items per page"),
+    cursor: str | None = Query(None, description="Opaque cursor from next_cursor; pass an empty value for the first page"),
+    view: Literal["full", "summary"] = Query("full", description="summary returns card fields and a content snippet"),
+    fields: str | None = Query(None, description="Comma-separated fields to return, e.g. title,snippet,tags")
 ):
-    return await get_user_notes(user, search, page, limit)
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    projection = list_projection(view, selected)
+    variant = f"{view}:{','.join(selected or [])}"
+
+    if has_validators(request):
+        # ids and versions only: enough to tell whether the page changed
+        versions = await get_user_notes(user.email, user.is_admin, search, page, limit, cursor, projection={"updatedAt": 1, "version": 1})
+        etag = notes_page_etag(versions, variant)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+    result = await get_user_notes(user.email, user.is_admin, search, page, limit, cursor, projection)
+    response.headers.update(validator_headers(notes_page_etag(result, variant)))
+    return result
 
-@router.get("/{note_id}")
-async def get_single_note(note_id: str, user: str = Depends(get_current_user)):
-    notes = get_note_collection()
+@router.get("/tags/autocomplete")
+async def autocomplete_tags(
+    q: str = Query("", max_length=64, description="Tag prefix"),
+    limit: int = Query(10, ge=1, le=50),
+    user: Principal = Depends(get_current_user)
+):
+    return await suggest_tags(q, limit)
+
+@router.get("/batch")
+async def get_batch(
+    ids: str = Query(..., description="Comma-separated note ids"),
+    user: Principal = Depends(get_current_user)
+):
+    note_ids = [note_id.strip() for note_id in ids.split(",") if note_id.strip()]
+    if len(note_ids) > settings.NOTE_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.NOTE_BATCH_MAX_IDS} ids per batch")
+    return await get_notes_batch(note_ids, user.email)
+
+@router.post("/bulk")
+async def bulk(payload: BulkNoteRequest, user: Principal = Depends(get_current_user)):
+    """Apply many create/update/archive/delete operations; each gets its own result"""
+    operations = [
+        {
+            "op": item.op,
+            "id": item.id,
+            "note": item.note.dict() if item.note else None,
+            "changes": item.changes.dict(exclude_unset=True) if item.changes else None,
+            "archived": item.archived,
+            "version": item.version,
+        }
+        for item in payload.operations
+    ]
+    return await bulk_note_operations(operations, user.email, user.is_admin)
+
+@router.get("/cache-stats")
+async def cache_stats(user: Principal = Depends(get_current_user)):
+    """Hit ratio and memory footprint of the note cache (admin only)"""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can view note cache stats")
+    return note_cache.stats()
 
+@router.get("/{note_id}")
+async def get_single_note(note_id: str, request: Request, response: Response, user: Principal = Depends(get_current_user)):
     try:
         _id = ObjectId(note_id)
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid note ID format")
 
-    note = await notes.find_one({"_id": _id})
+    if has_validators(request):
+        meta = await get_note_meta(_id)
+        if not meta:
+            raise HTTPException(status_code=404, detail="Note not found")
+        ensure_can_read(meta, user)
+        etag = note_etag(meta)
+        if is_not_modified(request, etag, meta.get("updatedAt")):
+            return not_modified_response(etag, meta.get("updatedAt"))
+
+    note = await get_note(_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    if note["owner"] != user:
-        allowed = any(
-            entry["email"] == user for entry in note.get("sharedWith", [])
-        )
-        if not allowed:
-            raise HTTPException(status_code=403, detail="You do not have permission to view this note")
+    ensure_can_read(note, user)
+    response.headers.update(validator_headers(note_etag(note), note.get("updatedAt")))
 
-    note["id"] = str(note["_id"])
-    del note["_id"]
-    return note
+    return document_response(note)
 
 @router.put("/{note_id}")
-async def update(note_id: str, data: NoteUpdate, user: str = Depends(get_current_user)):
-    if not is_admin(user):
+async def update(
+    note_id: str,
+    data: NoteUpdate,
+    response: Response,
+    user: Principal = Depends(get_current_user),
+    if_match: str | None = Header(None, description="ETag of the version being edited; a stale one gets 409")
+):
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Only admin can edit notes")
-    result = await update_note(note_id, data.dict(exclude_unset=True), user)
+    result = await update_note(note_id, data.dict(exclude_unset=True), user.email, if_match_version(if_match, note_id))
     if not result:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
+    response.headers["ETag"] = note_etag(result)
     return result
 
 @router.put("/{note_id}/share")
-async def update_sharing(note_id: str, sharedWith: List[SharePermission], user: str = Depends(get_current_user)):
+async def update_sharing(
+    note_id: str,
+    sharedWith: List[SharePermission],
+    response: Response,
+    user: Principal = Depends(get_current_user),
+    if_match: str | None = Header(None)
+):
     shared_data = [s.dict() for s in sharedWith]
-    result = await update_note_sharing(note_id, shared_data, user)
+    result = await update_note_sharing(note_id, shared_data, user.email, if_match_version(if_match, note_id))
     if not result:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
+    response.headers["ETag"] = note_etag(result)
     return result
 
 @router.get("/{note_id}/share")
-async def get_sharing(note_id: str, user: str = Depends(get_current_user)):
-    notes = get_note_collection()
+async def get_sharing(note_id: str, user: Principal = Depends(get_current_user)):
     try:
         _id = ObjectId(note_id)
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid note ID format")
 
-    note = await notes.find_one({"_id": _id})
+    note = await get_note(_id)
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    if note["owner"] != user:
+    if note["owner"] != user.email:
         raise HTTPException(status_code=403, detail="Only owner can view sharing settings")
 
     return {"sharedWith": note.get("sharedWith", [])}
 
+@router.get("/{note_id}/views")
+async def get_views(
+    note_id: str,
+    hours: int = Query(168, ge=1, le=24 * 90, description="Length of the hourly series"),
+    user: Principal = Depends(get_current_user)
+):
+    try:
+        _id = ObjectId(note_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid note ID format")
+
+    note = await get_note(_id)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    if note["owner"] != user.email and not user.is_admin:
+        raise HTTPException(status_code=403, detail="Only owner can view note statistics")
+
+    return await get_view_stats(note_id, hours)
+
 @router.delete("/{note_id}")
-async def delete(note_id: str, user: str = Depends(get_current_user)):
-    result = await delete_note(note_id, user)
+async def delete(note_id: str, user: Principal = Depends(get_current_user)):
+    result = await delete_note(note_id, user.email, user.is_admin)
     if not result:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
     return {"message": "Note deleted"}
\ No newline at end of file
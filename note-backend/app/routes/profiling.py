@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.core.auth import Principal, get_current_user
+from app.core.profiling import profile_store
+from app.core.responses import BSONRoute
+
+router = APIRouter(route_class=BSONRoute)
+
+def require_admin(user: Principal):
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can view request profiles")
+
+@router.get("/")
+async def list_profiles(user: Principal = Depends(get_current_user)):
+    """Captured requests, newest first, with their Mongo/Python breakdown (admin only)"""
+    require_admin(user)
+    return profile_store.list()
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: int, user: Principal = Depends(get_current_user)):
+    """One captured request including its call tree (admin only)"""
+    require_admin(user)
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return entry
+
+@router.delete("/")
+async def clear_profiles(user: Principal = Depends(get_current_user)):
+    """Empty the profile buffer (admin only)"""
+    require_admin(user)
+    profile_store.clear()
+    return {"msg": "Profiles cleared"}
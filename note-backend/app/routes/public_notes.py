@@ -1,28 +1,39 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
+from app.core.responses import BSONRoute
 from bson import ObjectId
 from app.db import db  
-from app.utils.shared import note_response, get_current_time
+from app.utils.shared import document_response, note_etag, is_not_modified, has_validators, validator_headers, not_modified_response
+from app.services.views_service import record_view
+from app.services.note_repository import get_note, get_note_meta
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/public/notes/{note_id}")
-async def view_public_note(note_id: str, request: Request):
+async def view_public_note(note_id: str, request: Request, response: Response):
     try:
         obj_id = ObjectId(note_id)
     except:
         raise HTTPException(status_code=400, detail="Invalid ID")
 
-    note = await db.notes.find_one({"_id": obj_id})
+    conditional = has_validators(request)
+    note = await (get_note_meta(obj_id) if conditional else get_note(obj_id))
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
 
-    await db.note_views.insert_one({
-        "noteId": str(note["_id"]),
-        "ip": request.client.host if request.client else "unknown",
-        "userAgent": request.headers.get("user-agent"),
-        "timestamp": get_current_time()
-    })
+    record_view(
+        str(note["_id"]),
+        request.client.host if request.client else "unknown",
+        request.headers.get("user-agent")
+    )
 
-    note["id"] = str(note["_id"])
-    del note["_id"]
-    return note
\ No newline at end of file
+    etag = note_etag(note)
+    if conditional:
+        if is_not_modified(request, etag, note.get("updatedAt")):
+            return not_modified_response(etag, note.get("updatedAt"), private=False)
+        note = await get_note(obj_id)
+        if not note:
+            raise HTTPException(status_code=404, detail="Note not found")
+        etag = note_etag(note)
+
+    response.headers.update(validator_headers(etag, note.get("updatedAt"), private=False))
+    return document_response(note)
\ No newline at end of file
@@ -1,31 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.models.note import get_note_collection
-from app.core.security import decode_access_token
-from fastapi.security import OAuth2PasswordBearer
+from app.core.auth import Principal, get_current_user
+from app.core.responses import BSONRoute
+from app.services.note_repository import invalidate_note
+from app.utils.shared import get_current_time
 from bson import ObjectId
 from app.db import db
 
-router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+router = APIRouter(route_class=BSONRoute)
 notes = get_note_collection()
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    user = decode_access_token(token)
-    if not user:
-        raise Exception("Invalid token")
-    return user
-
 @router.post("/{note_id}")
-async def share_note(note_id: str, payload: dict, user: str = Depends(get_current_user)):
-    note = await notes.find_one({"_id": ObjectId(note_id)})
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    if note["owner"] != user:
-        raise HTTPException(status_code=403, detail="Only owner can share")
-
+async def share_note(note_id: str, payload: dict, user: Principal = Depends(get_current_user)):
     new_shared = payload.get("sharedWith", [])
-    await notes.update_one(
-        {"_id": ObjectId(note_id)},
-        {"$set": {"sharedWith": new_shared}}
+    result = await notes.update_one(
+        {"_id": ObjectId(note_id), "owner": user.email},
+        {"$set": {"sharedWith": new_shared, "updatedAt": get_current_time()}, "$inc": {"version": 1}}
     )
+    if result.matched_count == 0:
+        if not await notes.count_documents({"_id": ObjectId(note_id)}, limit=1):
+            raise HTTPException(status_code=404, detail="Note not found")
+        raise HTTPException(status_code=403, detail="Only owner can share")
+    invalidate_note(ObjectId(note_id))
     return {"msg": "Sharing updated"}
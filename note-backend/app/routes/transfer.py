@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.core.auth import Principal, get_current_user
+from app.core.responses import BSONRoute
+from app.services.transfer_service import (
+    TransferError, export_query, export_lines, gzip_stream, read_lines, import_lines
+)
+from datetime import datetime
+from typing import Literal
+import zlib
+
+router = APIRouter(route_class=BSONRoute)
+
+@router.get("/export/{kind}")
+async def export(
+    kind: Literal["notes", "analytics"],
+    owner: str | None = Query(None, description="Owner (notes) or email (analytics) to export"),
+    tag: str | None = Query(None, description="Only notes with this tag"),
+    since: datetime | None = Query(None, description="Updated (notes) or recorded (analytics) at or after"),
+    until: datetime | None = Query(None, description="... and before"),
+    gzip: bool = Query(False, description="Compress the stream"),
+    user: Principal = Depends(get_current_user)
+):
+    """Stream matching documents as NDJSON; non-admins can only export their own notes"""
+    if not user.is_admin:
+        if kind != "notes":
+            raise HTTPException(status_code=403, detail="Only admin can export analytics")
+        owner = user.email
+
+    lines = export_lines(kind, export_query(kind, owner, tag, since, until))
+    filename = f"{kind}.ndjson"
+    if gzip:
+        return StreamingResponse(
+            gzip_stream(lines),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'}
+        )
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import/{kind}")
+async def import_documents(
+    kind: Literal["notes", "analytics"],
+    request: Request,
+    skip: int = Query(0, ge=0, description="Lines already committed by an earlier run"),
+    user: Principal = Depends(get_current_user)
+):
+    """Load an NDJSON (or gzip) request body in batches (admin only).
+
+    Documents whose _id already exists are skipped, so an interrupted upload
+    can simply be sent again, or resumed with skip=<lines from the last report>.
+    """
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Only admin can import data")
+    compressed = (
+        request.headers.get("content-encoding") == "gzip"
+        or request.headers.get("content-type") == "application/gzip"
+    )
+    try:
+        return await import_lines(kind, read_lines(request.stream(), compressed), skip)
+    except (TransferError, UnicodeDecodeError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import List, Optional
 from datetime import datetime
-from app.db import db
+from app.core.config import settings
 from typing import List, Literal, Optional
 
 
@@ -27,6 +27,25 @@ class NoteUpdate(BaseModel):
     sharedWith: Optional[List[SharePermission]]=None
 
 
+class BulkNoteOperation(BaseModel):
+    op: Literal["create", "update", "archive", "delete"]
+    id: Optional[str] = None
+    note: Optional[NoteCreate] = None
+    changes: Optional[NoteUpdate] = None
+    archived: bool = True
+    version: Optional[int] = None
+
+
+class BulkNoteRequest(BaseModel):
+    operations: List[BulkNoteOperation] = Field(..., min_items=1)
+
+    @validator("operations")
+    def within_bulk_limit(cls, operations):
+        if len(operations) > settings.NOTE_BULK_MAX_OPERATIONS:
+            raise ValueError(f"at most {settings.NOTE_BULK_MAX_OPERATIONS} operations per request")
+        return operations
+
+
 class NoteOut(NoteBase):
     id: str
     owner: str
@@ -1,5 +1,4 @@
 from pydantic import BaseModel, EmailStr
-from app.db import db
 
 class UserCreate(BaseModel):
     email: EmailStr
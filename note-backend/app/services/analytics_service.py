@@ -1,20 +1,20 @@
 from app.models.note import get_note_collection
 from datetime import datetime, timedelta
-from collections import Counter, defaultdict
+from collections import defaultdict
+import asyncio
+import time
 from app.db import db
 from app.utils.shared import get_current_time
+from app.services.tags_service import top_tags
+from app.services.sessions_service import session_summaries
+from app.services.retention_service import daily_summaries, summary_horizon
 
 notes = get_note_collection()
 
 TRACKED_USERS = ["swarnadeep896@gmail.com", "jimmycarter@gmail.com", "willphilips364@yahoo.com"]
 
 async def most_used_tags():
-    tag_counter = Counter()
-    async for note in notes.find({}):
-        tag_counter.update(note.get("tags", []))
-    
-    top_tags = tag_counter.most_common(5)
-    return [{"tag": tag, "count": count} for tag, count in top_tags]
+    return await top_tags(5)
 
 async def notes_per_day():
     today = get_current_time()
@@ -69,97 +69,50 @@ async def most_active_users():
     
     return formatted_result
 
-async def get_user_login_logout_activity():
-    """Get detailed login/logout activity for tracked users"""
-    analytics = db.get_collection("analytics")
-    
+async def fetch_session_summaries():
+    """Session totals of tracked users over the last 30 days"""
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    return await session_summaries(TRACKED_USERS, thirty_days_ago)
+
+def session_time(summary, now):
+    """Closed-session seconds plus the time elapsed in a still-open session"""
+    total = summary.get("closed_time", 0)
+    if summary.get("open_since"):
+        total += (now - summary["open_since"]).total_seconds()
+    return total
+
+async def get_user_login_logout_activity(summaries=None):
+    """Get detailed login/logout activity for tracked users"""
+    if summaries is None:
+        summaries = await fetch_session_summaries()
     
-    pipeline = [
-        {
-            "$match": {
-                "event": {"$in": ["login", "logout"]},
-                "email": {"$in": TRACKED_USERS},
-                "timestamp": {"$gte": thirty_days_ago}
-            }
-        },
-        {
-            "$sort": {"timestamp": 1}
-        }
-    ]
-    
-    events = await analytics.aggregate(pipeline).to_list(length=1000)
-    
-    if not events:
-        return {
-            email: {
-                "total_sessions": 0,
-                "total_time_seconds": 0,
-                "total_time_formatted": "0s",
-                "login_count": 0,
-                "logout_count": 0,
-                "avg_session_duration": 0,
-                "last_activity": None
-            } for email in TRACKED_USERS
-        }
-    
-    user_sessions = defaultdict(list)
-    for event in events:
-        user_sessions[event["email"]].append({
-            "event": event["event"],
-            "timestamp": event["timestamp"]
-        })
-    
+    now = datetime.utcnow()
     user_activity = {}
     for email in TRACKED_USERS:
-        events = user_sessions.get(email, [])
-        total_sessions = 0
-        total_time = 0
-        login_count = 0
-        logout_count = 0
-        last_login = None
-        
-        for event in events:
-            if event["event"] == "login":
-                login_count += 1
-                last_login = event["timestamp"]
-            elif event["event"] == "logout" and last_login:
-                logout_count += 1
-                total_sessions += 1
-                session_duration = (event["timestamp"] - last_login).total_seconds()
-                total_time += session_duration
-                last_login = None
-        
-        if last_login:
-            login_count += 1
-            total_sessions += 1
-            current_session_duration = (datetime.utcnow() - last_login).total_seconds()
-            total_time += current_session_duration
+        summary = summaries.get(email, {})
+        total_sessions = summary.get("closed_sessions", 0) + (1 if summary.get("open_since") else 0)
+        total_time = session_time(summary, now)
         
         user_activity[email] = {
             "total_sessions": total_sessions,
             "total_time_seconds": total_time,
             "total_time_formatted": format_time(total_time),
-            "login_count": login_count,
-            "logout_count": logout_count,
+            "login_count": summary.get("login_count", 0),
+            "logout_count": summary.get("closed_sessions", 0),
             "avg_session_duration": total_time / total_sessions if total_sessions > 0 else 0,
-            "last_activity": events[-1]["timestamp"] if events else None
+            "last_activity": summary.get("last_activity")
         }
     
     return user_activity
 
-async def get_user_study_activity():
-    """Get study time activity for tracked users"""
-    analytics = db.get_collection("analytics")
-    
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    pipeline = [
+def study_activity_pipeline(emails, since: datetime):
+    # email and timestamp first: on time-series storage they select whole buckets
+    return [
         {
             "$match": {
-                "timeSpent": {"$exists": True, "$ne": None},
-                "email": {"$in": TRACKED_USERS},
-                "timestamp": {"$gte": thirty_days_ago}
+                "email": {"$in": emails},
+                "timestamp": {"$gte": since},
+                "timeSpent": {"$exists": True, "$ne": None}
             }
         },
         {
@@ -171,12 +124,31 @@ async def get_user_study_activity():
             }
         }
     ]
-    
-    result = await analytics.aggregate(pipeline).to_list(length=100)
+
+async def study_activity_totals(emails, since: datetime):
+    """Per-user study totals since `since`; days past the raw retention come from daily summaries"""
+    analytics = db.get_collection("analytics")
+    horizon = await summary_horizon("analytics", since)
+    raw_since = max(since, horizon) if horizon else since
+    
+    result = await analytics.aggregate(study_activity_pipeline(emails, raw_since)).to_list(length=None)
+    totals = {item["_id"]: {**item, "pages_visited": set(item["pages_visited"])} for item in result}
+    if horizon and since < horizon:
+        for summary in await daily_summaries("analytics_daily", {"email": {"$in": emails}}, since, horizon):
+            user_data = totals.setdefault(summary["email"], {"total_study_time": 0, "study_sessions": 0, "pages_visited": set()})
+            user_data["total_study_time"] += summary["studyTime"]
+            user_data["study_sessions"] += summary["timedEvents"]
+            user_data["pages_visited"].update(summary["pages"])
+    return totals
+
+async def get_user_study_activity(days: int = 30):
+    """Get study time activity for tracked users"""
+    since = datetime.utcnow() - timedelta(days=days)
+    totals = await study_activity_totals(TRACKED_USERS, since)
     
     study_activity = {}
     for email in TRACKED_USERS:
-        user_data = next((item for item in result if item["_id"] == email), None)
+        user_data = totals.get(email)
         
         if user_data:
             study_activity[email] = {
@@ -197,17 +169,12 @@ async def get_user_study_activity():
     
     return study_activity
 
-async def get_daily_activity_summary():
-    """Get daily activity summary for tracked users in the last 7 days"""
-    analytics = db.get_collection("analytics")
-    
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    
-    pipeline = [
+def daily_activity_pipeline(emails, since: datetime):
+    return [
         {
             "$match": {
-                "email": {"$in": TRACKED_USERS},
-                "timestamp": {"$gte": seven_days_ago}
+                "email": {"$in": emails},
+                "timestamp": {"$gte": since}
             }
         },
         {
@@ -223,73 +190,50 @@ async def get_daily_activity_summary():
             "$sort": {"_id.date": 1}
         }
     ]
+
+async def get_daily_activity_summary(days: int = 7):
+    """Get daily activity summary for tracked users in the last `days` days"""
+    analytics = db.get_collection("analytics")
+    
+    since = datetime.utcnow() - timedelta(days=days)
+    horizon = await summary_horizon("analytics", since)
+    pipeline = daily_activity_pipeline(TRACKED_USERS, max(since, horizon) if horizon else since)
     
-    result = await analytics.aggregate(pipeline).to_list(length=100)
+    result = await analytics.aggregate(pipeline).to_list(length=None)
     
     daily_activity = defaultdict(lambda: {"logins": 0, "logouts": 0, "study_sessions": 0})
     
+    if horizon and since < horizon:
+        for summary in await daily_summaries("analytics_daily", {"email": {"$in": TRACKED_USERS}}, since, horizon):
+            date = summary["day"].strftime("%Y-%m-%d")
+            daily_activity[date]["logins"] += summary["logins"]
+            daily_activity[date]["logouts"] += summary["logouts"]
+            daily_activity[date]["study_sessions"] += summary["studyEvents"]
+    
     for item in result:
         date = item["_id"]["date"]
         event = item["_id"]["event"]
         count = item["count"]
         
         if event == "login":
-            daily_activity[date]["logins"] = count
+            daily_activity[date]["logins"] += count
         elif event == "logout":
-            daily_activity[date]["logouts"] = count
+            daily_activity[date]["logouts"] += count
         else:
             daily_activity[date]["study_sessions"] += count
     
     return dict(daily_activity)
 
-async def get_most_active_user_chart():
+async def get_most_active_user_chart(summaries=None):
     """Get data for most active user bar chart based on total session time"""
-    analytics = db.get_collection("analytics")
-    
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    pipeline = [
-        {
-            "$match": {
-                "event": {"$in": ["login", "logout"]},
-                "email": {"$in": TRACKED_USERS},
-                "timestamp": {"$gte": thirty_days_ago}
-            }
-        },
-        {
-            "$sort": {"timestamp": 1}
-        }
-    ]
+    if summaries is None:
+        summaries = await fetch_session_summaries()
     
-    events = await analytics.aggregate(pipeline).to_list(length=1000)
-    
-    user_total_time = defaultdict(float)
-    user_sessions = defaultdict(list)
-    
-    for event in events:
-        user_sessions[event["email"]].append({
-            "event": event["event"],
-            "timestamp": event["timestamp"]
-        })
-    
-    for email in TRACKED_USERS:
-        events = user_sessions.get(email, [])
-        total_time = 0
-        last_login = None
-        
-        for event in events:
-            if event["event"] == "login":
-                last_login = event["timestamp"]
-            elif event["event"] == "logout" and last_login:
-                session_duration = (event["timestamp"] - last_login).total_seconds()
-                total_time += session_duration
-                last_login = None
-        
-        if last_login:
-            current_session_duration = (datetime.utcnow() - last_login).total_seconds()
-            total_time += current_session_duration
-        
-        user_total_time[email] = total_time
+    now = datetime.utcnow()
+    user_total_time = {
+        email: session_time(summaries.get(email, {}), now)
+        for email in TRACKED_USERS
+    }
     
     chart_data = {
         "labels": list(user_total_time.keys()),
@@ -299,6 +243,48 @@ async def get_most_active_user_chart():
     
     return chart_data
 
+async def _timed(name, coro, timings):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+async def get_dashboard(include_admin: bool):
+    """Assemble the analytics dashboard.
+
+    Independent queries run concurrently, the session summaries are fetched
+    once and shared by the views derived from them, and every section records
+    its wall time in milliseconds under "timings".
+    """
+    timings = {}
+    sections = {
+        "top_tags": most_used_tags(),
+        "notes_per_day": notes_per_day(),
+        "top_users": most_active_users(),
+    }
+
+    if include_admin:
+        async def login_logout_views():
+            summaries = await _timed("session_summaries", fetch_session_summaries(), timings)
+            return (
+                await _timed("login_logout_activity", get_user_login_logout_activity(summaries), timings),
+                await _timed("most_active_chart", get_most_active_user_chart(summaries), timings)
+            )
+
+        sections["study_activity"] = get_user_study_activity()
+        sections["daily_activity"] = get_daily_activity_summary()
+        sections["login_logout"] = login_logout_views()
+
+    names = list(sections)
+    results = await asyncio.gather(*(_timed(name, sections[name], timings) for name in names))
+    dashboard = dict(zip(names, results))
+
+    if include_admin:
+        dashboard["login_logout_activity"], dashboard["most_active_chart"] = dashboard.pop("login_logout")
+    dashboard["timings"] = timings
+    return dashboard
+
 def format_time(seconds):
     """Format seconds into human readable time"""
     if seconds < 60:
@@ -0,0 +1,121 @@
+"""Switching the analytics collection to time-series storage.
+
+By default `analytics` holds one document per heartbeat, login and logout.
+With ANALYTICS_TIMESERIES it is a MongoDB time-series collection with
+`email` as metaField: the server packs each user's events into compressed
+buckets (an hour per bucket at granularity "seconds"), and the 7- and 30-day
+aggregations, which match on email and timestamp first, read a few buckets
+per user instead of every event. Documents look the same either way, so the
+track endpoints and every read path work unchanged.
+
+An existing deployment is converted with the app stopped (anything inserted
+between the rename and the creation would recreate a plain collection):
+
+    ANALYTICS_TIMESERIES=true python -m app.services.analytics_storage migrate
+    python -m app.services.analytics_storage status
+    python -m app.services.analytics_storage migrate --drop-legacy   # once checked
+
+The old collection is renamed to analytics_events and copied over in _id
+order. Progress is kept in `migrations`, so an interrupted run resumes where
+it stopped; the batch in flight at the interruption is not copied twice.
+Time-series collections do not enforce unique _id, so NDJSON imports look
+each batch's _ids up before inserting instead of relying on duplicate-key
+errors.
+"""
+from datetime import datetime
+from app.core.config import settings
+from app.core.indexes import collection_options, collection_type, ensure_indexes
+from app.db import db
+
+ANALYTICS = "analytics"
+LEGACY = "analytics_events"
+PROGRESS_ID = "analytics_timeseries"
+
+def insert_order(event: dict):
+    return (event.get("email") or "", event["timestamp"])
+
+async def migrate_to_timeseries(batch_size: int = 5000, drop_legacy: bool = False) -> dict:
+    """Move per-event analytics documents into the time-series collection; resumable"""
+    if not settings.ANALYTICS_TIMESERIES:
+        raise RuntimeError("Set ANALYTICS_TIMESERIES=true before migrating")
+
+    analytics = db.get_collection(ANALYTICS)
+    legacy = db.get_collection(LEGACY)
+    progress = db.get_collection("migrations")
+
+    if await collection_type(ANALYTICS) == "collection":
+        if await collection_type(LEGACY) is not None:
+            raise RuntimeError(f"Both {ANALYTICS} and {LEGACY} are plain collections; resolve by hand")
+        await analytics.rename(LEGACY)
+    if await collection_type(ANALYTICS) is None:
+        await db.create_collection(ANALYTICS, **collection_options()[ANALYTICS])
+
+    state = await progress.find_one({"_id": PROGRESS_ID}) or {}
+    last_id = state.get("lastId")
+    copied = skipped = 0
+    resuming = last_id is not None
+    has_legacy = await collection_type(LEGACY) is not None
+    while has_legacy:
+        batch = await legacy.find({"_id": {"$gt": last_id}} if last_id is not None else {}).sort("_id", 1).to_list(length=batch_size)
+        if not batch:
+            break
+        # the timeField must be a date on every time-series document
+        documents = [document for document in batch if isinstance(document.get("timestamp"), datetime)]
+        if resuming:
+            # the first batch after an interruption may already be partly copied
+            present = set(await analytics.distinct("_id", {"_id": {"$in": [document["_id"] for document in documents]}}))
+            documents = [document for document in documents if document["_id"] not in present]
+            resuming = False
+        if documents:
+            await analytics.insert_many(sorted(documents, key=insert_order), ordered=False)
+        last_id = batch[-1]["_id"]
+        copied += len(documents)
+        skipped += len(batch) - len(documents)
+        await progress.update_one(
+            {"_id": PROGRESS_ID},
+            {"$set": {"lastId": last_id, "updatedAt": datetime.utcnow()}, "$inc": {"copied": len(documents), "skipped": len(batch) - len(documents)}},
+            upsert=True
+        )
+
+    await ensure_indexes()
+    if drop_legacy:
+        await legacy.drop()
+        await progress.delete_one({"_id": PROGRESS_ID})
+    return {"copied": copied, "skipped": skipped}
+
+async def storage_status() -> dict:
+    status = {
+        "configured": "timeseries" if settings.ANALYTICS_TIMESERIES else "collection",
+        ANALYTICS: await collection_type(ANALYTICS),
+        LEGACY: await collection_type(LEGACY),
+        "progress": await db.get_collection("migrations").find_one({"_id": PROGRESS_ID}),
+    }
+    for name in (ANALYTICS, LEGACY):
+        if status[name] is not None:
+            stats = await db.get_collection(name).aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=1)
+            storage = stats[0]["storageStats"] if stats else {}
+            status[f"{name}_storage"] = {
+                "count": storage.get("count"),
+                "storageSize": storage.get("storageSize"),
+                "totalIndexSize": storage.get("totalIndexSize"),
+            }
+    return status
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import pprint
+
+    parser = argparse.ArgumentParser(description="Analytics storage layout")
+    parser.add_argument("command", choices=["migrate", "status"])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop-legacy", action="store_true", help="drop analytics_events after a complete copy")
+    args = parser.parse_args()
+
+    async def main():
+        if args.command == "migrate":
+            result = await migrate_to_timeseries(args.batch_size, args.drop_legacy)
+            print(f"Copied {result['copied']} events, skipped {result['skipped']} without a timestamp")
+        pprint.pprint(await storage_status())
+
+    asyncio.run(main())
@@ -1,5 +1,5 @@
 from fastapi import HTTPException
-from app.core.security import hash_password, verify_password, create_access_token
+from app.core.security import hash_password_async, verify_and_update_password, create_access_token
 from app.models.user import get_user_collection
 from app.db import db
 
@@ -20,14 +20,20 @@ async def register_user(email: str, password: str, role: str = "user"):
     existing = await users.find_one({"email": email})
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
-    hashed = hash_password(password)
+    hashed = await hash_password_async(password)
     await users.insert_one({"email": email, "password": hashed, "role": role})
     return {"msg": "Registered successfully"}
 
 async def login_user(email: str, password: str):
     user = await users.find_one({"email": email})
-    if not user or not verify_password(password, user["password"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await verify_and_update_password(password, user["password"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # cost factor changed since this hash was made
+        await users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
     if email == "swarnadeep321@gmail.com":
         user["role"] = "admin"
     elif email in USER_EMAILS:
@@ -43,5 +49,5 @@ async def ensure_admin_user():
     admin_role = "admin"
     existing = await users.find_one({"email": admin_email})
     if not existing:
-        hashed = hash_password(admin_password)
+        hashed = await hash_password_async(admin_password)
         await users.insert_one({"email": admin_email, "password": hashed, "role": admin_role})
@@ -0,0 +1,230 @@
+from app.db import db
+from app.core.config import settings, lazy
+from collections import deque
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+from app.services.sessions_service import apply_session_events
+from app.services.analytics_storage import insert_order as analytics_insert_order
+from abc import ABC, abstractmethod
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _FlushLoop(ABC):
+    """Background task calling flush() every flush_interval seconds or when woken"""
+
+    def __init__(self, collection_name: str, flush_interval: float):
+        self.collection_name = collection_name
+        self.flush_interval = flush_interval
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stopping = False
+
+    @abstractmethod
+    async def flush(self):
+        """Write out what has been buffered"""
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop, letting an in-flight batch finish, and drain"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+class WriteBuffer(_FlushLoop):
+    """Bounded in-process buffer that batches inserts into one collection.
+
+    submit() never touches Mongo: it queues the document and returns at once,
+    or refuses it when the buffer is full so callers can shed load. A
+    background task flushes with insert_many whenever batch_size documents are
+    waiting or flush_interval seconds have passed, and stop() drains the rest.
+    on_flush, if given, is awaited with each batch once it has been inserted,
+    in arrival order; insert_order, if given, is a sort key applied to the
+    copy that is inserted.
+
+    Documents the server rejects (a BulkWriteError) are counted as failed
+    and the rest of the batch goes on as inserted. A batch that cannot reach
+    the server (a ConnectionFailure: no server, a timeout) goes back to the
+    front of the queue for the next flush, except while stopping; the batch
+    in flight counts against max_size, so the buffer stays bounded while it
+    waits. insert_many has already given its documents an _id, so ones that
+    did get written come back as duplicate keys and count as inserted. Any
+    other failure of the whole batch (a document that cannot be encoded, or
+    is too large) is retried one document at a time, and the documents that
+    still fail are dropped and counted as failed, so one bad document cannot
+    hold up the buffer.
+    """
+
+    def __init__(self, collection_name: str, max_size: int, batch_size: int, flush_interval: float, on_flush=None, insert_order=None):
+        super().__init__(collection_name, flush_interval)
+        self.on_flush = on_flush
+        self.insert_order = insert_order
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self._pending = deque()
+        self._in_flight = 0
+        self.counters = {"queued": 0, "flushed": 0, "dropped": 0, "failed": 0, "retried": 0, "on_flush_failed": 0}
+
+    def submit(self, document: dict) -> bool:
+        if len(self._pending) + self._in_flight >= self.max_size:
+            self.counters["dropped"] += 1
+            return False
+        if self._task is None:
+            self.start()
+        self._pending.append(document)
+        self.counters["queued"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self):
+        collection = db.get_collection(self.collection_name)
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self._in_flight = len(batch)
+            try:
+                written = await self._insert(collection, batch)
+            except ConnectionFailure:
+                self._in_flight = 0
+                if self._stopping:
+                    self.counters["failed"] += len(batch)
+                    logger.exception("Dropped %d %s documents after a failed flush", len(batch), self.collection_name)
+                    continue
+                self._pending.extendleft(reversed(batch))
+                self.counters["retried"] += len(batch)
+                logger.exception("Flush of %d %s documents failed; retrying on the next flush", len(batch), self.collection_name)
+                return
+            self._in_flight = 0
+            self.counters["flushed"] += len(written)
+            if self.on_flush is not None and written:
+                try:
+                    await self.on_flush(written)
+                except Exception:
+                    self.counters["on_flush_failed"] += len(written)
+                    logger.exception("on_flush hook failed for %d %s documents", len(written), self.collection_name)
+
+    async def _insert(self, collection, batch):
+        """Insert a batch; returns its documents that are in the collection afterwards.
+
+        Raises ConnectionFailure when the server could not be reached.
+        """
+        documents = sorted(batch, key=self.insert_order) if self.insert_order else batch
+        try:
+            await collection.insert_many(documents, ordered=False)
+            return batch
+        except BulkWriteError as e:
+            return self._written(batch, documents, e.details)
+        except ConnectionFailure:
+            raise
+        except Exception:
+            logger.exception("Flush of %d %s documents failed; inserting them one at a time", len(batch), self.collection_name)
+
+        written = set()
+        for document in documents:
+            try:
+                await collection.insert_one(document)
+            except DuplicateKeyError as e:
+                if "_id" not in (e.details or {}).get("keyPattern", {"_id": 1}):
+                    self.counters["failed"] += 1
+                    logger.error("%s rejected a document: %s", self.collection_name, e)
+                    continue
+                # written by an earlier attempt of a retried batch
+            except ConnectionFailure:
+                raise
+            except Exception:
+                self.counters["failed"] += 1
+                logger.exception("Dropped a %s document that cannot be inserted", self.collection_name)
+                continue
+            written.add(id(document))
+        return [document for document in batch if id(document) in written]
+
+    def _written(self, batch, documents, details):
+        """The documents of `batch` in the collection after a partly failed insert_many"""
+        rejected = {
+            id(documents[error["index"]]) for error in details["writeErrors"]
+            # written by an earlier attempt of a retried batch
+            if error["code"] != 11000 or "_id" not in error.get("keyPattern", {"_id": 1})
+        }
+        if rejected:
+            self.counters["failed"] += len(rejected)
+            logger.error(
+                "%s rejected %d of %d documents (%d inserted): %s", self.collection_name, len(rejected),
+                len(batch), details["nInserted"], details["writeErrors"][0]["errmsg"]
+            )
+        return [document for document in batch if id(document) not in rejected]
+
+    def stats(self):
+        return {**self.counters, "pending": len(self._pending), "capacity": self.max_size}
+
+class CounterBuffer(_FlushLoop):
+    """Coalesces counter increments in memory and upserts them with $inc.
+
+    increment() adds to an in-memory total keyed by its filter document; each
+    flush writes one upsert per distinct key with a single unordered
+    bulk_write. At most max_keys distinct keys are held between flushes.
+    """
+
+    def __init__(self, collection_name: str, max_keys: int, flush_interval: float, field: str = "count"):
+        super().__init__(collection_name, flush_interval)
+        self.max_keys = max_keys
+        self.field = field
+        self._counts = {}
+        self.counters = {"increments": 0, "upserts": 0, "dropped": 0, "failed": 0}
+
+    def increment(self, key: dict, amount: int = 1) -> bool:
+        slot = tuple(key.items())
+        if slot not in self._counts and len(self._counts) >= self.max_keys:
+            self.counters["dropped"] += 1
+            return False
+        if self._task is None:
+            self.start()
+        self._counts[slot] = self._counts.get(slot, 0) + amount
+        self.counters["increments"] += 1
+        return True
+
+    async def flush(self):
+        if not self._counts:
+            return
+        counts, self._counts = self._counts, {}
+        try:
+            await db.get_collection(self.collection_name).bulk_write([
+                UpdateOne(dict(slot), {"$inc": {self.field: amount}}, upsert=True)
+                for slot, amount in counts.items()
+            ], ordered=False)
+            self.counters["upserts"] += len(counts)
+        except Exception:
+            # put the totals back so the next flush retries them
+            for slot, amount in counts.items():
+                self._counts[slot] = self._counts.get(slot, 0) + amount
+            self.counters["failed"] += 1
+            logger.exception("Failed to flush %d %s counters", len(counts), self.collection_name)
+
+    def stats(self):
+        return {**self.counters, "pending_keys": len(self._counts), "capacity": self.max_keys}
+
+analytics_buffer = lazy(lambda: WriteBuffer(
+    "analytics",
+    max_size=settings.ANALYTICS_BUFFER_SIZE,
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+    flush_interval=settings.ANALYTICS_FLUSH_INTERVAL,
+    on_flush=apply_session_events,
+    # a time-series collection fills each user's open bucket once per batch when events arrive grouped by user
+    insert_order=analytics_insert_order if settings.ANALYTICS_TIMESERIES else None,
+))
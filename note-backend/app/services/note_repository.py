@@ -0,0 +1,145 @@
+from app.models.note import get_note_collection
+from app.core.config import settings, lazy
+from collections import OrderedDict
+from bson import ObjectId
+from bson.binary import Binary
+import bson
+import copy
+import time
+import zlib
+
+notes = get_note_collection()
+
+class NoteCache:
+    """In-process LRU of note documents with a TTL.
+
+    Writers call invalidate() after changing a note, so edits and permission
+    changes are visible to this process immediately; the TTL bounds how long
+    another worker's stale copy can live.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # bumped on every invalidation; a read that straddles one is not cached
+        self._epoch = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, note_id: ObjectId):
+        entry = self._entries.get(note_id)
+        if entry is None:
+            return None
+        note, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._drop(note_id)
+            return None
+        self._entries.move_to_end(note_id)
+        return note
+
+    def put(self, note_id: ObjectId, note: dict, epoch: int):
+        if epoch != self._epoch or self.max_entries <= 0:
+            return
+        self._drop(note_id)
+        size = len(bson.encode(note))
+        self._entries[note_id] = (note, size, time.monotonic() + self.ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.counters["evictions"] += 1
+
+    def invalidate(self, note_id: ObjectId):
+        self._epoch += 1
+        self.counters["invalidations"] += 1
+        self._drop(note_id)
+
+    def clear(self):
+        self._epoch += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def _drop(self, note_id):
+        entry = self._entries.pop(note_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def stats(self):
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "capacity": self.max_entries,
+            "bytes": self._bytes,
+            "hit_ratio": self.counters["hits"] / lookups if lookups else 0.0
+        }
+
+note_cache = lazy(lambda: NoteCache(settings.NOTE_CACHE_SIZE, settings.NOTE_CACHE_TTL))
+
+# Bodies of at least NOTE_COMPRESS_MIN_BYTES are stored as zlib data in a
+# Binary of this user-defined subtype, next to a plain contentSnippet for
+# list pages; everything reading whole notes goes through unpack_content.
+COMPRESSED_SUBTYPE = 0x80
+SNIPPET_FIELD = "contentSnippet"
+# level 1 costs about a sixth of the default on prose for ~80% of its ratio;
+# compression runs on the event loop, on every write of a large body
+COMPRESS_LEVEL = 1
+
+def pack_content(fields: dict):
+    """Storage form of note fields: returns (fields to $set, fields to $unset)"""
+    content = fields.get("content")
+    if not isinstance(content, str):
+        return fields, {}
+    raw = content.encode()
+    if settings.NOTE_COMPRESS_MIN_BYTES and len(raw) >= settings.NOTE_COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, COMPRESS_LEVEL)
+        # not worth a decompression on every read unless it saves at least 10%
+        if len(packed) < len(raw) * 0.9:
+            return {
+                **fields,
+                "content": Binary(packed, COMPRESSED_SUBTYPE),
+                SNIPPET_FIELD: content[:settings.NOTE_SNIPPET_LENGTH]
+            }, {}
+    return fields, {SNIPPET_FIELD: ""}
+
+def unpack_content(note: dict) -> dict:
+    """Inflate a stored note's compressed body in place"""
+    content = note.get("content")
+    if isinstance(content, bytes):
+        note["content"] = zlib.decompress(content).decode()
+    note.pop(SNIPPET_FIELD, None)
+    return note
+
+async def get_note(note_id: ObjectId):
+    """Read a note through the cache; returns a copy the caller may mutate"""
+    note = note_cache.get(note_id)
+    if note is not None:
+        note_cache.counters["hits"] += 1
+        return unpack_content(copy.deepcopy(note))
+
+    note_cache.counters["misses"] += 1
+    epoch = note_cache._epoch
+    note = await notes.find_one({"_id": note_id})
+    if note is None:
+        return None
+    # cached in stored form, so compressed bodies stay compressed in memory
+    note_cache.put(note_id, note, epoch)
+    return unpack_content(copy.deepcopy(note))
+
+def invalidate_note(note_id: ObjectId):
+    note_cache.invalidate(note_id)
+
+META_FIELDS = ("_id", "owner", "sharedWith", "updatedAt", "version")
+
+async def get_note_meta(note_id: ObjectId):
+    """Just enough of a note to check permissions and validators.
+
+    Served from the cache when the note is there, otherwise with a projection
+    that skips the body; the result is not cached.
+    """
+    note = note_cache.get(note_id)
+    if note is not None:
+        note_cache.counters["hits"] += 1
+        return {field: copy.deepcopy(note.get(field)) for field in META_FIELDS}
+    return await notes.find_one({"_id": note_id}, {field: 1 for field in META_FIELDS})
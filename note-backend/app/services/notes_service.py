@@ -3,107 +3,402 @@ from app.models.note import get_note_collection
 from datetime import datetime
 from pytz import timezone
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, PyMongoError
 from app.db import db
-from app.utils.shared import get_current_time
+from app.core.config import settings
+from app.utils.shared import get_current_time, encode_cursor, decode_cursor, note_etag, document_response
+from app.services.search_service import index_note, index_notes, remove_note, remove_notes, search_notes
+from app.services.tags_service import apply_tag_changes
+from app.services.note_repository import invalidate_note, pack_content, unpack_content, SNIPPET_FIELD
+import asyncio
+import math
 import re
 
 notes = get_note_collection()
-ADMIN_EMAIL = "swarnadeep321@gmail.com"
+# non-admin users browse the notes published by this account
+CATALOGUE_OWNER = "swarnadeep321@gmail.com"
 
-def note_response(note):
-    note["id"] = str(note["_id"])
-    del note["_id"]
-    return note
-
-async def create_note(data: dict, owner_email: str):
-    now = get_current_time()
-
-    note = {
+def new_note_document(data: dict, owner_email: str, now: datetime):
+    return {
         **data,
         "owner": owner_email,
         "sharedWith": data.get("sharedWith", []),
         "isArchived": False,
         "createdAt": now,
-        "updatedAt": now
+        "updatedAt": now,
+        "version": 1
     }
-    
-    result = await notes.insert_one(note)
+
+async def create_note(data: dict, owner_email: str):
+    note = new_note_document(data, owner_email, get_current_time())
+    stored, _ = pack_content(note)
+    result = await notes.insert_one(stored)
     note["_id"] = result.inserted_id
-    return note_response(note)
+    await index_note(note)
+    await apply_tag_changes([], note.get("tags"))
+    return document_response(note)
 
-async def get_user_notes(owner_email: str, search: str | None = None, page: int = 1, limit: int = 10):
+async def get_user_notes(owner_email: str, is_admin: bool, search: str | None = None, page: int = 1, limit: int = 10, cursor: str | None = None, projection: dict | None = None):
     notes = get_note_collection()
-    query = {}
-    if owner_email == ADMIN_EMAIL:
-        query["owner"] = owner_email
-    else:
-        query["owner"] = ADMIN_EMAIL
+    query = {"owner": owner_email if is_admin else CATALOGUE_OWNER}
     if search:
+        return await search_user_notes(query["owner"], search, page, limit, projection)
+    if cursor is not None:
+        return await get_notes_page_after(query["owner"], cursor, limit, projection)
+    cursor = notes.find(query, projection).skip((page - 1) * limit).limit(limit)
+    return [document_response(unpack_content(note)) async for note in cursor]
+
+LIST_FIELDS = {"title", "content", "snippet", "tags", "owner", "sharedWith", "isArchived", "createdAt", "updatedAt", "version"}
+SUMMARY_FIELDS = ("title", "snippet", "tags", "owner", "isArchived", "createdAt")
+# needed for cursors and page validators whatever the client asked for
+REQUIRED_LIST_FIELDS = ("updatedAt", "version")
+
+def list_projection(view: str = "full", fields: list | None = None):
+    """Projection for a note list page, or None for whole documents.
+
+    fields picks exact fields; otherwise view="summary" selects the card
+    fields. "snippet" is the start of the content, cut server side so the
+    full body never leaves Mongo.
+    """
+    if not fields and view == "full":
+        return None
+    unknown = set(fields or ()) - LIST_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    selected = fields or SUMMARY_FIELDS
+    projection = {field: 1 for field in (*selected, *REQUIRED_LIST_FIELDS) if field != "snippet"}
+    if "snippet" in selected:
+        # compressed bodies carry their snippet alongside
+        projection["snippet"] = {"$cond": [
+            {"$eq": [{"$type": "$content"}, "binData"]},
+            f"${SNIPPET_FIELD}",
+            {"$substrCP": [{"$ifNull": ["$content", ""]}, 0, settings.NOTE_SNIPPET_LENGTH]}
+        ]}
+    return projection
+
+# newest edits first; _id breaks ties so the order is total and stable
+KEYSET_SORT = [("updatedAt", -1), ("_id", -1)]
+
+def keyset_query(owner: str, cursor: str | None):
+    query = {"owner": owner}
+    if cursor:
+        updated_at, last_id = decode_cursor(cursor)
         query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"content": {"$regex": search, "$options": "i"}},
-            {"tags": {"$regex": search, "$options": "i"}},
+            {"updatedAt": {"$lt": updated_at}},
+            {"updatedAt": updated_at, "_id": {"$lt": last_id}},
         ]
-    cursor = notes.find(query).skip((page - 1) * limit).limit(limit)
-    result = []
-    async for note in cursor:
-        note["id"] = str(note["_id"])
-        del note["_id"]
-        result.append(note)
-    return result
-
-async def update_note(note_id: str, data: dict, user: str):
-    try:
-        obj_id = ObjectId(note_id)
-    except:
-        raise HTTPException(status_code=400, detail="Invalid note ID format")
+    return query
+
+async def get_notes_page_after(owner: str, cursor: str | None, limit: int, projection: dict | None = None):
+    """Keyset pagination: every page is an index seek, however deep"""
+    result = await notes.find(keyset_query(owner, cursor), projection).sort(KEYSET_SORT).limit(limit).to_list(length=limit)
+    next_cursor = None
+    if len(result) == limit:
+        next_cursor = encode_cursor(result[-1]["updatedAt"], result[-1]["_id"])
+    return {
+        "notes": [document_response(unpack_content(note)) for note in result],
+        "next_cursor": next_cursor
+    }
+
+async def search_user_notes(owner: str, search: str, page: int, limit: int, projection: dict | None = None):
+    """Ranked full-text search, served from the inverted index"""
+    note_ids, total = await search_notes(owner, search, page, limit)
+    found = {}
+    if note_ids:
+        async for note in notes.find({"_id": {"$in": note_ids}}, projection):
+            found[note["_id"]] = note
+    result = [document_response(unpack_content(found[_id])) for _id in note_ids if _id in found]
+    return {
+        "notes": result,
+        "totalNotes": total,
+        "totalPages": max(math.ceil(total / limit), 1),
+        "page": page
+    }
+
+def version_filter(expected_version: int | None):
+    """Filter clause pinning a write to the version the client last saw"""
+    if expected_version is None:
+        return {}
+    if expected_version == 0:
+        return {"version": {"$exists": False}}
+    return {"version": expected_version}
 
-    note = await notes.find_one({"_id": obj_id})
+def write_predicate(user: str):
+    """Matches notes the user owns or has been given write access to"""
+    return {"$or": [
+        {"owner": user},
+        {"sharedWith": {"$elemMatch": {"email": user, "permission": "write"}}}
+    ]}
+
+def can_write(note: dict, user: str) -> bool:
+    return note["owner"] == user or any(
+        entry["email"] == user and entry["permission"] == "write"
+        for entry in note.get("sharedWith", [])
+    )
+
+async def raise_write_failure(obj_id: ObjectId, user: str, owner_only: bool = False):
+    """Explain why a conditional write matched nothing: 404, 403 or 409"""
+    note = await notes.find_one({"_id": obj_id}, {"owner": 1, "sharedWith": 1, "version": 1, "updatedAt": 1})
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
-
     if note["owner"] != user:
-        allowed = False
-        for entry in note.get("sharedWith", []):
-            if entry["email"] == user and entry["permission"] == "write":
-                allowed = True
-                break
-        if not allowed:
+        if owner_only:
+            raise HTTPException(status_code=403, detail="Only owner can manage sharing")
+        if not can_write(note, user):
             raise HTTPException(status_code=403, detail="No write permission")
+    raise HTTPException(
+        status_code=409,
+        detail="Note was modified by another request",
+        headers={"ETag": note_etag(note)}
+    )
+
+UPDATABLE_FIELDS = {"title", "content", "tags", "sharedWith", "isArchived"}
 
-    allowed_fields = {"title", "content", "tags", "sharedWith", "isArchived"}
-    filtered_data = {k: v for k, v in data.items() if k in allowed_fields}
+async def update_note(note_id: str, data: dict, user: str, expected_version: int | None = None):
+    try:
+        obj_id = ObjectId(note_id)
+    except:
+        raise HTTPException(status_code=400, detail="Invalid note ID format")
+
+    filtered_data = {k: v for k, v in data.items() if k in UPDATABLE_FIELDS}
     filtered_data["updatedAt"] = get_current_time()
 
-    await notes.update_one({"_id": obj_id}, {"$set": filtered_data})
-    updated = await notes.find_one({"_id": obj_id})
-    return note_response(updated)
+    query = {"_id": obj_id, **write_predicate(user), **version_filter(expected_version)}
+    stored, cleared = pack_content(filtered_data)
+    update = {"$set": stored, "$inc": {"version": 1}}
+    if cleared:
+        update["$unset"] = cleared
+    if "tags" in filtered_data:
+        # the tag counters need the tags being replaced, so take the pre-image;
+        # the update is atomic, so applying the same $set to it gives the stored note
+        note = await notes.find_one_and_update(query, update, return_document=ReturnDocument.BEFORE)
+        updated = note and {**note, **filtered_data, "version": note.get("version", 0) + 1}
+    else:
+        note = updated = await notes.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    if updated is None:
+        await raise_write_failure(obj_id, user)
+
+    unpack_content(updated)
+    invalidate_note(obj_id)
+    if filtered_data.keys() & {"title", "content", "tags"}:
+        await index_note(updated)
+    if "tags" in filtered_data:
+        await apply_tag_changes(note.get("tags"), updated.get("tags"))
+    return document_response(updated)
 
-async def update_note_sharing(note_id: str, shared_with: list, user: str):
+async def update_note_sharing(note_id: str, shared_with: list, user: str, expected_version: int | None = None):
     try:
         obj_id = ObjectId(note_id)
     except:
         raise HTTPException(status_code=400, detail="Invalid note ID format")
 
-    note = await notes.find_one({"_id": obj_id})
+    updated = await notes.find_one_and_update(
+        {"_id": obj_id, "owner": user, **version_filter(expected_version)},
+        {"$set": {"sharedWith": shared_with, "updatedAt": get_current_time()}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        await raise_write_failure(obj_id, user, owner_only=True)
+    invalidate_note(obj_id)
+    return document_response(unpack_content(updated))
+
+async def delete_note(note_id: str, user: str, is_admin: bool):
+    note = await notes.find_one({"_id": ObjectId(note_id)}, {"owner": 1})
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
+    if note["owner"] != user and not is_admin:
+        raise HTTPException(status_code=403, detail="Only owner or admin can delete")
+    # only the request that actually removes the note updates the counters and index
+    note = await notes.find_one_and_delete({"_id": note["_id"]})
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    invalidate_note(note["_id"])
+    await remove_note(note["_id"])
+    await apply_tag_changes(note.get("tags"), [])
+    return {"msg": "Note deleted"}
 
-    if note["owner"] != user:
-        raise HTTPException(status_code=403, detail="Only owner can manage sharing")
+async def get_notes_batch(note_ids: list, user: str):
+    """Fetch many notes with one $in query, in the order asked for.
+
+    Ids that are malformed, missing or not readable by the user are reported
+    in "errors" instead of failing the whole batch.
+    """
+    found, errors, wanted = [], [], []
+    for note_id in dict.fromkeys(note_ids):
+        try:
+            wanted.append(ObjectId(note_id))
+        except:
+            errors.append({"id": note_id, "status": 400, "detail": "Invalid note ID format"})
+
+    by_id = {}
+    if wanted:
+        async for note in notes.find({"_id": {"$in": wanted}}):
+            by_id[note["_id"]] = note
+    for obj_id in wanted:
+        note = by_id.get(obj_id)
+        if note is None:
+            errors.append({"id": str(obj_id), "status": 404, "detail": "Note not found"})
+        elif note["owner"] != user and not any(entry["email"] == user for entry in note.get("sharedWith", [])):
+            errors.append({"id": str(obj_id), "status": 403, "detail": "You do not have permission to view this note"})
+        else:
+            found.append(document_response(unpack_content(note)))
+    return {"notes": found, "errors": errors}
+
+def bulk_failure(status: int, detail: str):
+    return {"status": status, "detail": detail}
+
+async def bulk_note_operations(operations: list, user: str, is_admin: bool):
+    """Apply create/update/archive/delete operations as one batch.
+
+    Each operation gets its own result; permission rules match the single-note
+    routes, and an optional "version" makes an update or delete conditional.
+    Creates go in one unordered insert_many. Each update, archive and delete
+    is its own find_one_and_* (run concurrently), so the pre-image it returns
+    says whether that write applied and what it replaced; index and tag
+    changes are derived from applied writes only.
+    """
+    results = [None] * len(operations)
+    ids, seen = {}, set()
+    for index, op in enumerate(operations):
+        if op["op"] == "create":
+            continue
+        try:
+            obj_id = ObjectId(op.get("id"))
+        except:
+            results[index] = bulk_failure(400, "Invalid note ID format")
+            continue
+        if obj_id in seen:
+            results[index] = bulk_failure(400, "Note appears more than once in the batch")
+            continue
+        seen.add(obj_id)
+        ids[index] = obj_id
 
-    await notes.update_one(
-        {"_id": obj_id}, 
-        {"$set": {"sharedWith": shared_with, "updatedAt": get_current_time()}}
+    existing = {}
+    if ids:
+        async for note in notes.find({"_id": {"$in": list(seen)}}):
+            existing[note["_id"]] = note
+
+    now = get_current_time()
+    inserts, writes = [], []
+    for index, op in enumerate(operations):
+        if results[index] is not None:
+            continue
+        kind = op["op"]
+        if kind == "create":
+            if not is_admin:
+                results[index] = bulk_failure(403, "Only admin can create notes")
+                continue
+            if op.get("note") is None:
+                results[index] = bulk_failure(400, "create needs a note")
+                continue
+            inserts.append((index, {"_id": ObjectId(), **new_note_document(op["note"], user, now)}))
+            continue
+
+        before = existing.get(ids[index])
+        expected_version = op.get("version")
+        if before is None:
+            results[index] = bulk_failure(404, "Note not found")
+            continue
+        if expected_version is not None and before.get("version", 0) != expected_version:
+            results[index] = bulk_failure(409, "Note was modified by another request")
+            continue
+
+        if kind == "delete":
+            if before["owner"] != user and not is_admin:
+                results[index] = bulk_failure(403, "Only owner or admin can delete")
+                continue
+            query = {"_id": before["_id"], **version_filter(expected_version)}
+            if not is_admin:
+                query["owner"] = user
+            writes.append((index, kind, query, None, None))
+            continue
+
+        if not is_admin:
+            results[index] = bulk_failure(403, "Only admin can edit notes")
+            continue
+        if not can_write(before, user):
+            results[index] = bulk_failure(403, "No write permission")
+            continue
+        if kind == "archive":
+            changes = {"isArchived": op.get("archived", True)}
+        else:
+            changes = {k: v for k, v in (op.get("changes") or {}).items() if k in UPDATABLE_FIELDS}
+        changes["updatedAt"] = now
+        stored, cleared = pack_content(changes)
+        writes.append((
+            index, kind,
+            {"_id": before["_id"], **write_predicate(user), **version_filter(expected_version)},
+            {"$set": stored, "$inc": {"version": 1}, **({"$unset": cleared} if cleared else {})},
+            changes
+        ))
+
+    applied = []
+    if inserts:
+        failed = {}
+        try:
+            await notes.insert_many([pack_content(note)[0] for _, note in inserts], ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"]: error.get("errmsg", "Write failed") for error in e.details["writeErrors"]}
+        for position, (index, note) in enumerate(inserts):
+            if position in failed:
+                results[index] = bulk_failure(500, failed[position])
+            else:
+                applied.append((index, "create", None, note))
+
+    if writes:
+        async def write(kind: str, query: dict, update: dict | None):
+            """Pre-image of the note the write changed, or None when it matched nothing"""
+            if kind == "delete":
+                return await notes.find_one_and_delete(query)
+            return await notes.find_one_and_update(query, update, return_document=ReturnDocument.BEFORE)
+
+        outcomes = await asyncio.gather(
+            *(write(kind, query, update) for _, kind, query, update, _ in writes), return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException) and not isinstance(outcome, PyMongoError):
+                raise outcome
+        missed = [query["_id"] for (_, _, query, _, _), outcome in zip(writes, outcomes) if outcome is None]
+        # the note was there when read: it matched nothing because it is gone or changed since
+        remaining = {note["_id"] async for note in notes.find({"_id": {"$in": missed}}, {"_id": 1})} if missed else set()
+        for (index, kind, query, _, changes), before in zip(writes, outcomes):
+            if isinstance(before, PyMongoError):
+                results[index] = bulk_failure(500, str(before))
+            elif before is None:
+                results[index] = (
+                    bulk_failure(409, "Note was modified by another request") if query["_id"] in remaining
+                    else bulk_failure(404, "Note not found")
+                )
+            elif kind == "delete":
+                applied.append((index, kind, before, None))
+            else:
+                after = {**before, **changes, "version": before.get("version", 0) + 1}
+                after.pop(SNIPPET_FIELD, None)
+                applied.append((index, kind, before, after))
+
+    for index, kind, before, after in applied:
+        if before is not None:
+            invalidate_note(before["_id"])
+    await index_notes([
+        unpack_content(after) for _, kind, before, after in applied
+        if kind == "create" or (kind == "update" and any(after.get(f) != before.get(f) for f in ("title", "content", "tags")))
+    ])
+    await remove_notes([before["_id"] for _, kind, before, _ in applied if kind == "delete"])
+    await apply_tag_changes(
+        [tag for _, _, before, _ in applied if before is not None for tag in before.get("tags") or []],
+        [tag for _, _, _, after in applied if after is not None for tag in after.get("tags") or []]
     )
-    updated = await notes.find_one({"_id": obj_id})
-    return note_response(updated)
+    for index, kind, before, after in applied:
+        results[index] = {"status": 201 if kind == "create" else 200, "id": str((after or before)["_id"])}
+        if after is not None:
+            results[index]["version"] = after["version"]
+
+    for index, op in enumerate(operations):
+        results[index] = {"index": index, "op": op["op"], "id": op.get("id"), **results[index]}
+    return {
+        "results": results,
+        "succeeded": sum(1 for result in results if result["status"] < 300),
+        "failed": sum(1 for result in results if result["status"] >= 300)
+    }
 
-async def delete_note(note_id: str, user: str):
-    note = await notes.find_one({"_id": ObjectId(note_id)})
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    if note["owner"] != user and user != ADMIN_EMAIL:
-        raise HTTPException(status_code=403, detail="Only owner or admin can delete")
-    await notes.delete_one({"_id": ObjectId(note_id)})
-    return {"msg": "Note deleted"}
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""Retention: daily summaries of raw analytics and view data.
+
+Raw `analytics` events, sampled `note_views` and hourly `note_view_counts`
+expire after ANALYTICS_RETENTION_DAYS (off by default) through the TTL
+indexes declared in app.core.indexes. Well before that, RollupJob rolls
+every complete UTC day into one summary document per user
+(`analytics_daily`) and per note (`note_views_daily`), so what is kept grows
+by a document per active user or note and day rather than per event.
+
+The TTL is only armed once every rollup has summarised the days it would
+expire (armed_retention); until then the raw data is kept whole. Turning
+retention on over months of existing events therefore rolls them up first,
+and RollupJob applies the TTL after the run that catches up. Should the
+rollups fall behind later (a failing job, or no cron), the next check
+removes the TTL again until they catch up.
+
+Each source keeps its progress in `rollups` as the first day not rolled up
+yet. A day is recomputed from the raw data and written with $set upserts,
+so rolling it again (after a crash before the progress update, or from two
+instances at once) writes the same summaries, and a stopped job resumes at
+the day it was on.
+
+Reads split their window at summary_horizon(): raw data from there on,
+daily summaries before it. Windows inside the retention period, such as the
+default 7- and 30-day views, only read raw data. A longer window counts its
+first day whole from that day's summary, since its raw data is already
+partly expired.
+
+    python -m app.services.retention_service            # roll up complete days now
+    python -m app.services.retention_service --status
+"""
+from app.db import db
+from app.core.config import settings, lazy
+from app.core.indexes import ensure_indexes, retention_seconds
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+ONE_DAY = timedelta(days=1)
+# a day is rolled up once it has been over this long; buffered writes land well within it
+ROLLUP_GRACE = timedelta(hours=1)
+# how often the TTL is re-checked against the rollups when they run from cron
+RETENTION_CHECK_INTERVAL = 3600.0
+
+rollups = db.get_collection("rollups")
+
+def start_of_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_cutoff() -> datetime:
+    """First day that is not complete yet"""
+    return start_of_day(datetime.utcnow() - ROLLUP_GRACE)
+
+class Rollup:
+    """Daily summaries of one raw collection, one document per `key` value and day"""
+
+    def __init__(self, name: str, source: str, time_field: str, target: str, key: str, accumulators: dict):
+        self.name = name
+        self.source = source
+        self.time_field = time_field
+        self.target = target
+        self.key = key
+        self.accumulators = accumulators
+
+    def day_pipeline(self, day: datetime):
+        return [
+            {"$match": {self.time_field: {"$gte": day, "$lt": day + ONE_DAY}}},
+            {"$group": {"_id": f"${self.key}", **self.accumulators}}
+        ]
+
+    async def first_day(self) -> datetime | None:
+        state = await rollups.find_one({"_id": self.name})
+        if state:
+            return state["rolledThrough"]
+        oldest = await db.get_collection(self.source).find(
+            {self.time_field: {"$type": "date"}}, {self.time_field: 1}
+        ).sort(self.time_field, 1).to_list(length=1)
+        return start_of_day(oldest[0][self.time_field]) if oldest else None
+
+    async def roll_day(self, day: datetime) -> int:
+        groups = await db.get_collection(self.source).aggregate(self.day_pipeline(day)).to_list(length=None)
+        if groups:
+            await db.get_collection(self.target).bulk_write([
+                UpdateOne({self.key: group.pop("_id"), "day": day}, {"$set": group}, upsert=True)
+                for group in groups
+            ], ordered=False)
+        # $max keeps a slower concurrent run from moving progress back
+        await rollups.update_one(
+            {"_id": self.name},
+            {"$max": {"rolledThrough": day + ONE_DAY}, "$set": {"updatedAt": datetime.utcnow()}},
+            upsert=True
+        )
+        return len(groups)
+
+    async def run(self, until: datetime) -> dict:
+        """Roll up every day from the last one rolled up to `until` (exclusive)"""
+        day = await self.first_day()
+        days = summaries = 0
+        while day is not None and day < until:
+            summaries += await self.roll_day(day)
+            day += ONE_DAY
+            days += 1
+        return {"days": days, "summaries": summaries}
+
+TIMED = {"$gt": ["$timeSpent", None]}
+
+ROLLUPS = [
+    Rollup("analytics", "analytics", "timestamp", "analytics_daily", "email", {
+        "logins": {"$sum": {"$cond": [{"$eq": ["$event", "login"]}, 1, 0]}},
+        "logouts": {"$sum": {"$cond": [{"$eq": ["$event", "logout"]}, 1, 0]}},
+        # what get_daily_activity_summary counts as study sessions
+        "studyEvents": {"$sum": {"$cond": [{"$in": [{"$ifNull": ["$event", None]}, ["login", "logout"]]}, 0, 1]}},
+        # what get_user_study_activity counts: heartbeats carrying timeSpent
+        "timedEvents": {"$sum": {"$cond": [TIMED, 1, 0]}},
+        "studyTime": {"$sum": "$timeSpent"},
+        "pages": {"$addToSet": {"$cond": [TIMED, "$page", "$$REMOVE"]}},
+    }),
+    Rollup("note_view_counts", "note_view_counts", "hour", "note_views_daily", "noteId", {
+        "views": {"$sum": "$count"},
+    }),
+    Rollup("note_views", "note_views", "timestamp", "note_views_daily", "noteId", {
+        "loggedViews": {"$sum": 1},
+        "estimatedViews": {"$sum": {"$divide": [1, {"$ifNull": ["$sampleRate", 1]}]}},
+    }),
+]
+
+async def run_rollups() -> dict:
+    until = rollup_cutoff()
+    return {rollup.name: await rollup.run(until) for rollup in ROLLUPS}
+
+async def armed_retention() -> int | None:
+    """Retention in seconds once it expires nothing that is not rolled up, else None.
+
+    The TTL removes documents older than the retention, so up to part of the
+    day containing that moment; every rollup must be past that day (or have
+    no raw data yet).
+    """
+    ttl = retention_seconds()
+    if not ttl:
+        return None
+    expiring_until = start_of_day(datetime.utcnow() - timedelta(seconds=ttl)) + ONE_DAY
+    for rollup in ROLLUPS:
+        first = await rollup.first_day()
+        if first is not None and first < expiring_until:
+            return None
+    return ttl
+
+async def apply_retention() -> int | None:
+    """Arm the TTL indexes when the rollups allow it, disarm them when they do not.
+
+    Returns the retention applied, or None when nothing expires.
+    """
+    if not retention_seconds():
+        return None
+    # ensure_indexes declares the TTL from armed_retention and brings the live indexes to it
+    await ensure_indexes()
+    return await armed_retention()
+
+async def summary_horizon(name: str, since: datetime | None = None) -> datetime | None:
+    """Day from which reads use the raw data of rollup `name`, or None for raw data only.
+
+    Raw data is complete from the first day after the retention cutoff and
+    summaries exist up to the first day not rolled up yet; the horizon is
+    the earlier of the two, so every day before it has its summaries. A
+    window starting at `since` on or after the cutoff itself still has all
+    its raw data, so it is read raw only.
+    """
+    ttl = retention_seconds()
+    if not ttl:
+        return None
+    if since is not None and since >= datetime.utcnow() - timedelta(seconds=ttl):
+        return None
+    state = await rollups.find_one({"_id": name})
+    if not state:
+        return None
+    raw_complete_from = start_of_day(datetime.utcnow() - timedelta(seconds=ttl)) + ONE_DAY
+    return min(state["rolledThrough"], raw_complete_from)
+
+async def daily_summaries(target: str, match: dict, since: datetime, until: datetime):
+    """Summary documents of the whole days from the one containing `since` to `until`.
+
+    Summaries are per day, so the first day counts whole, events before
+    `since` included: its raw data is partly expired by the time a window
+    reaches past the retention cutoff.
+    """
+    summaries = db.get_collection(target)
+    return await summaries.find(
+        {**match, "day": {"$gte": start_of_day(since), "$lt": until}}, {"_id": 0}
+    ).to_list(length=None)
+
+class RollupJob:
+    """Background task running the rollups every `interval` seconds"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_run = None
+        self._task = None
+
+    async def _run(self, interval: float, rollup: bool):
+        while True:
+            try:
+                if rollup:
+                    self.last_run = await run_rollups()
+                    logger.info("Rolled up raw analytics: %s", self.last_run)
+                await apply_retention()
+            except Exception:
+                logger.exception("Analytics rollup failed; retrying in %ss", interval)
+            await asyncio.sleep(interval)
+
+    def start(self):
+        if self._task is not None:
+            return
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run(self.interval, rollup=True))
+        elif retention_seconds():
+            # 0 leaves the rollups to `python -m app.services.retention_service` from cron;
+            # the TTL is still checked against them, should cron stop
+            self._task = asyncio.create_task(self._run(RETENTION_CHECK_INTERVAL, rollup=False))
+
+    async def stop(self):
+        """Cancel the task; an interrupted day is rolled up again on the next run"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+rollup_job = lazy(lambda: RollupJob(settings.ANALYTICS_ROLLUP_INTERVAL))
+
+async def retention_status() -> dict:
+    return {
+        "retentionDays": settings.ANALYTICS_RETENTION_DAYS or None,
+        "retentionArmed": await armed_retention() is not None,
+        "rollups": {
+            rollup.name: {
+                "rolledThrough": (await rollups.find_one({"_id": rollup.name}) or {}).get("rolledThrough"),
+                "horizon": await summary_horizon(rollup.name),
+                "summaries": await db.get_collection(rollup.target).estimated_document_count(),
+            }
+            for rollup in ROLLUPS
+        },
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import pprint
+
+    parser = argparse.ArgumentParser(description="Daily rollups of raw analytics and view data")
+    parser.add_argument("--status", action="store_true", help="only report progress and horizons")
+    args = parser.parse_args()
+
+    async def main():
+        if not args.status:
+            for name, result in (await run_rollups()).items():
+                print(f"{name}: rolled up {result['days']} days into {result['summaries']} summaries")
+            await apply_retention()
+        pprint.pprint(await retention_status())
+
+    asyncio.run(main())
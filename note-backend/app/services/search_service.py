@@ -0,0 +1,278 @@
+from app.models.search import get_search_terms_collection, get_search_stats_collection
+from app.services.note_repository import unpack_content
+from collections import Counter, defaultdict
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+terms = get_search_terms_collection()
+stats = get_search_stats_collection()
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TERM_LENGTH = 64
+MIN_PREFIX_LENGTH = 2
+# bounds on the work one query does, whatever the size of the owner's corpus:
+# indexed terms a prefix expands to, and postings read per query token
+MAX_PREFIX_TERMS = 16
+MAX_CANDIDATES = 2000
+
+# BM25F parameters: title matches count three times a content match, tags twice
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "content": 1.0}
+PREFIX_PENALTY = 0.8
+
+# note_search_stats document recording that the index has been built (stats are otherwise keyed by owner)
+BUILD_MARKER = "$build"
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return [t[:MAX_TERM_LENGTH] for t in TOKEN_RE.findall(text.lower())]
+
+def build_postings(note):
+    """Build one posting per distinct term of a note, with per-field term frequencies"""
+    fields = {
+        "title": tokenize(note.get("title", "")),
+        "content": tokenize(note.get("content", "")),
+        "tags": [t for tag in note.get("tags", []) or [] for t in tokenize(tag)],
+    }
+    lengths = {f"{field}_len": len(tokens) for field, tokens in fields.items()}
+    counts = {field: Counter(tokens) for field, tokens in fields.items()}
+
+    postings = []
+    for term in set().union(*counts.values()):
+        postings.append({
+            "term": term,
+            "noteId": note["_id"],
+            "owner": note["owner"],
+            "tf": {field: counts[field][term] for field in fields if counts[field][term]},
+            **lengths,
+        })
+    return postings, lengths
+
+LENGTH_FIELDS = ("title_len", "content_len", "tags_len")
+
+async def indexed_lengths(note_ids):
+    """{noteId: {owner, *_len}} as currently indexed, for the notes that have postings"""
+    pipeline = [
+        {"$match": {"noteId": {"$in": note_ids}}},
+        {"$group": {"_id": "$noteId", "owner": {"$first": "$owner"}, **{key: {"$first": f"${key}"} for key in LENGTH_FIELDS}}}
+    ]
+    return {item.pop("_id"): item async for item in terms.aggregate(pipeline)}
+
+async def apply_stats_deltas(deltas):
+    updates = [
+        UpdateOne({"_id": owner}, {"$inc": {key: value for key, value in delta.items() if value}}, upsert=True)
+        for owner, delta in deltas.items()
+        if any(delta.values())
+    ]
+    if updates:
+        await stats.bulk_write(updates, ordered=False)
+
+async def index_notes(batch):
+    """(Re)index notes in a handful of round-trips; keeps the per-owner corpus statistics in step"""
+    if not batch:
+        return
+    note_ids = [note["_id"] for note in batch]
+    old = await indexed_lengths(note_ids)
+
+    postings, deltas = [], defaultdict(Counter)
+    for note in batch:
+        note_postings, lengths = build_postings(note)
+        postings.extend(note_postings)
+        previous = old.get(note["_id"])
+        if previous:
+            deltas[previous["owner"]].update({"doc_count": -1, **{key: -previous.get(key, 0) for key in LENGTH_FIELDS}})
+        if note_postings:
+            deltas[note["owner"]].update({"doc_count": 1, **lengths})
+
+    await terms.delete_many({"noteId": {"$in": note_ids}})
+    if postings:
+        await terms.insert_many(postings, ordered=False)
+    await apply_stats_deltas(deltas)
+
+async def index_note(note):
+    await index_notes([note])
+
+async def remove_notes(note_ids):
+    old = await indexed_lengths(note_ids)
+    if not old:
+        return
+    deltas = defaultdict(Counter)
+    for previous in old.values():
+        deltas[previous.pop("owner")].update({"doc_count": -1, **{key: -value for key, value in previous.items()}})
+    await terms.delete_many({"noteId": {"$in": list(old)}})
+    await apply_stats_deltas(deltas)
+
+async def remove_note(note_id):
+    await remove_notes([note_id])
+
+async def rebuild_index(note_collection):
+    """Rebuild the whole index from the notes collection"""
+    await terms.delete_many({})
+    await stats.delete_many({"_id": {"$ne": BUILD_MARKER}})
+    owner_stats = defaultdict(Counter)
+    batch = []
+    async for note in note_collection.find({}, {"title": 1, "content": 1, "tags": 1, "owner": 1}):
+        postings, lengths = build_postings(unpack_content(note))
+        if not postings:
+            continue
+        batch.extend(postings)
+        owner_stats[note["owner"]].update({"doc_count": 1, **lengths})
+        if len(batch) >= 5000:
+            await terms.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await terms.insert_many(batch, ordered=False)
+    if owner_stats:
+        await stats.bulk_write([
+            UpdateOne({"_id": owner}, {"$set": dict(counter)}, upsert=True)
+            for owner, counter in owner_stats.items()
+        ])
+    indexed = sum(counter["doc_count"] for counter in owner_stats.values())
+    await stats.update_one(
+        {"_id": BUILD_MARKER}, {"$set": {"finishedAt": datetime.utcnow(), "notes": indexed}}, upsert=True
+    )
+    return indexed
+
+async def backfill_index(note_collection):
+    """Build the index at startup if it has never been built.
+
+    Notes written before the index existed are otherwise unsearchable. The
+    instance that inserts the build marker first does the build, so several
+    starting together do not rebuild over each other. Returns the number of
+    notes indexed, or None when there was nothing to do.
+    """
+    if await stats.find_one({}, {"_id": 1}) is not None:
+        return None
+    if await note_collection.find_one({}, {"_id": 1}) is None:
+        return None
+    try:
+        await stats.insert_one({"_id": BUILD_MARKER, "startedAt": datetime.utcnow()})
+    except DuplicateKeyError:
+        return None
+    indexed = await rebuild_index(note_collection)
+    logger.info("Built the search index for %s existing notes", indexed)
+    return indexed
+
+def rank_postings(postings, query_tokens, corpus, df=None):
+    """Score candidate notes with BM25F.
+
+    Every query token must match (exactly, or as a prefix of an indexed term)
+    for a note to be returned. `df` gives each term's document frequency when
+    `postings` are only the candidates. Returns a list of (noteId, score),
+    best first.
+    """
+    doc_count = max(corpus.get("doc_count", 0), 1)
+    avg_len = {
+        field: max(corpus.get(f"{field}_len", 0) / doc_count, 1.0)
+        for field in FIELD_WEIGHTS
+    }
+
+    if df is None:
+        df = Counter(p["term"] for p in postings)
+    token_scores = defaultdict(dict)
+    for posting in postings:
+        term = posting["term"]
+        idf = math.log(1 + (doc_count - df[term] + 0.5) / (df[term] + 0.5))
+        weighted_tf = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            tf = posting["tf"].get(field, 0)
+            if tf:
+                norm = 1 - B + B * posting.get(f"{field}_len", 0) / avg_len[field]
+                weighted_tf += weight * tf / norm
+        score = idf * weighted_tf / (K1 + weighted_tf)
+
+        for index, token in enumerate(query_tokens):
+            if term == token:
+                matched = score
+            elif len(token) >= MIN_PREFIX_LENGTH and term.startswith(token):
+                matched = score * PREFIX_PENALTY
+            else:
+                continue
+            best = token_scores[posting["noteId"]].get(index, 0.0)
+            token_scores[posting["noteId"]][index] = max(best, matched)
+
+    ranked = [
+        (note_id, sum(scores.values()))
+        for note_id, scores in token_scores.items()
+        if len(scores) == len(query_tokens)
+    ]
+    ranked.sort(key=lambda item: (item[1], item[0]), reverse=True)
+    return ranked
+
+async def expand_token(owner: str, token: str):
+    """The indexed terms a query token matches: itself, plus up to MAX_PREFIX_TERMS
+    terms it is a prefix of, in one query"""
+    if len(token) < MIN_PREFIX_LENGTH:
+        return [token]
+    # sorted on owner_term, the $group is a DISTINCT_SCAN: one index seek per distinct term
+    # rather than a read of every posting under the prefix
+    expanded = await terms.aggregate([
+        {"$match": {"owner": owner, "term": {"$regex": f"^{re.escape(token)}"}}},
+        {"$sort": {"owner": 1, "term": 1}},
+        {"$group": {"_id": "$term"}},
+        {"$sort": {"_id": 1}},
+        {"$limit": MAX_PREFIX_TERMS},
+    ]).to_list(length=None)
+    return [group["_id"] for group in expanded] or [token]
+
+async def document_frequencies(owner: str, token_terms, doc_count: int):
+    """{term: notes containing it}, counting at most MAX_CANDIDATES postings per term"""
+    distinct = list(dict.fromkeys(term for expanded in token_terms for term in expanded))
+    counts = await asyncio.gather(*(
+        terms.count_documents({"owner": owner, "term": term}, limit=MAX_CANDIDATES) for term in distinct
+    ))
+    # a term that reaches the cap is treated as occurring everywhere, so its idf is ~0
+    return {term: count if count < MAX_CANDIDATES else max(doc_count, count) for term, count in zip(distinct, counts)}
+
+async def search_notes(owner: str, query: str, page: int = 1, limit: int = 10):
+    """Return (ranked note ids for the requested page, total hit count).
+
+    Reads postings for at most MAX_CANDIDATES notes: those of the rarest
+    query token, then the other tokens' postings of just those notes. A query
+    whose every token is that common ranks a capped subset, and the total is
+    a lower bound.
+    """
+    query_tokens = list(dict.fromkeys(tokenize(query)))
+    if not query_tokens:
+        return [], 0
+
+    corpus = await stats.find_one({"_id": owner}) or {}
+    token_terms = await asyncio.gather(*(expand_token(owner, token) for token in query_tokens))
+    df = await document_frequencies(owner, token_terms, corpus.get("doc_count", 0))
+    rarest = min(token_terms, key=lambda expanded: sum(df[term] for term in expanded))
+
+    postings = await terms.find(
+        {"owner": owner, "term": {"$in": rarest}},
+        {"_id": 0, "owner": 0}
+    ).limit(MAX_CANDIDATES).to_list(length=None)
+    others = list({term for expanded in token_terms if expanded is not rarest for term in expanded})
+    if postings and others:
+        postings += await terms.find(
+            {"noteId": {"$in": list({posting["noteId"] for posting in postings})}, "term": {"$in": others}},
+            {"_id": 0, "owner": 0}
+        ).to_list(length=None)
+
+    ranked = rank_postings(postings, query_tokens, corpus, df)
+    start = (page - 1) * limit
+    return [note_id for note_id, _ in ranked[start:start + limit]], len(ranked)
+
+if __name__ == "__main__":
+    from app.models.note import get_note_collection
+    from app.core.indexes import ensure_indexes
+
+    async def main():
+        await ensure_indexes()
+        indexed = await rebuild_index(get_note_collection())
+        print(f"Indexed {indexed} notes")
+
+    asyncio.run(main())
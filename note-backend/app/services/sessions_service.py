@@ -0,0 +1,96 @@
+from app.db import db
+from datetime import datetime
+
+# One document per login:
+#   {email, loginAt, logoutAt, durationSeconds, status}
+# status is "open" until the matching logout closes it, or "superseded" when
+# the user logs in again without logging out (the old pairing ignored those).
+sessions = db.get_collection("sessions")
+
+async def open_session(email: str, at: datetime):
+    await sessions.update_many(
+        {"email": email, "status": "open", "loginAt": {"$lte": at}},
+        {"$set": {"status": "superseded"}}
+    )
+    await sessions.insert_one({
+        "email": email,
+        "loginAt": at,
+        "logoutAt": None,
+        "durationSeconds": None,
+        "status": "open"
+    })
+
+async def close_session(email: str, at: datetime):
+    """Close the user's open session; a logout without one is ignored"""
+    await sessions.find_one_and_update(
+        {"email": email, "status": "open", "loginAt": {"$lte": at}},
+        [{"$set": {
+            "status": "closed",
+            "logoutAt": at,
+            "durationSeconds": {"$divide": [{"$subtract": [at, "$loginAt"]}, 1000]}
+        }}],
+        sort=[("loginAt", -1)]
+    )
+
+async def apply_session_events(events):
+    """Fold login/logout analytics events, in arrival order, into sessions"""
+    for event in events:
+        if not event.get("email"):
+            continue
+        if event.get("event") == "login":
+            await open_session(event["email"], event["timestamp"])
+        elif event.get("event") == "logout":
+            await close_session(event["email"], event["timestamp"])
+
+async def session_summaries(emails, since: datetime):
+    """Per-user session totals for sessions that started at or after `since`.
+
+    Returns {email: {...}} with closed-session time summed server side; the
+    open session, if any, is reported by its start so callers can add the
+    time elapsed so far.
+    """
+    pipeline = [
+        {"$match": {"email": {"$in": emails}, "loginAt": {"$gte": since}}},
+        {"$group": {
+            "_id": "$email",
+            "login_count": {"$sum": 1},
+            "closed_sessions": {"$sum": {"$cond": [{"$eq": ["$status", "closed"]}, 1, 0]}},
+            "closed_time": {"$sum": {"$cond": [{"$eq": ["$status", "closed"]}, "$durationSeconds", 0]}},
+            "open_since": {"$max": {"$cond": [{"$eq": ["$status", "open"]}, "$loginAt", None]}},
+            "last_activity": {"$max": {"$ifNull": ["$logoutAt", "$loginAt"]}}
+        }}
+    ]
+    result = await sessions.aggregate(pipeline).to_list(length=None)
+    return {item.pop("_id"): item for item in result}
+
+async def total_session_durations():
+    """All-time closed-session seconds per user"""
+    pipeline = [
+        {"$match": {"status": "closed"}},
+        {"$group": {"_id": "$email", "total": {"$sum": "$durationSeconds"}}}
+    ]
+    result = await sessions.aggregate(pipeline).to_list(length=None)
+    return {item["_id"]: item["total"] for item in result}
+
+async def rebuild_sessions():
+    """Replay every login/logout analytics event into a fresh sessions collection"""
+    analytics = db.get_collection("analytics")
+    await sessions.delete_many({})
+    replayed = 0
+    cursor = analytics.find(
+        {"event": {"$in": ["login", "logout"]}},
+        {"_id": 0, "email": 1, "event": 1, "timestamp": 1}
+    ).sort("timestamp", 1)
+    async for event in cursor:
+        await apply_session_events([event])
+        replayed += 1
+    return replayed
+
+if __name__ == "__main__":
+    import asyncio
+
+    async def main():
+        replayed = await rebuild_sessions()
+        print(f"Replayed {replayed} login/logout events")
+
+    asyncio.run(main())
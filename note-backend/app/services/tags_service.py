@@ -0,0 +1,92 @@
+from app.models.tag import get_tag_stats_collection
+from collections import Counter
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+tag_stats = get_tag_stats_collection()
+
+def tag_deltas(old_tags, new_tags):
+    """Per-tag count changes between two versions of a note's tag list"""
+    old_counts = Counter(old_tags or [])
+    new_counts = Counter(new_tags or [])
+    return {
+        tag: new_counts[tag] - old_counts[tag]
+        for tag in old_counts.keys() | new_counts.keys()
+        if new_counts[tag] != old_counts[tag]
+    }
+
+async def apply_tag_changes(old_tags, new_tags):
+    """Apply a note's tag changes to tag_stats in one atomic-per-tag bulk write"""
+    deltas = tag_deltas(old_tags, new_tags)
+    if not deltas:
+        return
+    await tag_stats.bulk_write([
+        UpdateOne(
+            {"_id": tag},
+            {"$inc": {"count": delta}, "$setOnInsert": {"key": tag.lower()}},
+            upsert=True
+        )
+        for tag, delta in deltas.items()
+    ], ordered=False)
+    if any(delta < 0 for delta in deltas.values()):
+        await tag_stats.delete_many({"_id": {"$in": list(deltas)}, "count": {"$lte": 0}})
+
+async def top_tags(limit: int = 5):
+    cursor = tag_stats.find({"count": {"$gt": 0}}).sort("count", -1).limit(limit)
+    return [{"tag": entry["_id"], "count": entry["count"]} async for entry in cursor]
+
+async def suggest_tags(prefix: str, limit: int = 10):
+    """Most used tags starting with prefix (case-insensitive)"""
+    query = {"count": {"$gt": 0}}
+    if prefix:
+        query["key"] = {"$regex": f"^{re.escape(prefix.lower())}"}
+    cursor = tag_stats.find(query).sort("count", -1).limit(limit)
+    return [{"tag": entry["_id"], "count": entry["count"]} async for entry in cursor]
+
+async def rebuild_tag_stats(note_collection):
+    """Recount every tag from the notes collection"""
+    pipeline = [
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}}
+    ]
+    counts = await note_collection.aggregate(pipeline).to_list(length=None)
+    await tag_stats.delete_many({})
+    if counts:
+        await tag_stats.insert_many([
+            {"_id": entry["_id"], "key": str(entry["_id"]).lower(), "count": entry["count"]}
+            for entry in counts
+        ])
+    return len(counts)
+
+async def backfill_tag_stats(note_collection):
+    """Count the tags of existing notes if tag_stats has never been filled.
+
+    tag_stats is kept up to date by note writes only, so notes written before
+    it existed would not count. Returns the number of tags counted, or None
+    when there was nothing to do.
+    """
+    if await tag_stats.find_one({}) is not None:
+        return None
+    if await note_collection.find_one({"tags.0": {"$exists": True}}, {"_id": 1}) is None:
+        return None
+    try:
+        rebuilt = await rebuild_tag_stats(note_collection)
+    except BulkWriteError:
+        # another instance filled it at the same time, with the same counts
+        return None
+    logger.info("Backfilled tag_stats with %s tags from existing notes", rebuilt)
+    return rebuilt
+
+if __name__ == "__main__":
+    import asyncio
+    from app.models.note import get_note_collection
+
+    async def main():
+        rebuilt = await rebuild_tag_stats(get_note_collection())
+        print(f"Rebuilt counts for {rebuilt} tags")
+
+    asyncio.run(main())
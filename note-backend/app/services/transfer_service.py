@@ -0,0 +1,270 @@
+"""Streaming NDJSON export and import of notes and analytics events.
+
+One extended-JSON document per line, so ObjectIds and dates round-trip.
+Notes are exported as their logical form (compressed bodies inflated) and
+stored again through pack_content on import. Exports iterate the Motor
+cursor and imports parse line by line, so memory stays flat however large
+the collection is. From the command line:
+
+    python -m app.services.transfer_service export notes --out notes.ndjson.gz --owner a@b.com
+    python -m app.services.transfer_service import notes --in notes.ndjson.gz --progress notes.progress
+
+An interrupted import resumes from the progress file; documents that were
+already inserted are skipped by _id either way. A time-series collection
+does not enforce unique _ids, so imports into one look the batch's _ids up
+before inserting. Documents the database rejects for any other reason (a
+validation error, say) are counted as failed rather than ending the import.
+"""
+from app.db import db
+from app.services.search_service import index_notes
+from app.services.note_repository import pack_content, unpack_content
+from app.services.tags_service import apply_tag_changes
+from app.services.sessions_service import apply_session_events
+from app.core.indexes import collection_type
+from bson import ObjectId, json_util
+from bson.errors import BSONError
+from bson.json_util import JSONOptions, JSONMode
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+KINDS = {
+    # collection, owner field, time field
+    "notes": ("notes", "owner", "updatedAt"),
+    "analytics": ("analytics", "email", "timestamp"),
+}
+# fields the derived collections (search index, sessions) rely on
+REQUIRED_FIELDS = {"notes": ("owner",), "analytics": ("timestamp",)}
+JSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=False)
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+GZIP_CHUNK_BYTES = 64 * 1024
+MAX_LINE_BYTES = 16 * 1024 * 1024
+DUPLICATE_KEY = 11000
+
+class TransferError(ValueError):
+    """Input that cannot be imported"""
+
+def export_query(kind: str, owner: str | None = None, tag: str | None = None,
+                 since: datetime | None = None, until: datetime | None = None):
+    _, owner_field, time_field = KINDS[kind]
+    query = {}
+    if owner:
+        query[owner_field] = owner
+    if tag and kind == "notes":
+        query["tags"] = tag
+    if since or until:
+        query[time_field] = {}
+        if since:
+            query[time_field]["$gte"] = since
+        if until:
+            query[time_field]["$lt"] = until
+    return query
+
+async def export_lines(kind: str, query: dict):
+    """Yield one NDJSON line per matching document, in _id order"""
+    collection = db.get_collection(KINDS[kind][0])
+    cursor = collection.find(query).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    async for document in cursor:
+        if kind == "notes":
+            unpack_content(document)
+        yield json_util.dumps(document, json_options=JSON_OPTIONS) + "\n"
+
+async def gzip_stream(lines):
+    """Gzip an async stream of text lines, emitting roughly GZIP_CHUNK_BYTES at a time"""
+    compressor = zlib.compressobj(wbits=31)
+    pending = 0
+    async for line in lines:
+        data = line.encode()
+        pending += len(data)
+        chunk = compressor.compress(data)
+        if pending >= GZIP_CHUNK_BYTES:
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+async def read_lines(chunks, compressed: bool = False):
+    """Split an async stream of bytes (optionally gzip) into decoded lines"""
+    decompressor = zlib.decompressobj(wbits=47) if compressed else None
+    buffer = b""
+    async for chunk in chunks:
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_LINE_BYTES:
+            raise TransferError(f"Line longer than {MAX_LINE_BYTES} bytes")
+        for line in lines:
+            yield line.decode()
+    if decompressor is not None:
+        buffer += decompressor.flush()
+    if buffer:
+        yield buffer.decode()
+
+async def _present_ids(collection, time_field: str, batch: list):
+    """_ids of the batch already in the collection, looked up within the batch's time range"""
+    ids = [document["_id"] for document in batch if "_id" in document]
+    times = [document[time_field] for document in batch if isinstance(document.get(time_field), datetime)]
+    if not ids:
+        return set()
+    query = {"_id": {"$in": ids}}
+    if len(times) == len(batch):
+        query[time_field] = {"$gte": min(times), "$lte": max(times)}
+    return set(await collection.distinct("_id", query))
+
+async def _insert_batch(kind: str, batch: list, unique_ids: bool = True):
+    """Insert a batch, skipping documents already present.
+
+    Returns (inserted documents, number the database rejected other than as duplicates).
+    """
+    name, _, time_field = KINDS[kind]
+    collection = db.get_collection(name)
+    if not unique_ids:
+        present = await _present_ids(collection, time_field, batch)
+        seen, fresh = set(), []
+        for document in batch:
+            if "_id" in document and (document["_id"] in present or document["_id"] in seen):
+                continue
+            seen.add(document.get("_id"))
+            fresh.append(document)
+        batch = fresh
+        if not batch:
+            return [], 0
+    if kind == "notes":
+        # _ids first, so the stored copies and the logical notes agree on them
+        for document in batch:
+            document.setdefault("_id", ObjectId())
+        stored = [pack_content(document)[0] for document in batch]
+    else:
+        stored = batch
+    failed = 0
+    try:
+        await collection.insert_many(stored, ordered=False)
+        inserted = batch
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+        rejected = [error for error in errors if error["code"] != DUPLICATE_KEY]
+        if rejected:
+            failed = len(rejected)
+            logger.warning(
+                "Import into %s rejected %s documents, first: %s", name, failed, rejected[0].get("errmsg")
+            )
+        skipped = {error["index"] for error in errors}
+        inserted = [document for index, document in enumerate(batch) if index not in skipped]
+
+    # keep the derived collections in step, as the regular write paths do
+    if kind == "notes":
+        await index_notes([unpack_content(dict(note)) for note in inserted])
+        await apply_tag_changes([], [tag for note in inserted for tag in note.get("tags") or []])
+    else:
+        events = [event for event in inserted if event.get("event") in ("login", "logout")]
+        await apply_session_events(sorted(events, key=lambda event: event["timestamp"]))
+    return inserted, failed
+
+async def import_lines(kind: str, lines, skip: int = 0, on_progress=None):
+    """Insert NDJSON documents in insert_many batches.
+
+    The first `skip` lines are ignored, so a run can resume where an earlier
+    one stopped; on_progress, if given, is awaited with the number of lines
+    fully committed after every batch.
+    """
+    report = {"lines": 0, "inserted": 0, "skipped": 0, "invalid": 0, "failed": 0}
+    batch = []
+    unique_ids = await collection_type(KINDS[kind][0]) != "timeseries"
+
+    async def flush():
+        inserted, failed = await _insert_batch(kind, batch, unique_ids)
+        report["inserted"] += len(inserted)
+        report["failed"] += failed
+        report["skipped"] += len(batch) - len(inserted) - failed
+        batch.clear()
+        if on_progress is not None:
+            await on_progress(report["lines"])
+
+    async for line in lines:
+        report["lines"] += 1
+        if report["lines"] <= skip or not line.strip():
+            continue
+        try:
+            document = json_util.loads(line, json_options=JSON_OPTIONS)
+        except (ValueError, TypeError, BSONError):
+            # BSONError covers malformed extended JSON such as {"$oid": "xyz"}
+            document = None
+        if not isinstance(document, dict) or any(field not in document for field in REQUIRED_FIELDS[kind]):
+            report["invalid"] += 1
+            continue
+        batch.append(document)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    elif on_progress is not None:
+        await on_progress(report["lines"])
+    return report
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import os
+    import sys
+
+    def parse_time(value):
+        return datetime.fromisoformat(value)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("kind", choices=list(KINDS))
+    parser.add_argument("--out", help="export target; .gz is compressed (default: stdout)")
+    parser.add_argument("--in", dest="source", help="import source; .gz is decompressed")
+    parser.add_argument("--progress", help="file recording committed lines, for resuming an import")
+    parser.add_argument("--owner")
+    parser.add_argument("--tag")
+    parser.add_argument("--since", type=parse_time)
+    parser.add_argument("--until", type=parse_time)
+    args = parser.parse_args()
+
+    async def export(args):
+        query = export_query(args.kind, args.owner, args.tag, args.since, args.until)
+        lines = export_lines(args.kind, query)
+        if args.out and args.out.endswith(".gz"):
+            with open(args.out, "wb") as target:
+                async for chunk in gzip_stream(lines):
+                    target.write(chunk)
+        else:
+            target = open(args.out, "w") if args.out else sys.stdout
+            async for line in lines:
+                target.write(line)
+            target.flush()
+
+    async def file_chunks(path):
+        with open(path, "rb") as source:
+            while chunk := source.read(GZIP_CHUNK_BYTES):
+                yield chunk
+
+    async def restore(args):
+        skip = 0
+        if args.progress and os.path.exists(args.progress):
+            with open(args.progress) as f:
+                skip = int(f.read().strip() or 0)
+
+        async def save_progress(lines):
+            if args.progress:
+                with open(args.progress, "w") as f:
+                    f.write(str(lines))
+
+        lines = read_lines(file_chunks(args.source), compressed=args.source.endswith(".gz"))
+        report = await import_lines(args.kind, lines, skip, save_progress)
+        print(f"{report['lines']} lines: {report['inserted']} inserted, "
+              f"{report['skipped']} already present, {report['invalid']} invalid, {report['failed']} failed")
+
+    if args.action == "export":
+        asyncio.run(export(args))
+    else:
+        if not args.source:
+            parser.error("import needs --in")
+        asyncio.run(restore(args))
@@ -0,0 +1,73 @@
+from app.db import db
+from app.core.config import settings, lazy
+from app.services.ingest_service import CounterBuffer, WriteBuffer
+from app.services.retention_service import daily_summaries, summary_horizon
+from app.utils.shared import get_current_time
+from datetime import datetime, timedelta
+import random
+
+# per-note, per-hour view totals: {noteId, hour, count}
+view_counter = lazy(lambda: CounterBuffer("note_view_counts", max_keys=50000, flush_interval=settings.NOTE_VIEW_FLUSH_INTERVAL))
+view_log_buffer = lazy(lambda: WriteBuffer(
+    "note_views",
+    max_size=settings.ANALYTICS_BUFFER_SIZE,
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+    flush_interval=settings.NOTE_VIEW_FLUSH_INTERVAL,
+))
+
+def current_hour():
+    return datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+def should_log_raw_view():
+    mode = settings.NOTE_VIEW_LOG_MODE
+    if mode == "all":
+        return True
+    if mode == "sampled":
+        return random.random() < settings.NOTE_VIEW_LOG_SAMPLE_RATE
+    return False
+
+def record_view(note_id: str, ip: str, user_agent: str | None):
+    """Count a public view; nothing here waits on Mongo"""
+    view_counter.increment({"noteId": note_id, "hour": current_hour()})
+    if should_log_raw_view():
+        view_log_buffer.submit({
+            "noteId": note_id,
+            "ip": ip,
+            "userAgent": user_agent,
+            "timestamp": get_current_time(),
+            "sampleRate": settings.NOTE_VIEW_LOG_SAMPLE_RATE if settings.NOTE_VIEW_LOG_MODE == "sampled" else 1.0
+        })
+
+async def get_view_stats(note_id: str, hours: int = 168):
+    """Total views and an hourly series for the last `hours` hours, from the rollups.
+
+    Hourly counts older than the retention period are gone; the total adds
+    their daily summaries instead.
+    """
+    counts = db.get_collection("note_view_counts")
+    since = current_hour() - timedelta(hours=hours - 1)
+    horizon = await summary_horizon("note_view_counts")
+
+    totals = await counts.aggregate([
+        {"$match": {"noteId": note_id, **({"hour": {"$gte": horizon}} if horizon else {})}},
+        {"$group": {"_id": None, "total": {"$sum": "$count"}}}
+    ]).to_list(length=1)
+    total = totals[0]["total"] if totals else 0
+    if horizon:
+        # every summary before the horizon: the note's whole history
+        total += sum(
+            summary.get("views", 0)
+            for summary in await daily_summaries("note_views_daily", {"noteId": note_id}, datetime.min, horizon)
+        )
+    series = await counts.find(
+        {"noteId": note_id, "hour": {"$gte": since}},
+        {"_id": 0, "hour": 1, "count": 1}
+    ).sort("hour", 1).to_list(length=hours)
+
+    return {
+        "noteId": note_id,
+        "total": total,
+        "window_hours": hours,
+        "window_total": sum(point["count"] for point in series),
+        "series": series
+    }
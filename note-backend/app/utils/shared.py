@@ -1,6 +1,13 @@
 from fastapi import HTTPException
-from datetime import datetime
+from datetime import datetime, timezone as dt_timezone
 from pytz import timezone
+from bson import ObjectId
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+import base64
+import hashlib
+import json
+import re
 
 IST = timezone("Asia/Kolkata")
 
@@ -15,7 +22,104 @@ def check_permission(note: dict, user_email: str, write: bool = False):
         return
     raise HTTPException(status_code=403, detail="Permission denied")
 
-def note_response(note):
-    note["id"] = str(note["_id"])
-    del note["_id"]
-    return note
+def document_response(document: dict) -> dict:
+    """Expose Mongo's _id as id, in place; BSONResponse encodes the ObjectId"""
+    document["id"] = document.pop("_id")
+    return document
+
+def encode_cursor(updated_at: datetime, note_id: ObjectId) -> str:
+    """Opaque keyset cursor pointing just past (updatedAt, _id)"""
+    raw = json.dumps({"u": updated_at.isoformat(), "i": str(note_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["u"]), ObjectId(data["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def note_etag(note: dict) -> str:
+    """Strong validator: changes whenever the note is rewritten"""
+    note_id = note.get("id") or note.get("_id")
+    if note.get("version") is not None:
+        return f'"{note_id}-{note["version"]}"'
+    # notes last written before versioning
+    updated_at = note.get("updatedAt")
+    stamp = updated_at.isoformat() if isinstance(updated_at, datetime) else str(updated_at)
+    return '"' + hashlib.sha1(f"{note_id}:{stamp}".encode()).hexdigest() + '"'
+
+LEGACY_ETAG_RE = re.compile(r"[0-9a-f]{40}")
+
+def if_match_version(if_match: str | None, note_id: str) -> int | None:
+    """Note version an If-Match header pins a write to, None if unconditional.
+
+    A hash ETag from before versioning stands for version 0 (no version field
+    yet); a tag for another note or anything unrecognised can never match.
+    """
+    if if_match is None:
+        return None
+    tag = if_match.strip().removeprefix("W/").strip('"')
+    if tag == "*":
+        return None
+    prefix, _, version = tag.rpartition("-")
+    if prefix == note_id and version.isdigit():
+        return int(version)
+    if LEGACY_ETAG_RE.fullmatch(tag):
+        return 0
+    return -1
+
+def notes_page_etag(page, variant: str = "") -> str:
+    """Validator for a list response, from the ids and versions it contains.
+
+    variant tells apart different representations (e.g. field selections)
+    of the same page.
+    """
+    if isinstance(page, dict):
+        notes = page.get("notes", [])
+        extra = json.dumps({k: v for k, v in page.items() if k != "notes"}, sort_keys=True, default=str)
+    else:
+        notes, extra = page, ""
+    digest = hashlib.sha1((variant + extra).encode())
+    for note in notes:
+        digest.update(note_etag(note).encode())
+    return '"' + digest.hexdigest() + '"'
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return format_datetime(value.astimezone(dt_timezone.utc), usegmt=True)
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None = None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against a resource"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # "-0000" (UTC, source zone unknown) parses to a naive datetime
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=dt_timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=dt_timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def has_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def validator_headers(etag: str, last_modified: datetime | None = None, private: bool = True) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache" if private else "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def not_modified_response(etag: str, last_modified: datetime | None = None, private: bool = True) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified, private))
@@ -0,0 +1,104 @@
+"""Analytics storage: one document per event vs a time-series collection.
+
+Generates the same synthetic year of heartbeats, logins and logouts for
+--users users into a plain collection and a time-series collection (the
+options from ANALYTICS_TIMESERIES), both with the declared analytics indexes.
+Reports storage and index size from $collStats, then the median latency of
+the study-activity and daily-summary aggregations over the last 7, 30 and
+365 days. Needs MongoDB 5.0+; point MONGO_URL at a scratch database:
+
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.analytics_storage_benchmark --users 50 --events-per-day 200
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.db import db
+from app.core.indexes import INDEXES
+from app.services.analytics_service import daily_activity_pipeline, study_activity_pipeline
+from app.services.analytics_storage import insert_order
+
+LAYOUTS = {
+    "collection": {},
+    "timeseries": {"timeseries": {"timeField": "timestamp", "metaField": "email", "granularity": "seconds"}},
+}
+PAGES = ["/notes", "/notes/edit", "/dashboard", "/search", "/profile"]
+WINDOWS = [7, 30, 365]
+
+def synthetic_day(rng, email, day, events_per_day):
+    """One user's events for one day: a session of heartbeats between a login and a logout"""
+    start = day + timedelta(hours=rng.randint(7, 20), minutes=rng.randint(0, 59))
+    events = [{"email": email, "event": "login", "timestamp": start}]
+    timestamp = start
+    for _ in range(rng.randint(1, events_per_day)):
+        timestamp += timedelta(seconds=rng.randint(10, 60))
+        events.append({"email": email, "timeSpent": rng.randint(5, 60), "page": rng.choice(PAGES), "timestamp": timestamp})
+    events.append({"email": email, "event": "logout", "timestamp": timestamp + timedelta(seconds=30)})
+    return events
+
+async def seed(collections, emails, events_per_day, rng):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    total = 0
+    for offset in range(365, -1, -1):
+        day = today - timedelta(days=offset)
+        events = [event for email in emails for event in synthetic_day(rng, email, day, events_per_day)]
+        # the buffer inserts each flush grouped by user, so both layouts get that order
+        events.sort(key=insert_order)
+        for collection in collections:
+            await collection.insert_many([dict(event) for event in events], ordered=False)
+        total += len(events)
+    return total
+
+async def storage(collection):
+    stats = await collection.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=1)
+    storage = stats[0]["storageStats"]
+    return storage["storageSize"], storage["totalIndexSize"]
+
+async def median_ms(collection, pipeline, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await collection.aggregate(pipeline).to_list(length=None)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+async def main(args):
+    rng = random.Random(42)
+    emails = [f"user{i}@example.com" for i in range(args.users)]
+    tracked = emails[:args.tracked]
+    collections = {}
+    for layout, options in LAYOUTS.items():
+        name = f"analytics_{layout}"
+        await db.drop_collection(name)
+        await db.create_collection(name, **options)
+        collections[layout] = db.get_collection(name)
+        await collections[layout].create_indexes(INDEXES["analytics"])
+
+    start = time.perf_counter()
+    total = await seed(list(collections.values()), emails, args.events_per_day, rng)
+    print(f"Seeded {total} events for {len(emails)} users into both layouts in {time.perf_counter() - start:.0f}s")
+
+    print(f"{'layout':<12}{'storage MB':>12}{'index MB':>10}")
+    for layout, collection in collections.items():
+        storage_size, index_size = await storage(collection)
+        print(f"{layout:<12}{storage_size / 2**20:>12.1f}{index_size / 2**20:>10.1f}")
+
+    now = datetime.utcnow()
+    for days in WINDOWS:
+        since = now - timedelta(days=days)
+        for label, pipeline in (("study", study_activity_pipeline(tracked, since)), ("daily", daily_activity_pipeline(tracked, since))):
+            timings = [await median_ms(collection, pipeline, args.rounds) for collection in collections.values()]
+            cells = "  ".join(f"{layout} {ms:8.1f}ms" for layout, ms in zip(collections, timings))
+            print(f"{label:<6}{days:>4}d  {cells}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tracked", type=int, default=3, help="users the aggregations filter on, like TRACKED_USERS")
+    parser.add_argument("--events-per-day", type=int, default=200, help="upper bound on heartbeats per user and day")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args))
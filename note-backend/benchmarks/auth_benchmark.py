@@ -0,0 +1,34 @@
+"""Per-request authentication overhead, with and without the verified-token cache.
+
+Runs offline (no database needed):
+
+    python -m benchmarks.auth_benchmark --iterations 20000
+"""
+import argparse
+import time
+
+from app.core.auth import VerifiedTokenCache
+from app.core.security import create_access_token, decode_access_token_claims
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+def main(iterations):
+    token = create_access_token({"sub": "bench@example.com", "role": "user"})
+    cache = VerifiedTokenCache(max_size=1024)
+
+    uncached = per_call_us(lambda: decode_access_token_claims(token), iterations)
+    cached = per_call_us(lambda: cache.get(token), iterations)
+
+    print(f"signature check per request: {uncached:.1f}us")
+    print(f"cached lookup per request:   {cached:.1f}us ({uncached / cached:.0f}x faster)")
+    print(f"cache stats: {cache.stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.iterations)
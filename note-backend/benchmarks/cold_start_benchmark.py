@@ -0,0 +1,75 @@
+"""Cold start: import time of app.main in fresh interpreters, and startup phases.
+
+Each round imports the app in a new process (no environment needed, since
+importing reads no settings), reporting the median and the slowest modules
+from -X importtime. With --startup it also runs the lifespan once against
+MONGO_URL and prints the startup report. Exits 1 when the median import
+plus startup exceeds --budget-ms:
+
+    python -m benchmarks.cold_start_benchmark --rounds 10
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.cold_start_benchmark --startup --budget-ms 3000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_once() -> tuple[float, str]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND, capture_output=True, text=True, check=True
+    )
+    return (time.perf_counter() - start) * 1000, result.stderr
+
+def slowest_modules(importtime: str, top: int) -> list[tuple[float, str]]:
+    """(cumulative ms, module) of first-party and direct third-party imports"""
+    modules = []
+    for line in importtime.splitlines()[1:]:
+        _, cumulative, name = line.partition(":")[2].split("|")
+        # nesting shows as two spaces of indentation per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if name.strip().startswith("app.") or depth <= 1:
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+async def startup_phases() -> dict:
+    from app.main import app
+    from app.core.startup import startup_report
+
+    async with app.router.lifespan_context(app):
+        pass
+    return startup_report.summary()
+
+def main(args):
+    samples, importtime = [], ""
+    for _ in range(args.rounds):
+        elapsed, importtime = import_once()
+        samples.append(elapsed)
+    median = statistics.median(samples)
+    print(f"import app.main in a fresh interpreter: median {median:.0f}ms, min {min(samples):.0f}ms, max {max(samples):.0f}ms")
+    for cumulative, name in slowest_modules(importtime, args.top):
+        print(f"  {cumulative:8.1f}ms  {name}")
+
+    total = median
+    if args.startup:
+        summary = asyncio.run(startup_phases())
+        phases = {phase: ms for phase, ms in summary["phases"].items() if phase != "import"}
+        print("startup: " + ", ".join(f"{phase} {ms}ms" for phase, ms in phases.items()))
+        total += phases.get("startup", 0)
+    print(f"cold start: {total:.0f}ms")
+    return 1 if args.budget_ms and total > args.budget_ms else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--startup", action="store_true", help="also run the lifespan against MONGO_URL")
+    parser.add_argument("--budget-ms", type=float, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,68 @@
+"""Compression ratio and CPU cost, for responses and for stored note bodies.
+
+Response side: a 100-note page and a 200-event feed rendered by BSONResponse
+and compressed with every encoding available (gzip always; br and zstd when
+brotli / zstandard are installed). Storage side: note bodies of several sizes
+through pack_content/unpack_content. Needs no database:
+
+    python -m benchmarks.compression_benchmark --rounds 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.core.compression import ENCODERS
+from app.core.responses import BSONResponse
+from app.services.note_repository import pack_content, unpack_content
+from app.utils.shared import document_response
+from benchmarks.serialization_benchmark import activity_feed, note_page
+
+PARAGRAPH = (
+    "A binary heap is a complete binary tree stored in an array. The parent of "
+    "index i sits at (i - 1) // 2, and sift-down restores the heap property in "
+    "O(log n) after the root is replaced. "
+)
+
+def note_body(size, rng):
+    """Text with prose-like redundancy: words from PARAGRAPH, reshuffled per sentence"""
+    words = PARAGRAPH.split()
+    sentences, length = [], 0
+    while length < size:
+        sentence = " ".join(rng.sample(words, k=rng.randint(8, 20))).capitalize() + ". "
+        sentences.append(sentence)
+        length += len(sentence)
+    return "".join(sentences)[:size]
+
+def timed(function, argument, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = function(argument)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return result, statistics.median(samples)
+
+def response_report(rounds):
+    for label, documents in (("100-note page", note_page()), ("200-event feed", activity_feed())):
+        body = BSONResponse([document_response(document) for document in documents]).body
+        for encoding, encode in ENCODERS.items():
+            compressed, cost = timed(encode, body, rounds)
+            print(f"{label:>15} {encoding:>5}: {len(body):>7}B -> {len(compressed):>6}B "
+                  f"ratio {len(body) / len(compressed):5.1f}  {cost:8.1f}us")
+
+def storage_report(rounds):
+    rng = random.Random(3)
+    for kb in (4, 16, 64, 256):
+        body = note_body(kb * 1024, rng)
+        stored, pack_us = timed(lambda content: pack_content({"content": content})[0], body, rounds)
+        size = len(stored["content"]) if isinstance(stored["content"], bytes) else len(body.encode())
+        _, unpack_us = timed(lambda document: unpack_content(dict(document)), stored, rounds)
+        print(f"{kb:>4}KB body: stored {size:>7}B ratio {len(body.encode()) / size:5.1f}  "
+              f"pack {pack_us:8.1f}us  unpack {unpack_us:8.1f}us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    response_report(args.rounds)
+    storage_report(args.rounds)
@@ -0,0 +1,63 @@
+"""Bytes and latency saved by conditional GETs on repeat loads.
+
+Loads a note list page and single notes once to collect validators, then
+repeats the same requests with and without If-None-Match. Needs MONGO_URL
+pointing at a scratch database, e.g.
+
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.conditional_get_benchmark --notes 100
+"""
+import argparse
+import asyncio
+import time
+
+from httpx import AsyncClient
+from app.main import app
+from app.core.security import create_access_token
+from app.models.note import get_note_collection
+from app.utils.shared import get_current_time
+
+OWNER = "swarnadeep321@gmail.com"
+
+async def repeat(client, urls, headers, validators, rounds):
+    total_bytes, start = 0, time.perf_counter()
+    for _ in range(rounds):
+        for url in urls:
+            request_headers = dict(headers)
+            if validators is not None:
+                request_headers["If-None-Match"] = validators[url]
+            response = await client.get(url, headers=request_headers)
+            total_bytes += len(response.content)
+    elapsed = time.perf_counter() - start
+    return total_bytes, elapsed / (rounds * len(urls)) * 1000
+
+async def main(note_count, rounds):
+    notes = get_note_collection()
+    now = get_current_time()
+    result = await notes.insert_many([
+        {"title": f"bench {i}", "content": "lorem ipsum " * 400, "tags": ["bench"], "owner": OWNER,
+         "sharedWith": [], "isArchived": False, "createdAt": now, "updatedAt": now}
+        for i in range(note_count)
+    ])
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': OWNER, 'role': 'admin'})}"}
+    urls = ["/notes/?limit=100"] + [f"/notes/{note_id}" for note_id in result.inserted_ids[:20]]
+
+    try:
+        async with AsyncClient(app=app, base_url="http://bench") as client:
+            validators = {}
+            for url in urls:
+                validators[url] = (await client.get(url, headers=headers)).headers["etag"]
+            full_bytes, full_ms = await repeat(client, urls, headers, None, rounds)
+            cond_bytes, cond_ms = await repeat(client, urls, headers, validators, rounds)
+    finally:
+        await notes.delete_many({"_id": {"$in": result.inserted_ids}})
+
+    print(f"unconditional: {full_bytes:>12,} bytes  {full_ms:.2f}ms/request")
+    print(f"conditional:   {cond_bytes:>12,} bytes  {cond_ms:.2f}ms/request")
+    print(f"saved {1 - cond_bytes / full_bytes:.1%} of bytes, {1 - cond_ms / full_ms:.1%} of latency")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.notes, args.rounds))
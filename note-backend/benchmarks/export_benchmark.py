@@ -0,0 +1,69 @@
+"""Memory profile of a streaming NDJSON note export.
+
+Seeds a throwaway database with synthetic notes, then exports them through
+transfer_service.export_lines/gzip_stream into /dev/null, printing the process
+RSS as the export progresses. RSS should level off after the first cursor
+batches instead of growing with the number of notes exported, e.g.
+
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.export_benchmark --notes 1000000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.db import db
+from app.models.note import get_note_collection
+from app.services.transfer_service import export_lines, export_query, gzip_stream
+
+OWNER = "swarnadeep321@gmail.com"
+
+def rss_mb():
+    # current, not peak, resident set size
+    with open(f"/proc/{os.getpid()}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+async def seed(size):
+    notes = get_note_collection()
+    existing = await notes.count_documents({})
+    while existing < size:
+        batch = [
+            {"title": f"note {i}", "content": "lorem ipsum " * 40, "tags": ["bench", f"t{i % 50}"],
+             "owner": OWNER, "sharedWith": [], "isArchived": False, "version": 1}
+            for i in range(existing, min(existing + 10000, size))
+        ]
+        await notes.insert_many(batch, ordered=False)
+        existing += len(batch)
+
+async def counted(lines, size):
+    checkpoints = {size * step // 10 for step in range(1, 11)}
+    exported = 0
+    async for line in lines:
+        yield line
+        exported += 1
+        if exported in checkpoints:
+            print(f"{exported:>9} notes  rss={rss_mb():.1f}MB")
+
+async def main(size, compress):
+    await db.client.drop_database(db.name)
+    await seed(size)
+
+    lines = counted(export_lines("notes", export_query("notes", OWNER)), size)
+    written = 0
+    start = time.perf_counter()
+    with open(os.devnull, "wb") as sink:
+        if compress:
+            async for chunk in gzip_stream(lines):
+                written += sink.write(chunk)
+        else:
+            async for line in lines:
+                written += sink.write(line.encode())
+    elapsed = time.perf_counter() - start
+    print(f"exported {size} notes, {written / 2**20:.1f}MB in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1000000)
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.notes, args.gzip))
@@ -0,0 +1,313 @@
+"""Load and latency benchmark for the whole API.
+
+Runs the app in-process (httpx ASGI transport) against a throwaway database,
+drives a weighted mix of login, list, search, read, save and analytics
+tracking requests from concurrent virtual users, and reports p50/p95/p99
+latency and requests per second per endpoint. Results can be written as JSON
+and compared with a stored baseline; regressions beyond the tolerance make
+the run exit non-zero.
+
+    # spawn a private mongod on a temporary dbpath
+    python -m benchmarks.load_benchmark --backend mongod --mongod-binary mongod --out after.json
+    # effect of the connection pool size on p99
+    python -m benchmarks.load_benchmark --backend mongod --concurrency 100 --pool-sizes 5 20 100
+    # an already running scratch database (dropped first)
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.load_benchmark --backend url
+    # in-memory fake (mongomock-motor); mongomock cannot evaluate the summary
+    # view's computed snippet
+    python -m benchmarks.load_benchmark --backend memory --list-view full --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ADMIN_EMAIL = "swarnadeep321@gmail.com"
+ADMIN_PASSWORD = "123"
+BENCH_PASSWORD = "bench-password"
+TOPICS = ["heaps", "graphs", "sorting", "hashing", "trees", "dynamic", "greedy", "strings"]
+
+# relative weight of each operation in the mix
+DEFAULT_MIX = {"login": 5, "list": 30, "search": 15, "read": 25, "save": 10, "track": 15}
+
+def start_mongod(binary):
+    """Start a private mongod on a free port; returns (process, url, dbpath)"""
+    dbpath = tempfile.mkdtemp(prefix="note-bench-")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [binary, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return process, f"mongodb://127.0.0.1:{port}/note_bench", dbpath
+
+async def wait_for_mongo(client, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.admin.command("ping")
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+def use_memory_backend():
+    """Point app.db at an in-memory Motor-compatible fake"""
+    from app.db import use_client
+    from benchmarks.memory_backend import memory_client
+
+    use_client(memory_client(), "note_bench")
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def summarize(samples, errors, elapsed):
+    """Per-endpoint latency percentiles (ms) and throughput"""
+    report = {}
+    for name in sorted(set(samples) | set(errors)):
+        ordered = sorted(samples.get(name, [])) or [0.0]
+        report[name] = {
+            "count": len(samples.get(name, [])),
+            "errors": errors.get(name, 0),
+            "rps": len(samples.get(name, [])) / elapsed,
+            "mean_ms": statistics.mean(ordered),
+            "p50_ms": percentile(ordered, 0.50),
+            "p95_ms": percentile(ordered, 0.95),
+            "p99_ms": percentile(ordered, 0.99),
+        }
+    return report
+
+def compare(results, baseline, tolerance):
+    """Endpoints whose p95 grew or throughput fell by more than tolerance"""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before or not before["count"]:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if current["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {before['rps']:.1f} -> {current['rps']:.1f}")
+        if current["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {current['errors']}")
+    return regressions
+
+class Workload:
+    """Seeded data and the operations of the mix"""
+
+    def __init__(self, client, rng, users, notes, list_view="summary"):
+        self.client = client
+        self.rng = rng
+        self.list_view = list_view
+        self.user_count = users
+        self.note_count = notes
+        self.admin_headers = None
+        self.users = []
+        self.note_ids = []
+
+    async def seed(self):
+        login = await self.client.post("/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        login.raise_for_status()
+        self.admin_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        for index in range(self.user_count):
+            email = f"bench{index}@example.com"
+            await self.client.post("/auth/register", json={"email": email, "password": BENCH_PASSWORD})
+            self.users.append(email)
+
+        for start in range(0, self.note_count, 500):
+            operations = [
+                {"op": "create", "note": self.synthetic_note(index)}
+                for index in range(start, min(start + 500, self.note_count))
+            ]
+            response = await self.client.post("/notes/bulk", json={"operations": operations}, headers=self.admin_headers)
+            response.raise_for_status()
+            self.note_ids.extend(result["id"] for result in response.json()["results"] if result["status"] == 201)
+
+    def synthetic_note(self, index):
+        topic = TOPICS[index % len(TOPICS)]
+        words = self.rng.choices(TOPICS + ["lecture", "exam", "proof", "example", "notes"], k=120)
+        return {"title": f"{topic.capitalize()} lecture {index}", "content": " ".join(words), "tags": [topic, f"week{index % 12}"]}
+
+    async def login(self):
+        return await self.client.post("/auth/login", json={"email": self.rng.choice(self.users), "password": BENCH_PASSWORD})
+
+    async def list(self):
+        page = self.rng.randint(1, max(self.note_count // 20, 1))
+        return await self.client.get("/notes/", params={"page": page, "limit": 20, "view": self.list_view}, headers=self.admin_headers)
+
+    async def search(self):
+        return await self.client.get("/notes/", params={"search": self.rng.choice(TOPICS)}, headers=self.admin_headers)
+
+    async def read(self):
+        return await self.client.get(f"/notes/{self.rng.choice(self.note_ids)}", headers=self.admin_headers)
+
+    async def save(self):
+        note_id = self.rng.choice(self.note_ids)
+        return await self.client.put(f"/notes/{note_id}", json={"content": " ".join(self.rng.choices(TOPICS, k=80))}, headers=self.admin_headers)
+
+    async def track(self):
+        return await self.client.post("/analytics/track", json={"email": self.rng.choice(self.users), "timeSpent": self.rng.randint(1, 300), "page": "/notes"})
+
+async def run_load(workload, mix, concurrency, duration, warmup):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples, errors = defaultdict(list), defaultdict(int)
+    recording = False
+    stop_at = time.perf_counter() + warmup + duration
+
+    async def virtual_user():
+        while time.perf_counter() < stop_at:
+            name = workload.rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await getattr(workload, name)()
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latency = (time.perf_counter() - start) * 1000
+            if recording:
+                if failed:
+                    errors[name] += 1
+                else:
+                    samples[name].append(latency)
+
+    users = [asyncio.create_task(virtual_user()) for _ in range(concurrency)]
+    await asyncio.sleep(warmup)
+    recording = True
+    started = time.perf_counter()
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - started
+    return summarize(samples, errors, elapsed), elapsed
+
+def print_endpoints(endpoints, elapsed):
+    total = sum(endpoint["count"] for endpoint in endpoints.values())
+    print(f"{'endpoint':>8} {'count':>7} {'errors':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, stats in endpoints.items():
+        print(f"{name:>8} {stats['count']:>7} {stats['errors']:>6} {stats['rps']:>8.1f} "
+              f"{stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>6.1f}ms {stats['p99_ms']:>6.1f}ms")
+    print(f"{'total':>8} {total:>7} {'':>6} {total / elapsed:>8.1f}")
+
+async def main(args):
+    from httpx import AsyncClient
+    from app.core.config import settings
+    from app.db import close, get_client, get_database
+    from app.main import app
+
+    if args.backend != "memory":
+        await wait_for_mongo(get_client())
+        await get_client().drop_database(get_database().name)
+
+    mix = {**DEFAULT_MIX, **dict(item.split("=") for item in args.mix)}
+    mix = {name: float(weight) for name, weight in mix.items() if float(weight) > 0}
+    # the in-memory fake has no connection pool to size
+    pool_sizes = args.pool_sizes if args.backend != "memory" and args.pool_sizes else [settings.MONGO_MAX_POOL_SIZE]
+    workload = None
+    runs = []
+    for pool_size in pool_sizes:
+        if pool_size != settings.MONGO_MAX_POOL_SIZE:
+            # the lifespan opens (and warms) a fresh client with these bounds
+            close()
+            settings.MONGO_MAX_POOL_SIZE = pool_size
+            settings.MONGO_MIN_POOL_SIZE = min(settings.MONGO_MIN_POOL_SIZE, pool_size)
+            settings.MONGO_WARMUP_CONNECTIONS = min(settings.MONGO_WARMUP_CONNECTIONS, pool_size)
+        async with app.router.lifespan_context(app):
+            async with AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+                if workload is None:
+                    workload = Workload(client, random.Random(args.seed), args.users, args.notes, args.list_view)
+                    await workload.seed()
+                workload.client = client
+                endpoints, elapsed = await run_load(workload, mix, args.concurrency, args.duration, args.warmup)
+
+        total = sum(endpoint["count"] for endpoint in endpoints.values())
+        runs.append({
+            "meta": {
+                "backend": args.backend,
+                "concurrency": args.concurrency,
+                "max_pool_size": pool_size,
+                "duration_s": elapsed,
+                "users": args.users,
+                "notes": args.notes,
+                "mix": mix,
+                "python": platform.python_version(),
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "total": {"count": total, "rps": total / elapsed},
+            "endpoints": endpoints,
+        })
+        print(f"maxPoolSize={pool_size}")
+        print_endpoints(endpoints, elapsed)
+
+    if len(runs) > 1:
+        names = sorted({name for run in runs for name in run["endpoints"]})
+        print("p99 (ms) by maxPoolSize")
+        print(f"{'pool':>6} " + " ".join(f"{name:>8}" for name in names))
+        for run in runs:
+            print(f"{run['meta']['max_pool_size']:>6} " + " ".join(
+                f"{run['endpoints'][name]['p99_ms']:>8.1f}" if name in run["endpoints"] else f"{'-':>8}" for name in names
+            ))
+
+    results = runs[0] if len(runs) == 1 else {"runs": runs}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for run in runs:
+            regressions += compare(run, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["url", "mongod", "memory"], default="url")
+    parser.add_argument("--mongod-binary", default="mongod")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds first")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--pool-sizes", type=int, nargs="*", help="repeat the run once per maxPoolSize")
+    parser.add_argument("--list-view", choices=["summary", "full"], default="summary")
+    parser.add_argument("--mix", nargs="*", default=[], help="weight overrides, e.g. save=30 login=0")
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS for cheaper logins")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare with an earlier --out file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative p95/rps change")
+    args = parser.parse_args()
+
+    os.environ.setdefault("JWT_SECRET", "load-benchmark-secret")
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+    mongod = dbpath = None
+    if args.backend == "mongod":
+        mongod, os.environ["MONGO_URL"], dbpath = start_mongod(args.mongod_binary)
+    elif args.backend == "memory":
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017/note_bench")
+        use_memory_backend()
+
+    try:
+        status = asyncio.run(main(args))
+    finally:
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait()
+            shutil.rmtree(dbpath, ignore_errors=True)
+    sys.exit(status)
@@ -0,0 +1,64 @@
+"""Event-loop responsiveness during a login storm.
+
+Fires N concurrent logins through the ASGI app while a probe keeps hitting an
+unrelated endpoint (GET /), and reports probe latency percentiles. With bcrypt
+on the event loop the probe p99 grows with every queued login; with the
+password executor it stays near the idle baseline. Needs MONGO_URL pointing at
+a scratch database, e.g.
+
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.login_storm_benchmark --logins 100
+"""
+import argparse
+import asyncio
+import time
+
+from httpx import AsyncClient
+from app.main import app
+
+EMAIL = "login-bench@example.com"
+PASSWORD = "bench-password"
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def probe(client, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+
+async def main(logins):
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        await client.post("/auth/register", json={"email": EMAIL, "password": PASSWORD})
+
+        idle, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(1)
+        stop.set()
+        await task
+
+        storm, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, storm))
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            for _ in range(logins)
+        ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+
+    statuses = {}
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    print(f"idle  probe p50={percentile(idle, 0.5):.2f}ms p99={percentile(idle, 0.99):.2f}ms")
+    print(f"storm probe p50={percentile(storm, 0.5):.2f}ms p99={percentile(storm, 0.99):.2f}ms")
+    print(f"{logins} logins in {elapsed:.2f}s, statuses {statuses}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins))
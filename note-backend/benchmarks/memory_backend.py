@@ -0,0 +1,24 @@
+"""In-process mongomock-motor client for the benchmarks' memory backend and the test suite.
+
+Needs mongomock-motor. Patches mongomock on first use, so the app itself
+never imports it.
+"""
+from mongomock.collection import BulkOperationBuilder
+from mongomock_motor import AsyncMongoMockClient
+
+def _accept_bulk_sort():
+    # pymongo 4.11+ passes UpdateOne/ReplaceOne's `sort` to the bulk builder, which mongomock predates
+    for name in ("add_update", "add_replace"):
+        method = getattr(BulkOperationBuilder, name)
+        if not getattr(method, "accepts_sort", False):
+            def add(self, *args, _method=method, sort=None, **kwargs):
+                if sort is not None:
+                    raise NotImplementedError("mongomock cannot sort bulk write operations")
+                return _method(self, *args, **kwargs)
+            add.accepts_sort = True
+            setattr(BulkOperationBuilder, name, add)
+
+def memory_client():
+    """A fresh in-memory client to hand to app.db.use_client()"""
+    _accept_bulk_sort()
+    return AsyncMongoMockClient()
@@ -0,0 +1,55 @@
+"""Read throughput of single notes with and without the note cache.
+
+Reads a small working set of notes repeatedly, first straight from Mongo and
+then through note_repository.get_note. Needs MONGO_URL pointing at a scratch
+database, e.g.
+
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.note_cache_benchmark --reads 5000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.models.note import get_note_collection
+from app.services.note_repository import get_note, note_cache
+
+async def main(reads, working_set, concurrency):
+    notes = get_note_collection()
+    result = await notes.insert_many([
+        {"title": f"bench {i}", "content": "x" * 2000, "tags": ["bench"], "owner": "bench@example.com", "sharedWith": []}
+        for i in range(working_set)
+    ])
+    ids = result.inserted_ids
+    rng = random.Random(7)
+    plan = [rng.choice(ids) for _ in range(reads)]
+
+    async def run(read):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(note_id):
+            async with semaphore:
+                await read(note_id)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(note_id) for note_id in plan))
+        return reads / (time.perf_counter() - start)
+
+    try:
+        uncached = await run(lambda note_id: notes.find_one({"_id": note_id}))
+        note_cache.clear()
+        cached = await run(get_note)
+    finally:
+        await notes.delete_many({"_id": {"$in": ids}})
+
+    print(f"uncached: {uncached:,.0f} reads/s")
+    print(f"cached:   {cached:,.0f} reads/s ({cached / uncached:.1f}x)")
+    print(f"cache stats: {note_cache.stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--working-set", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.reads, args.working_set, args.concurrency))
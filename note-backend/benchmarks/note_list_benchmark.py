@@ -0,0 +1,56 @@
+"""Response size and server time of GET /notes/ pages, full vs summary.
+
+Seeds long synthetic notes into a throwaway database and requests the same
+100-note pages through the app in-process with view=full and view=summary.
+Needs MONGO_URL pointing at a scratch database, e.g.
+
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.note_list_benchmark --content-kb 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from httpx import AsyncClient
+
+from app.db import db
+from app.main import app
+from app.models.note import get_note_collection
+from app.core.security import create_access_token
+
+OWNER = "swarnadeep321@gmail.com"
+
+async def seed(count, content_kb):
+    body = ("Binary heaps keep the smallest element at the root. " * (content_kb * 20))[:content_kb * 1024]
+    await get_note_collection().insert_many([
+        {"title": f"Lecture {i}", "content": body, "tags": ["bench", f"t{i % 20}"], "owner": OWNER,
+         "sharedWith": [{"email": f"student{j}@example.com", "permission": "read"} for j in range(20)],
+         "isArchived": False, "version": 1}
+        for i in range(count)
+    ])
+
+async def measure(client, headers, view, pages, limit):
+    sizes, times = [], []
+    for page in range(1, pages + 1):
+        start = time.perf_counter()
+        response = await client.get("/notes/", params={"view": view, "page": page, "limit": limit}, headers=headers)
+        times.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(response.content))
+    return statistics.mean(sizes), statistics.median(times)
+
+async def main(pages, limit, content_kb):
+    await db.client.drop_database(db.name)
+    await seed(pages * limit, content_kb)
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": OWNER, "role": "admin"})}
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        for view in ("full", "summary"):
+            size, median_ms = await measure(client, headers, view, pages, limit)
+            print(f"{view:>8}: {size / 1024:9.1f}KB per {limit}-note page, p50 {median_ms:.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--content-kb", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.limit, args.content_kb))
@@ -0,0 +1,89 @@
+"""Search latency benchmark.
+
+Seeds a throwaway database with synthetic notes, builds the inverted index and
+times ranked searches at each corpus size. The rare query terms are planted
+in a fixed number of notes, so their result sets stay the same size while
+the corpus grows; the common words appear in every note and the 2-character
+prefixes expand to thousands of indexed terms, so those hit the candidate
+and prefix caps. Latency of every query should stay flat as the corpus grows.
+Point MONGO_URL at a scratch database before running, e.g.
+
+    MONGO_URL=mongodb://localhost:27017/note_bench python -m benchmarks.search_benchmark --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from app.db import db
+from app.models.note import get_note_collection
+from app.core.indexes import ensure_indexes
+from app.services.search_service import rebuild_index, search_notes
+
+OWNER = "swarnadeep321@gmail.com"
+VOCABULARY = [f"word{i}" for i in range(20000)]
+MARKERS = ["alpha", "bravo", "charlie", "delta", "echo"]
+MARKED_NOTES = 200
+COMMON = ["the", "and", "notes"]
+QUERIES = {
+    "rare": ["alpha", "alp", "bravo charlie", "delta echo", "ech"],
+    "common": ["the", "notes and", "the alpha"],
+    "short prefix": ["wo", "th", "wo the"],
+}
+
+def synthetic_note(rng, marked=False):
+    content = rng.choices(VOCABULARY, k=80) + COMMON
+    if marked:
+        content += rng.sample(MARKERS, k=2)
+    return {
+        "title": " ".join(rng.choices(VOCABULARY[:2000], k=5)),
+        "content": " ".join(content),
+        "tags": rng.choices(VOCABULARY[:200], k=3),
+        "owner": OWNER,
+        "sharedWith": [],
+        "isArchived": False,
+    }
+
+async def seed(size, rng):
+    notes = get_note_collection()
+    existing = await notes.count_documents({})
+    while existing < size:
+        batch = [
+            synthetic_note(rng, marked=existing + i < MARKED_NOTES)
+            for i in range(min(10000, size - existing))
+        ]
+        await notes.insert_many(batch, ordered=False)
+        existing += len(batch)
+
+async def time_queries(queries, rounds):
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            await search_notes(OWNER, query, 1, 10)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "max_ms": latencies[-1],
+    }
+
+async def main(sizes, rounds):
+    rng = random.Random(42)
+    await db.client.drop_database(db.name)
+    await ensure_indexes()
+    for size in sorted(sizes):
+        await seed(size, rng)
+        await rebuild_index(get_note_collection())
+        for kind, queries in QUERIES.items():
+            result = await time_queries(queries, rounds)
+            print(f"{size:>9} notes  {kind:<12}  p50={result['p50_ms']:.2f}ms  p95={result['p95_ms']:.2f}ms  max={result['max_ms']:.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.rounds))
@@ -0,0 +1,78 @@
+"""Serialization cost of a 100-note page and a 200-event activity feed.
+
+Compares the old path (stringify _id by hand, jsonable_encoder, then the
+stdlib JSONResponse) with BSONResponse on documents shaped like what Motor
+returns. Needs no database:
+
+    python -m benchmarks.serialization_benchmark --rounds 2000
+"""
+import argparse
+import copy
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core.responses import BSONResponse
+from app.utils.shared import document_response
+
+def note_page(size=100):
+    # Motor hands back naive UTC datetimes
+    now = datetime(2024, 5, 1)
+    return [{
+        "_id": ObjectId(),
+        "title": f"Lecture {i}: data structures",
+        "content": "Binary heaps keep the smallest element at the root. " * 20,
+        "tags": ["dsa", "heaps", f"week{i % 12}"],
+        "owner": "swarnadeep321@gmail.com",
+        "sharedWith": [{"email": "student@example.com", "permission": "read"}],
+        "isArchived": False,
+        "createdAt": now - timedelta(days=i),
+        "updatedAt": now - timedelta(hours=i),
+        "version": 3,
+    } for i in range(size)]
+
+def activity_feed(size=200):
+    start = datetime(2024, 5, 1)
+    return [{
+        "_id": ObjectId(),
+        "email": f"user{i % 7}@example.com",
+        "event": ["login", "logout"][i % 2],
+        "timeSpent": i * 3,
+        "page": "/notes",
+        "timestamp": start + timedelta(minutes=i),
+    } for i in range(size)]
+
+def old_path(documents):
+    for document in documents:
+        document["id"] = str(document["_id"])
+        del document["_id"]
+    return JSONResponse(jsonable_encoder(documents)).body
+
+def new_path(documents):
+    return BSONResponse([document_response(document) for document in documents]).body
+
+def time_path(render, documents, rounds):
+    samples = []
+    for _ in range(rounds):
+        batch = copy.deepcopy(documents)
+        start = time.perf_counter()
+        body = render(batch)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), len(body)
+
+def main(rounds):
+    for label, documents in (("100-note page", note_page()), ("200-event feed", activity_feed())):
+        old_us, old_bytes = time_path(old_path, documents, rounds)
+        new_us, new_bytes = time_path(new_path, documents, rounds)
+        print(f"{label:>15}: jsonable_encoder {old_us:8.1f}us ({old_bytes}B)  "
+              f"BSONResponse {new_us:8.1f}us ({new_bytes}B)  x{old_us / new_us:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=1000)
+    args = parser.parse_args()
+    main(args.rounds)
@@ -0,0 +1,32 @@
+"""Every test gets its own database through app.db.use_client().
+
+By default that is an in-process mongomock-motor client, so the suite needs
+no server. Set TEST_MONGO_URL to run the same tests against a real MongoDB
+(each test then gets a freshly dropped database on that server).
+"""
+import os
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017/note_test")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+
+import pymongo
+import pytest
+from app import db as app_db
+from benchmarks.memory_backend import memory_client
+
+@pytest.fixture(autouse=True)
+def database():
+    previous = (app_db._client, app_db._database)
+    url = os.environ.get("TEST_MONGO_URL")
+    if url:
+        with pymongo.MongoClient(url) as admin:
+            admin.drop_database("note_test")
+    client = app_db.create_client(url) if url else memory_client()
+    app_db.use_client(client, "note_test")
+    try:
+        yield app_db.get_database()
+    finally:
+        if url:
+            client.close()
+        app_db._client, app_db._database = previous
+        app_db._collections.clear()
@@ -2,10 +2,12 @@ import pytest
 from httpx import AsyncClient
 from app.main import app
 from app.db import db
+from app.core.security import create_access_token
 
 @pytest.mark.asyncio
 async def test_analytics_endpoints():
-    async with AsyncClient(app=app, base_url="http://test") as ac:
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+    async with AsyncClient(app=app, base_url="http://test", headers=headers) as ac:
         response = await ac.get("/analytics/tags")
         assert response.status_code == 200
 
@@ -14,3 +16,158 @@ async def test_analytics_endpoints():
 
         response = await ac.get("/analytics/active-users")
         assert response.status_code == 200
+
+def test_tag_deltas():
+    from app.services.tags_service import tag_deltas
+
+    assert tag_deltas([], ["a", "b"]) == {"a": 1, "b": 1}
+    assert tag_deltas(["a", "b"], ["b", "c"]) == {"a": -1, "c": 1}
+    assert tag_deltas(["a"], ["a"]) == {}
+    assert tag_deltas(["a", "b"], None) == {"a": -1, "b": -1}
+
+@pytest.mark.asyncio
+async def test_write_buffer_sheds_load_when_full():
+    from app.services.ingest_service import WriteBuffer
+
+    buffer = WriteBuffer("analytics", max_size=2, batch_size=10, flush_interval=60)
+    try:
+        assert buffer.submit({"n": 1})
+        assert buffer.submit({"n": 2})
+        assert not buffer.submit({"n": 3})
+        assert buffer.stats() == {
+            "queued": 2, "flushed": 0, "dropped": 1, "failed": 0, "retried": 0, "on_flush_failed": 0,
+            "pending": 2, "capacity": 2
+        }
+    finally:
+        buffer._task.cancel()
+
+@pytest.mark.asyncio
+async def test_write_buffer_inserts_in_bucket_order(monkeypatch):
+    from datetime import datetime
+    from app.services.analytics_storage import insert_order
+    from app.services.ingest_service import WriteBuffer
+
+    inserted, flushed = [], []
+
+    class Collection:
+        async def insert_many(self, documents, ordered=True):
+            inserted.extend(documents)
+
+    async def on_flush(batch):
+        flushed.extend(batch)
+
+    monkeypatch.setattr(db, "get_collection", lambda name: Collection())
+    events = [
+        {"email": "b@example.com", "timestamp": datetime(2024, 1, 1, 10)},
+        {"email": "a@example.com", "timestamp": datetime(2024, 1, 1, 11)},
+        {"email": "b@example.com", "timestamp": datetime(2024, 1, 1, 9)},
+    ]
+    buffer = WriteBuffer("analytics", max_size=10, batch_size=10, flush_interval=60, on_flush=on_flush, insert_order=insert_order)
+    buffer._pending.extend(events)
+    await buffer.flush()
+
+    assert inserted == [events[1], events[2], events[0]]
+    assert flushed == events
+
+@pytest.mark.asyncio
+async def test_write_buffer_accounts_for_partial_and_failed_flushes(monkeypatch):
+    from pymongo.errors import AutoReconnect, BulkWriteError
+    from app.services.ingest_service import WriteBuffer
+
+    attempts, flushed = [], []
+
+    class Collection:
+        async def insert_many(self, documents, ordered=True):
+            attempts.append(list(documents))
+            if len(attempts) == 1:
+                raise AutoReconnect("connection reset")
+            raise BulkWriteError({"nInserted": 1, "writeErrors": [
+                {"index": 1, "code": 121, "errmsg": "Document failed validation"},
+                {"index": 2, "code": 11000, "keyPattern": {"_id": 1}, "errmsg": "duplicate key"},
+            ]})
+
+    async def on_flush(batch):
+        flushed.extend(batch)
+        raise RuntimeError("session update failed")
+
+    monkeypatch.setattr(db, "get_collection", lambda name: Collection())
+    events = [{"n": 1}, {"n": 2}, {"n": 3}]
+    buffer = WriteBuffer("analytics", max_size=10, batch_size=10, flush_interval=60, on_flush=on_flush)
+    buffer._pending.extend(events)
+
+    await buffer.flush()
+    assert list(buffer._pending) == events
+    await buffer.flush()
+
+    # the validation failure is dropped, the duplicate _id was written by the first attempt
+    assert flushed == [events[0], events[2]]
+    stats = buffer.stats()
+    assert (stats["retried"], stats["failed"], stats["flushed"], stats["on_flush_failed"]) == (3, 1, 2, 2)
+
+@pytest.mark.asyncio
+async def test_write_buffer_drops_a_document_that_cannot_be_written(monkeypatch):
+    from bson.errors import InvalidDocument
+    from app.services.ingest_service import WriteBuffer, _FlushLoop
+
+    written = []
+
+    class Collection:
+        async def insert_many(self, documents, ordered=True):
+            raise InvalidDocument("cannot encode object: <object>")
+
+        async def insert_one(self, document):
+            if "bad" in document:
+                raise InvalidDocument("cannot encode object: <object>")
+            written.append(document)
+
+    monkeypatch.setattr(db, "get_collection", lambda name: Collection())
+    events = [{"n": 1}, {"n": 2, "bad": object()}, {"n": 3}]
+    buffer = WriteBuffer("analytics", max_size=10, batch_size=10, flush_interval=60)
+    buffer._pending.extend(events)
+
+    await buffer.flush()
+    # not requeued: the rest of the batch is written and the buffer moves on
+    assert written == [events[0], events[2]] and not buffer._pending
+    stats = buffer.stats()
+    assert (stats["retried"], stats["failed"], stats["flushed"]) == (0, 1, 2)
+
+    with pytest.raises(TypeError):
+        _FlushLoop("analytics", 60)
+
+@pytest.mark.asyncio
+async def test_counter_buffer_coalesces_increments():
+    from app.services.ingest_service import CounterBuffer
+
+    buffer = CounterBuffer("note_view_counts", max_keys=1, flush_interval=60)
+    try:
+        for _ in range(5):
+            assert buffer.increment({"noteId": "a", "hour": 0})
+        assert not buffer.increment({"noteId": "b", "hour": 0})
+        assert buffer._counts == {(("noteId", "a"), ("hour", 0)): 5}
+        assert buffer.stats()["dropped"] == 1
+    finally:
+        buffer._task.cancel()
+
+@pytest.mark.asyncio
+async def test_sessions_materialize_from_login_logout_events():
+    from datetime import datetime, timedelta
+    from app.services.sessions_service import apply_session_events, session_summaries, sessions
+
+    email = "sessions-test@example.com"
+    start = (datetime.utcnow() - timedelta(days=1)).replace(microsecond=0)
+    await sessions.delete_many({"email": email})
+    try:
+        await apply_session_events([
+            {"email": email, "event": "logout", "timestamp": start},
+            {"email": email, "event": "login", "timestamp": start},
+            {"email": email, "event": "login", "timestamp": start + timedelta(minutes=10)},
+            {"email": email, "event": "logout", "timestamp": start + timedelta(minutes=40)},
+            {"email": email, "event": "login", "timestamp": start + timedelta(hours=1)},
+        ])
+        summary = (await session_summaries([email], start))[email]
+        assert summary["login_count"] == 3
+        assert summary["closed_sessions"] == 1
+        assert summary["closed_time"] == 30 * 60
+        assert summary["open_since"] == start + timedelta(hours=1)
+    finally:
+        await sessions.delete_many({"email": email})
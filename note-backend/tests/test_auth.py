@@ -19,3 +19,50 @@ async def test_register_and_login():
         })
         assert response.status_code == 200
         assert "access_token" in response.json()
+
+@pytest.mark.asyncio
+async def test_password_work_is_refused_when_queue_is_full(monkeypatch):
+    from fastapi import HTTPException
+    from app.core import security
+
+    monkeypatch.setattr(security, "_password_work_in_flight", security.password_work_limit())
+    with pytest.raises(HTTPException) as exc:
+        await security.hash_password_async("secret")
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "1"
+
+@pytest.mark.asyncio
+async def test_password_rehashed_when_cost_changes():
+    from passlib.context import CryptContext
+    from app.core.security import verify_and_update_password
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret")
+    valid, new_hash = await verify_and_update_password("secret", old_hash)
+    assert valid and new_hash and new_hash != old_hash
+
+def test_verified_token_cache():
+    from jose import jwt
+    from app.core.auth import VerifiedTokenCache, Principal
+    from app.core.config import settings
+    from app.core.security import create_access_token
+
+    cache = VerifiedTokenCache(max_size=1)
+    token = create_access_token({"sub": "admin@example.com", "role": "admin"})
+    assert cache.get(token) == Principal("admin@example.com", "admin")
+    assert cache.get(token).is_admin
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    other = create_access_token({"sub": "user@example.com", "role": "user"})
+    assert not cache.get(other).is_admin
+    assert cache.stats()["evictions"] == 1
+
+    expired = jwt.encode({"sub": "old@example.com", "exp": 1}, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    assert cache.get(expired) is None
+    assert cache.get("not-a-token") is None
+
+def test_current_user_dependency_runs_on_the_event_loop():
+    import inspect
+    from app.core.auth import get_current_user
+
+    # a sync dependency would run in the threadpool, racing on the unlocked token cache
+    assert inspect.iscoroutinefunction(get_current_user)
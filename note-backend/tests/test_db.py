@@ -0,0 +1,34 @@
+import pytest
+from app.core.config import settings
+from app.db import close, create_client, db, use_client
+
+def test_client_options_follow_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MONGO_MAX_POOL_SIZE", 7)
+    monkeypatch.setattr(settings, "MONGO_MIN_POOL_SIZE", 2)
+    monkeypatch.setattr(settings, "MONGO_SOCKET_TIMEOUT_MS", 15000)
+    client = create_client("mongodb://localhost:27017/options_test")
+    try:
+        assert client.options.pool_options.max_pool_size == 7
+        assert client.options.pool_options.min_pool_size == 2
+        assert client.options.pool_options.socket_timeout == 15.0
+    finally:
+        client.close()
+
+def test_collection_handles_follow_the_current_client():
+    notes = db.get_collection("notes")
+    try:
+        use_client(create_client("mongodb://localhost:27017/first_db"))
+        assert notes.database.name == "first_db"
+        use_client(create_client("mongodb://localhost:27017/second_db"))
+        assert notes.full_name == "second_db.notes"
+    finally:
+        close()
+
+@pytest.mark.asyncio
+async def test_memory_client_accepts_bulk_upserts():
+    from pymongo import UpdateOne
+    from benchmarks.memory_backend import memory_client
+
+    counts = memory_client()["memory_test"]["counts"]
+    await counts.bulk_write([UpdateOne({"key": "a"}, {"$inc": {"count": 1}}, upsert=True)] * 2, ordered=False)
+    assert (await counts.find_one({"key": "a"}))["count"] == 2
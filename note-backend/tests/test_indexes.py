@@ -0,0 +1,47 @@
+from app.core.indexes import INDEXES, _declared_spec, _live_spec
+
+def test_declared_indexes_have_unique_names():
+    for name, models in INDEXES.items():
+        names = [model.document["name"] for model in models]
+        assert len(names) == len(set(names)), name
+
+def test_live_index_matching_declaration_is_not_drift():
+    for models in INDEXES.values():
+        for model in models:
+            document = model.document
+            # index_information() reports keys as (field, direction) pairs
+            live = {"key": [(field, float(direction)) for field, direction in document["key"].items()], "v": 2}
+            if document.get("unique"):
+                live["unique"] = True
+            assert _live_spec(live) == _declared_spec(model)
+
+def test_analytics_timeseries_is_opt_in(monkeypatch):
+    from app.core.config import settings
+    from app.core.indexes import collection_options
+
+    monkeypatch.setattr(settings, "ANALYTICS_TIMESERIES", False)
+    assert "analytics" not in collection_options()
+    monkeypatch.setattr(settings, "ANALYTICS_TIMESERIES", True)
+    assert collection_options()["analytics"]["timeseries"]["metaField"] == "email"
+
+def test_retention_turns_time_indexes_into_ttl_indexes(monkeypatch):
+    from app.core.config import settings
+    from app.core.indexes import collection_options, declared_indexes, retention_seconds
+
+    def ttl(collection, name):
+        return next(
+            m.document for m in declared_indexes(retention_seconds())[collection] if m.document["name"] == name
+        ).get("expireAfterSeconds")
+
+    monkeypatch.setattr(settings, "ANALYTICS_TIMESERIES", False)
+    monkeypatch.setattr(settings, "ANALYTICS_RETENTION_DAYS", 0)
+    assert ttl("note_views", "timestamp") is None
+    monkeypatch.setattr(settings, "ANALYTICS_RETENTION_DAYS", 30)
+    assert ttl("note_views", "timestamp") == ttl("note_view_counts", "hour") == ttl("analytics", "timestamp") == 30 * 86400
+    assert ttl("note_views", "noteId_timestamp") is None
+    # time-series collections expire at the collection level instead
+    monkeypatch.setattr(settings, "ANALYTICS_TIMESERIES", True)
+    assert ttl("analytics", "timestamp") is None
+    assert collection_options(retention_seconds())["analytics"]["expireAfterSeconds"] == 30 * 86400
+    # nothing expires until the retention is armed
+    assert "expireAfterSeconds" not in collection_options()["analytics"]
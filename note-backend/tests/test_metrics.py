@@ -0,0 +1,52 @@
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI
+from httpx import AsyncClient
+from app.core.metrics import (
+    Histogram, MetricsMiddleware, CommandMetrics, REGISTRY,
+    http_requests, mongo_command_duration, mongo_command_documents, render_metrics,
+)
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    REGISTRY.remove(histogram)
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, "/a")
+    lines = histogram.render()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{route="/a"} 4' in lines
+
+@pytest.mark.asyncio
+async def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        return {"id": item_id}
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.get("/items/1")
+        await ac.get("/items/2")
+        await ac.get("/nowhere")
+
+    counts = dict(http_requests.samples())
+    assert counts[("GET", "/items/{item_id}", "200")] >= 2
+    assert counts[("GET", "unmatched", "404")] >= 1
+
+def test_command_listener_records_collection_and_documents():
+    listener = CommandMetrics()
+    listener.started(SimpleNamespace(
+        connection_id=("db", 27017), request_id=1, command_name="find", command={"find": "metrics_test_notes"}
+    ))
+    listener.succeeded(SimpleNamespace(
+        connection_id=("db", 27017), request_id=1, command_name="find", duration_micros=2500,
+        reply={"cursor": {"firstBatch": [{}, {}, {}]}}
+    ))
+
+    durations = dict(mongo_command_duration.samples())
+    assert durations[("metrics_test_notes", "find")][-1] == 1
+    assert dict(mongo_command_documents.samples())[("metrics_test_notes", "find")] == 3
+    assert 'mongo_command_duration_seconds_count{collection="metrics_test_notes",command="find"} 1' in render_metrics()
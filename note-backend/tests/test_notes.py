@@ -1,10 +1,18 @@
+import os
 import pytest
 from httpx import AsyncClient
 from app.main import app
 from app.db import db
+from bson import ObjectId
 
 @pytest.mark.asyncio
 async def test_note_crud():
+    from app.core.security import hash_password_async
+
+    # only admins create notes; the account used to be seeded by hand
+    await db.get_collection("users").insert_one({
+        "email": "test@example.com", "password": await hash_password_async("test123"), "role": "admin"
+    })
     async with AsyncClient(app=app, base_url="http://test") as ac:
         login = await ac.post("/auth/login", json={
             "email": "test@example.com",
@@ -28,3 +36,273 @@ async def test_note_crud():
 
         delete = await ac.delete(f"/notes/{note_id}", headers=headers)
         assert delete.status_code == 200
+
+def test_cursor_round_trip():
+    from datetime import datetime
+    from bson import ObjectId
+    from app.utils.shared import encode_cursor, decode_cursor
+
+    updated_at, note_id = datetime(2024, 5, 1, 12, 30, 15, 123000), ObjectId()
+    assert decode_cursor(encode_cursor(updated_at, note_id)) == (updated_at, note_id)
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.environ.get("TEST_MONGO_URL"), reason="needs explain() from a real MongoDB")
+async def test_cursor_pages_examine_constant_documents():
+    from datetime import datetime, timedelta
+    from app.core.indexes import ensure_indexes
+    from app.services.notes_service import KEYSET_SORT, get_notes_page_after, keyset_query
+
+    owner = "cursor-test@example.com"
+    notes = db.get_collection("notes")
+    await notes.delete_many({"owner": owner})
+    await ensure_indexes()
+    start = datetime(2024, 1, 1)
+    await notes.insert_many([
+        {"title": f"n{i}", "content": "", "tags": [], "owner": owner, "updatedAt": start + timedelta(minutes=i // 3)}
+        for i in range(500)
+    ])
+
+    try:
+        seen, examined, cursor = [], [], ""
+        while cursor is not None:
+            plan = await notes.find(keyset_query(owner, cursor)).sort(KEYSET_SORT).limit(10).explain()
+            examined.append(plan["executionStats"]["totalDocsExamined"])
+            page = await get_notes_page_after(owner, cursor, 10)
+            seen.extend(note["id"] for note in page["notes"])
+            cursor = page["next_cursor"]
+
+        assert len(seen) == len(set(seen)) == 500
+        # each $or branch is an index seek bounded by the page size
+        assert max(examined) <= 2 * 10
+    finally:
+        await notes.delete_many({"owner": owner})
+
+def test_note_cache_eviction_and_invalidation():
+    from bson import ObjectId
+    from app.services.note_repository import NoteCache
+
+    cache = NoteCache(max_entries=2, ttl=60)
+    first, second, third = ObjectId(), ObjectId(), ObjectId()
+    for note_id in (first, second, third):
+        cache.put(note_id, {"_id": note_id, "title": "t"}, cache._epoch)
+    assert cache.get(first) is None
+    assert cache.get(third)["title"] == "t"
+    assert cache.stats()["evictions"] == 1
+
+    # a read that started before an invalidation must not repopulate the cache
+    epoch = cache._epoch
+    cache.invalidate(second)
+    cache.put(second, {"_id": second, "title": "stale"}, epoch)
+    assert cache.get(second) is None
+
+def test_note_cache_entries_expire():
+    from bson import ObjectId
+    from app.services.note_repository import NoteCache
+
+    cache = NoteCache(max_entries=10, ttl=0)
+    note_id = ObjectId()
+    cache.put(note_id, {"_id": note_id}, cache._epoch)
+    assert cache.get(note_id) is None
+    assert cache.stats()["bytes"] == 0
+
+def test_conditional_get_validators():
+    from datetime import datetime
+    from starlette.requests import Request
+    from app.utils.shared import note_etag, http_date, is_not_modified
+
+    def request_with(**headers):
+        raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+        return Request({"type": "http", "headers": raw})
+
+    updated_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    etag = note_etag({"_id": "abc", "updatedAt": updated_at})
+    assert etag != note_etag({"_id": "abc", "updatedAt": datetime(2024, 5, 1, 12, 30, 16)})
+
+    assert is_not_modified(request_with(if_none_match=etag), etag)
+    assert is_not_modified(request_with(if_none_match=f'"other", W/{etag}'), etag)
+    assert not is_not_modified(request_with(if_none_match='"other"'), etag)
+    assert is_not_modified(request_with(if_modified_since=http_date(updated_at)), etag, updated_at)
+    assert not is_not_modified(request_with(if_modified_since="Wed, 01 May 2024 12:30:14 GMT"), etag, updated_at)
+    assert is_not_modified(request_with(if_modified_since="Wed, 01 May 2024 12:30:15 -0000"), etag, updated_at)
+    assert not is_not_modified(request_with(if_modified_since="Wed, 01 May 2024 12:30:14 -0000"), etag, updated_at)
+    # If-None-Match takes precedence over If-Modified-Since
+    assert not is_not_modified(request_with(if_none_match='"other"', if_modified_since=http_date(updated_at)), etag, updated_at)
+
+def test_if_match_version():
+    from datetime import datetime
+    from app.utils.shared import note_etag, if_match_version
+
+    etag = note_etag({"_id": "abc", "version": 7, "updatedAt": datetime(2024, 5, 1)})
+    assert if_match_version(etag, "abc") == 7
+    assert if_match_version(f"W/{etag}", "abc") == 7
+    assert if_match_version(etag, "other") == -1
+    assert if_match_version(None, "abc") is None
+    assert if_match_version("*", "abc") is None
+    # notes written before versioning have no version field yet
+    assert if_match_version(note_etag({"_id": "abc", "updatedAt": datetime(2024, 5, 1)}), "abc") == 0
+
+@pytest.mark.asyncio
+async def test_concurrent_conditional_updates_lose_nothing():
+    import asyncio
+    from fastapi import HTTPException
+    from app.services.notes_service import create_note, update_note, delete_note
+    from app.services.note_repository import get_note
+
+    owner = "swarnadeep321@gmail.com"
+    note = await create_note({"title": "counter", "content": "", "tags": []}, owner)
+    conflicts = []
+
+    async def append(word):
+        # read-modify-write, retrying on 409 like a client honouring ETags
+        while True:
+            current = await get_note(ObjectId(note["id"]))
+            try:
+                return await update_note(
+                    note["id"], {"content": (current["content"] + " " + word).strip()},
+                    owner, current.get("version", 0)
+                )
+            except HTTPException as e:
+                assert e.status_code == 409
+                conflicts.append(word)
+
+    try:
+        words = [f"w{i}" for i in range(20)]
+        await asyncio.gather(*(append(word) for word in words))
+        final = await get_note(ObjectId(note["id"]))
+        assert sorted(final["content"].split()) == sorted(words)
+        assert final["version"] == 1 + len(words)
+    finally:
+        await delete_note(note["id"], owner, True)
+
+@pytest.mark.asyncio
+async def test_bulk_operations_report_per_item_results():
+    from app.services.notes_service import bulk_note_operations, get_notes_batch
+
+    owner = "swarnadeep321@gmail.com"
+    created = await bulk_note_operations([
+        {"op": "create", "note": {"title": f"bulk {i}", "content": "", "tags": ["bulk"]}}
+        for i in range(3)
+    ], owner, True)
+    assert created["succeeded"] == 3
+    ids = [result["id"] for result in created["results"]]
+
+    try:
+        outcome = await bulk_note_operations([
+            {"op": "update", "id": ids[0], "changes": {"title": "renamed"}, "version": 1},
+            {"op": "archive", "id": ids[1]},
+            {"op": "update", "id": ids[2], "changes": {"title": "stale"}, "version": 7},
+            {"op": "delete", "id": "not-an-id"},
+        ], owner, True)
+        assert [result["status"] for result in outcome["results"]] == [200, 200, 409, 400]
+
+        batch = await get_notes_batch(ids, owner)
+        assert [note["title"] for note in batch["notes"]] == ["renamed", "bulk 1", "bulk 2"]
+        assert batch["notes"][1]["isArchived"] and batch["errors"] == []
+
+        denied = await bulk_note_operations([{"op": "archive", "id": ids[2]}], "someone@example.com", False)
+        assert denied["results"][0]["status"] == 403
+    finally:
+        await bulk_note_operations([{"op": "delete", "id": note_id} for note_id in ids], owner, True)
+
+@pytest.mark.asyncio
+async def test_bulk_operations_report_writes_lost_to_concurrent_changes(monkeypatch):
+    from app.services import notes_service
+    from app.services.notes_service import bulk_note_operations
+    from app.services.tags_service import top_tags
+
+    owner = "swarnadeep321@gmail.com"
+    created = await bulk_note_operations([
+        {"op": "create", "note": {"title": f"race {i}", "content": "", "tags": ["race"]}}
+        for i in range(2)
+    ], owner, True)
+    bumped, deleted = [ObjectId(result["id"]) for result in created["results"]]
+    collection = db.get_collection("notes")
+
+    class Raced:
+        """The notes collection, with two other writers landing right after the bulk read"""
+        def __getattr__(self, name):
+            return getattr(collection, name)
+
+        async def find(self, *args, **kwargs):
+            async for note in collection.find(*args, **kwargs):
+                yield note
+            await collection.update_one({"_id": bumped}, {"$inc": {"version": 1}})
+            await collection.delete_one({"_id": deleted})
+
+    monkeypatch.setattr(notes_service, "notes", Raced())
+    outcome = await bulk_note_operations([
+        {"op": "update", "id": str(bumped), "changes": {"tags": ["won"]}, "version": 1},
+        {"op": "update", "id": str(deleted), "changes": {"tags": ["won"]}},
+    ], owner, True)
+    monkeypatch.undo()
+
+    assert [result["status"] for result in outcome["results"]] == [409, 404]
+    assert outcome["succeeded"] == 0
+    # neither write happened, so neither moved the tag counters
+    assert await top_tags() == [{"tag": "race", "count": 2}]
+
+def test_list_projection():
+    from fastapi import HTTPException
+    from app.services.notes_service import list_projection
+
+    assert list_projection() is None
+    summary = list_projection("summary")
+    assert "content" not in summary and "sharedWith" not in summary
+    assert "snippet" in summary
+    # cursors and page validators always get what they need
+    assert list_projection("full", ["title"]) == {"title": 1, "updatedAt": 1, "version": 1}
+    with pytest.raises(HTTPException):
+        list_projection("full", ["title", "password"])
+
+def test_large_note_bodies_are_stored_compressed():
+    from app.core.config import settings
+    from app.services.note_repository import pack_content, unpack_content, SNIPPET_FIELD
+
+    body = "Binary heaps keep the smallest element at the root. " * 400
+    stored, cleared = pack_content({"title": "heaps", "content": body})
+    assert isinstance(stored["content"], bytes) and len(stored["content"]) < len(body) // 4
+    assert stored[SNIPPET_FIELD] == body[:settings.NOTE_SNIPPET_LENGTH] and not cleared
+    assert unpack_content(stored) == {"title": "heaps", "content": body}
+
+    stored, cleared = pack_content({"content": "short"})
+    assert stored == {"content": "short"} and SNIPPET_FIELD in cleared
+
+@pytest.mark.asyncio
+async def test_concurrent_delete_leaves_tag_counts_alone(monkeypatch):
+    from fastapi import HTTPException
+    from app.services import notes_service
+    from app.services.notes_service import create_note, delete_note
+    from app.services.tags_service import top_tags
+
+    owner = "swarnadeep321@gmail.com"
+    note = await create_note({"title": "t", "content": "", "tags": ["gone"]}, owner)
+    collection = db.get_collection("notes")
+
+    class Raced:
+        """The notes collection, with another delete landing right after the permission read"""
+        def __getattr__(self, name):
+            return getattr(collection, name)
+
+        async def find_one(self, *args, **kwargs):
+            found = await collection.find_one(*args, **kwargs)
+            await collection.delete_one({"_id": found["_id"]})
+            return found
+
+    monkeypatch.setattr(notes_service, "notes", Raced())
+    with pytest.raises(HTTPException) as exc:
+        await delete_note(note["id"], owner, True)
+    assert exc.value.status_code == 404
+    assert await top_tags() == [{"tag": "gone", "count": 1}]
+
+@pytest.mark.asyncio
+async def test_tag_stats_backfilled_from_existing_notes():
+    from app.services.tags_service import backfill_tag_stats, top_tags
+
+    notes = db.get_collection("notes")
+    assert await backfill_tag_stats(notes) is None
+    await notes.insert_many([{"owner": "a@example.com", "tags": ["x", "y"]}, {"owner": "a@example.com", "tags": ["x"]}])
+    assert await backfill_tag_stats(notes) == 2
+    assert await top_tags() == [{"tag": "x", "count": 2}, {"tag": "y", "count": 1}]
+    # filled once; writes keep it up to date from then on
+    await notes.insert_one({"owner": "a@example.com", "tags": ["z"]})
+    assert await backfill_tag_stats(notes) is None
@@ -0,0 +1,42 @@
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI
+from httpx import AsyncClient
+from app.core.metrics import command_metrics
+from app.core.profiling import ProfileStore, ProfilingMiddleware
+from app.core.security import create_access_token
+
+def profiled_app(store):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, store=store)
+
+    @app.get("/slow-search")
+    async def slow_search():
+        # what the Mongo listener sees during a find on the request's context
+        event = SimpleNamespace(connection_id=("db", 27017), request_id=7, command_name="find")
+        command_metrics.started(SimpleNamespace(**vars(event), command={"find": "notes"}))
+        command_metrics.succeeded(SimpleNamespace(**vars(event), duration_micros=4000, reply={"cursor": {"firstBatch": []}}))
+        return {"results": sorted(str(i) for i in range(2000))[:3]}
+
+    return app
+
+@pytest.mark.asyncio
+async def test_admin_flagged_request_is_profiled():
+    store = ProfileStore(max_size=2)
+    admin = {"Authorization": f"Bearer {create_access_token({'sub': 'admin@example.com', 'role': 'admin'})}"}
+    user = {"Authorization": f"Bearer {create_access_token({'sub': 'user@example.com'})}"}
+
+    async with AsyncClient(app=profiled_app(store), base_url="http://test") as ac:
+        response = await ac.get("/slow-search", params={"profile": 1}, headers=admin)
+        assert response.status_code == 200
+        profile = store.get(int(response.headers["x-profile-id"]))
+
+        denied = await ac.get("/slow-search", params={"profile": 1}, headers=user)
+        assert "x-profile-id" not in denied.headers
+
+    assert profile["trigger"] == "requested"
+    assert profile["mongoMs"] == 4.0
+    assert profile["byCommand"] == {"notes.find": {"count": 1, "ms": 4.0}}
+    assert any("slow_search" in node["function"] for node in profile["callTree"])
+    assert "callTree" not in store.list()[0]
+    assert len(store.list()) == 1
@@ -0,0 +1,72 @@
+import orjson
+import pytest
+from bson import ObjectId
+from datetime import datetime
+from fastapi import APIRouter, FastAPI, Response
+from httpx import AsyncClient
+from pytz import timezone
+from app.core.responses import BSONResponse, BSONRoute
+
+def test_bson_response_encodes_mongo_types():
+    note_id = ObjectId()
+    updated_at = timezone("Asia/Kolkata").localize(datetime(2024, 5, 1, 12, 30, 15, 123000))
+    body = BSONResponse({"id": note_id, "updatedAt": updated_at, "sharedWith": [{"email": "a@b.com"}]}).body
+    assert orjson.loads(body) == {
+        "id": str(note_id),
+        "updatedAt": "2024-05-01T12:30:15.123000+05:30",
+        "sharedWith": [{"email": "a@b.com"}],
+    }
+
+@pytest.mark.asyncio
+async def test_bson_route_keeps_headers_and_status():
+    router = APIRouter(route_class=BSONRoute)
+    note_id = ObjectId()
+
+    @router.get("/note")
+    async def read(response: Response):
+        response.headers["ETag"] = '"v1"'
+        return {"id": note_id}
+
+    @router.post("/note", status_code=201)
+    async def create():
+        return {"id": note_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        read_response = await ac.get("/note")
+        assert read_response.json() == {"id": str(note_id)}
+        assert read_response.headers["etag"] == '"v1"'
+        created = await ac.post("/note")
+        assert created.status_code == 201 and created.json() == {"id": str(note_id)}
+
+def test_choose_encoding():
+    from app.core.compression import choose_encoding
+
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*") is not None
+    assert choose_encoding(None) is None
+
+@pytest.mark.asyncio
+async def test_compression_threshold_and_etag():
+    from app.core.compression import CompressionMiddleware
+
+    app = FastAPI(default_response_class=BSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/large")
+    async def large(response: Response):
+        response.headers["ETag"] = '"abc-1"'
+        return {"content": "x" * 5000}
+
+    async with AsyncClient(app=app, base_url="http://test", headers={"Accept-Encoding": "gzip"}) as ac:
+        assert "content-encoding" not in (await ac.get("/small")).headers
+        compressed = await ac.get("/large")
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.headers["etag"] == 'W/"abc-1"'
+        assert compressed.json() == {"content": "x" * 5000}
@@ -0,0 +1,110 @@
+import os
+import pytest
+from datetime import datetime, timedelta
+from app.db import db
+from app.services.retention_service import ROLLUPS, Rollup, rollups
+
+@pytest.mark.asyncio
+async def test_rollup_of_a_day_is_idempotent_and_resumable():
+    email = "rollup-test@example.com"
+    day = datetime(2001, 1, 1)
+    rollup = Rollup("rollup_test", "analytics", "timestamp", "analytics_daily", "email", ROLLUPS[0].accumulators)
+    analytics = db.get_collection("analytics")
+    summaries = db.get_collection("analytics_daily")
+    await analytics.delete_many({"email": email})
+    await summaries.delete_many({"email": email})
+    await rollups.delete_one({"_id": rollup.name})
+
+    await analytics.insert_many([
+        {"email": email, "event": "login", "timestamp": day + timedelta(hours=9)},
+        {"email": email, "timeSpent": 30, "page": "/notes", "timestamp": day + timedelta(hours=9, minutes=1)},
+        {"email": email, "timeSpent": 15, "page": "/search", "timestamp": day + timedelta(hours=9, minutes=2)},
+        {"email": email, "event": "logout", "timestamp": day + timedelta(hours=10)},
+        {"email": email, "event": "login", "timestamp": day + timedelta(days=1, hours=9)},
+    ])
+    try:
+        assert (await rollup.run(day + timedelta(days=1)))["days"] == 1
+        # a crash before the progress update rolls the same day again
+        await rollup.roll_day(day)
+        assert (await rollup.run(day + timedelta(days=2)))["days"] == 1
+
+        first, second = await summaries.find({"email": email}, {"_id": 0}).sort("day", 1).to_list(length=None)
+        assert first["day"] == day
+        assert (first["logins"], first["logouts"], first["studyEvents"]) == (1, 1, 2)
+        assert (first["timedEvents"], first["studyTime"], sorted(first["pages"])) == (2, 45, ["/notes", "/search"])
+        assert (second["logins"], second["timedEvents"]) == (1, 0)
+        assert (await rollups.find_one({"_id": rollup.name}))["rolledThrough"] == day + timedelta(days=2)
+    finally:
+        await analytics.delete_many({"email": email})
+        await summaries.delete_many({"email": email})
+        await rollups.delete_one({"_id": rollup.name})
+
+@pytest.mark.asyncio
+async def test_retention_is_armed_only_after_old_rows_are_rolled_up(monkeypatch):
+    from app.core.config import settings
+    from app.core.indexes import check_index_drift, ensure_indexes
+    from app.services.retention_service import apply_retention, armed_retention, run_rollups
+
+    monkeypatch.setattr(settings, "ANALYTICS_TIMESERIES", False)
+    monkeypatch.setattr(settings, "ANALYTICS_RETENTION_DAYS", 30)
+    email = "retention-test@example.com"
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=60)
+    analytics = db.get_collection("analytics")
+    await analytics.insert_many([
+        {"email": email, "event": "login", "timestamp": day + timedelta(hours=9)},
+        {"email": email, "timeSpent": 30, "page": "/notes", "timestamp": day + timedelta(hours=9, minutes=1)},
+    ])
+
+    async def analytics_ttl():
+        return (await analytics.index_information())["timestamp"].get("expireAfterSeconds")
+
+    # startup over old rows with no rollups yet: the time index is built without a TTL
+    await ensure_indexes()
+    assert await armed_retention() is None
+    assert await apply_retention() is None
+    assert await analytics_ttl() is None
+    assert "analytics" not in await check_index_drift()
+    assert await analytics.count_documents({"email": email}) == 2
+
+    await run_rollups()
+    summary = await db.get_collection("analytics_daily").find_one({"email": email, "day": day})
+    assert (summary["logins"], summary["studyTime"]) == (1, 30)
+    assert await armed_retention() == 30 * 86400
+    # the TTL is declared now; the live index catches up in apply_retention()
+    assert (await check_index_drift())["analytics"]["changed"] == ["timestamp"]
+    if os.environ.get("TEST_MONGO_URL"):  # mongomock has no collMod
+        assert await apply_retention() == 30 * 86400
+        assert await analytics_ttl() == 30 * 86400
+        assert "analytics" not in await check_index_drift()
+
+@pytest.mark.asyncio
+async def test_retention_is_disarmed_when_rollups_fall_behind(monkeypatch):
+    from pymongo import DESCENDING, IndexModel
+    from app.core.config import settings
+    from app.services.retention_service import apply_retention
+
+    monkeypatch.setattr(settings, "ANALYTICS_TIMESERIES", False)
+    monkeypatch.setattr(settings, "ANALYTICS_RETENTION_DAYS", 30)
+    analytics = db.get_collection("analytics")
+    # armed earlier, then the rollup job stopped while events kept ageing
+    await analytics.create_indexes([IndexModel([("timestamp", DESCENDING)], name="timestamp", expireAfterSeconds=30 * 86400)])
+    await rollups.insert_one({"_id": "analytics", "rolledThrough": datetime(2001, 1, 1)})
+    await analytics.insert_one({"email": "late@example.com", "event": "login", "timestamp": datetime.utcnow() - timedelta(days=29)})
+
+    assert await apply_retention() is None
+    assert "expireAfterSeconds" not in (await analytics.index_information())["timestamp"]
+
+@pytest.mark.asyncio
+async def test_windows_inside_the_retention_read_raw_data_only(monkeypatch):
+    from app.core.config import settings
+    from app.services.retention_service import start_of_day, summary_horizon
+
+    monkeypatch.setattr(settings, "ANALYTICS_RETENTION_DAYS", 30)
+    now = datetime.utcnow()
+    await rollups.insert_one({"_id": "analytics", "rolledThrough": start_of_day(now)})
+
+    # the first day of a 30-day window is partly before the day the TTL has reached,
+    # but its raw data from `since` on is all there
+    assert await summary_horizon("analytics", now - timedelta(days=30) + timedelta(minutes=1)) is None
+    horizon = await summary_horizon("analytics", now - timedelta(days=45))
+    assert horizon == start_of_day(now - timedelta(days=30)) + timedelta(days=1)
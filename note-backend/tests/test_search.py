@@ -0,0 +1,79 @@
+import pytest
+from bson import ObjectId
+from app.services.search_service import tokenize, build_postings, rank_postings
+
+def make_note(title, content, tags=None):
+    return {"_id": ObjectId(), "owner": "owner@example.com", "title": title, "content": content, "tags": tags or []}
+
+def corpus_for(notes):
+    postings = []
+    corpus = {"doc_count": 0, "title_len": 0, "content_len": 0, "tags_len": 0}
+    for note in notes:
+        note_postings, lengths = build_postings(note)
+        postings.extend(note_postings)
+        corpus["doc_count"] += 1
+        for key, value in lengths.items():
+            corpus[key] += value
+    return postings, corpus
+
+def test_tokenize():
+    assert tokenize("Hello, World! hello_world 42") == ["hello", "world", "hello_world", "42"]
+    assert tokenize("") == []
+
+def test_title_match_ranks_above_content_match():
+    in_title = make_note("Python basics", "An introduction to the language")
+    in_content = make_note("Getting started", "Some notes about python and more")
+    postings, corpus = corpus_for([in_title, in_content])
+
+    ranked = rank_postings(postings, ["python"], corpus)
+    assert [note_id for note_id, _ in ranked] == [in_title["_id"], in_content["_id"]]
+
+def test_all_query_tokens_must_match():
+    both = make_note("Python async", "event loops")
+    one = make_note("Python basics", "variables")
+    postings, corpus = corpus_for([both, one])
+
+    ranked = rank_postings(postings, ["python", "async"], corpus)
+    assert [note_id for note_id, _ in ranked] == [both["_id"]]
+
+def test_prefix_match_scores_below_exact_match():
+    exact = make_note("py", "")
+    prefixed = make_note("python", "")
+    postings, corpus = corpus_for([exact, prefixed])
+
+    ranked = rank_postings(postings, ["py"], corpus)
+    assert [note_id for note_id, _ in ranked] == [exact["_id"], prefixed["_id"]]
+
+def test_tags_are_indexed():
+    tagged = make_note("Untitled", "nothing here", ["Machine Learning"])
+    postings, corpus = corpus_for([tagged])
+
+    assert rank_postings(postings, ["learning"], corpus)[0][0] == tagged["_id"]
+
+def test_capped_document_frequency_makes_common_terms_weightless():
+    common = make_note("notes", "the")
+    postings, corpus = corpus_for([common])
+    corpus["doc_count"] = 100000
+
+    ranked = rank_postings(postings, ["the"], corpus, df={"the": 100000, "notes": 1})
+    assert ranked[0][1] < 0.001
+
+@pytest.mark.asyncio
+async def test_existing_notes_are_backfilled_into_the_index():
+    from app.db import db
+    from app.services.search_service import backfill_index, expand_token, search_notes
+
+    notes = db.get_collection("notes")
+    # written before the index existed
+    await notes.insert_many([
+        make_note("Python basics", "variables and loops"),
+        make_note("Pytest fixtures", "python testing"),
+        make_note("Cooking", "pasta"),
+    ])
+    assert await search_notes("owner@example.com", "python") == ([], 0)
+
+    assert await backfill_index(notes) == 3
+    assert (await search_notes("owner@example.com", "python"))[1] == 2
+    assert await expand_token("owner@example.com", "py") == ["pytest", "python"]
+    # built once; writes keep it up to date from then on
+    assert await backfill_index(notes) is None
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+def test_importing_the_app_reads_no_settings_and_opens_no_client(tmp_path):
+    env = {key: value for key, value in os.environ.items() if key not in ("MONGO_URL", "JWT_SECRET")}
+    env["PYTHONPATH"] = str(BACKEND)
+    check = (
+        "import app.main, app.db\n"
+        "from app.core.config import get_settings\n"
+        "assert get_settings.cache_info().currsize == 0\n"
+        "assert app.db._client is None\n"
+    )
+    # run outside the backend directory so no .env is around to read
+    result = subprocess.run([sys.executable, "-c", check], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
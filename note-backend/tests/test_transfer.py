@@ -0,0 +1,104 @@
+import pytest
+from bson import ObjectId, json_util
+from datetime import datetime
+from app.services.transfer_service import JSON_OPTIONS, gzip_stream, read_lines
+
+async def stream(items):
+    for item in items:
+        yield item
+
+@pytest.mark.asyncio
+async def test_gzip_ndjson_round_trip_across_chunk_boundaries():
+    documents = [
+        {"_id": ObjectId(), "title": f"note {i} " + "x" * (i * 37 % 5000), "updatedAt": datetime(2024, 5, 1, 12, i % 60)}
+        for i in range(300)
+    ]
+    lines = [json_util.dumps(document, json_options=JSON_OPTIONS) + "\n" for document in documents]
+    compressed = b"".join([chunk async for chunk in gzip_stream(stream(lines))])
+
+    # re-split the gzip stream at arbitrary offsets, as a request body would arrive
+    chunks = [compressed[i:i + 1000] for i in range(0, len(compressed), 1000)]
+    decoded = [json_util.loads(line, json_options=JSON_OPTIONS) async for line in read_lines(stream(chunks), compressed=True)]
+    assert decoded == documents
+
+@pytest.mark.asyncio
+async def test_import_counts_malformed_lines_and_dedupes_timeseries_ids(monkeypatch):
+    from app.services import transfer_service
+
+    stored = {}
+
+    class TimeSeriesCollection:
+        # no unique _id: duplicates would simply be inserted
+        async def distinct(self, field, query):
+            return [_id for _id in query["_id"]["$in"] if _id in stored]
+
+        async def insert_many(self, documents, ordered=True):
+            for document in documents:
+                stored.setdefault(document["_id"], []).append(document)
+
+    async def timeseries(name):
+        return "timeseries"
+
+    monkeypatch.setattr(transfer_service.db, "get_collection", lambda name: TimeSeriesCollection())
+    monkeypatch.setattr(transfer_service, "collection_type", timeseries)
+    events = [{"_id": ObjectId(), "email": "a@example.com", "page": "/notes", "timestamp": datetime(2024, 5, 1, 12, i)} for i in range(3)]
+    lines = [json_util.dumps(event, json_options=JSON_OPTIONS) for event in events]
+    malformed = '{"_id": {"$oid": "xyz"}, "timestamp": {"$date": "2024-05-01T00:00:00Z"}}'
+
+    first = await transfer_service.import_lines("analytics", stream(lines[:2] + [malformed]))
+    again = await transfer_service.import_lines("analytics", stream(lines + [lines[2]]))
+
+    assert (first["inserted"], first["invalid"]) == (2, 1)
+    assert (again["inserted"], again["skipped"]) == (1, 3)
+    assert all(len(copies) == 1 for copies in stored.values()) and len(stored) == 3
+
+@pytest.mark.asyncio
+async def test_notes_export_as_text_and_import_compressed(monkeypatch):
+    from app.core.config import settings
+    from app.db import db
+    from app.services import transfer_service
+    from app.services.note_repository import pack_content
+    from app.services.search_service import search_notes
+    from app.services.transfer_service import export_lines, import_lines
+
+    async def collection(name):
+        return "collection"
+
+    monkeypatch.setattr(transfer_service, "collection_type", collection)
+    monkeypatch.setattr(settings, "NOTE_COMPRESS_MIN_BYTES", 64)
+    owner = "a@example.com"
+    notes = db.get_collection("notes")
+    content = "compressible " * 100
+    await notes.insert_one(pack_content({"owner": owner, "title": "big", "content": content, "tags": []})[0])
+    assert isinstance((await notes.find_one({}))["content"], bytes)
+    lines = [line async for line in export_lines("notes", {})]
+    await notes.delete_many({})
+
+    assert json_util.loads(lines[0], json_options=JSON_OPTIONS)["content"] == content
+    report = await import_lines("notes", stream(lines))
+    assert report["inserted"] == 1
+    stored = await notes.find_one({})
+    assert isinstance(stored["content"], bytes)
+    assert [line async for line in export_lines("notes", {})] == lines
+    assert (await search_notes(owner, "compressible"))[1] == 1
+
+@pytest.mark.asyncio
+async def test_import_counts_rejected_documents_as_failed(monkeypatch):
+    from pymongo.errors import BulkWriteError
+    from app.services import transfer_service
+
+    class ValidatingCollection:
+        async def insert_many(self, documents, ordered=True):
+            raise BulkWriteError({"writeErrors": [
+                {"index": 0, "code": 121, "errmsg": "Document failed validation"},
+                {"index": 1, "code": 11000, "errmsg": "duplicate key"},
+            ]})
+
+    async def collection(name):
+        return "collection"
+
+    monkeypatch.setattr(transfer_service.db, "get_collection", lambda name: ValidatingCollection())
+    monkeypatch.setattr(transfer_service, "collection_type", collection)
+    events = [{"_id": ObjectId(), "email": "a@example.com", "page": "/notes", "timestamp": datetime(2024, 5, 1, 12, i)} for i in range(3)]
+    report = await transfer_service.import_lines("analytics", stream([json_util.dumps(event, json_options=JSON_OPTIONS) for event in events]))
+    assert (report["inserted"], report["skipped"], report["failed"]) == (1, 1, 1)